@@ -1,10 +1,32 @@
 """
 Flask Backend for Typing Biometric Authentication
 """
-from flask import Flask, request, jsonify
+import hmac
+import os
+import re
+from datetime import datetime, timedelta
+from flask import Flask, request, g
 from flask_cors import CORS
 from services.auth_service import AuthService
 from services.user_service import UserService
+from services.continuous_auth_service import ContinuousAuthService, INVALID_LOGIN_TOKEN
+from services.admission_service import AdmissionController
+from services.session_partition_service import SessionPartitionService
+from services.maintenance_service import MaintenanceRunner
+from services.login_stats_service import LoginStatsService
+from services.admin_query_service import AdminQueryService, AdminQueryError
+from services.enrollment_retention_service import EnrollmentRetentionService
+from services.template_snapshot_service import TemplateSnapshotBuilder, TEMPLATE_SNAPSHOT
+from services.warmup_service import WarmupService
+from services.enrollment_service import EnrollmentService, EnrollmentError
+from services.username_filter_service import get_username_filter
+from utils.db_util import get_db
+from utils.metrics_util import metrics
+from utils.tracing_util import tracer
+from utils.response_util import json_response, json_stream_page, auth_details, hybrid_details
+from utils.feature_extractor import extract_features, extract_extended_features
+from utils.feature_schema import FEATURE_SCHEMA, FeatureValidationError
+from utils.password_util import validate_password, PASSWORD_TOO_LONG
 
 # Create Flask app
 app = Flask(__name__)
@@ -13,10 +35,147 @@ CORS(app)  # Enable CORS for frontend
 # Initialize services
 auth_service = AuthService()
 user_service = UserService()
+continuous_auth_service = ContinuousAuthService(auth_service)
+enrollment_service = EnrollmentService(auth_service)
+admission_controller = AdmissionController()
+session_partition_service = SessionPartitionService()
+login_stats_service = LoginStatsService()
+admin_query_service = AdminQueryService()
+enrollment_retention_service = EnrollmentRetentionService()
+
+# Admin API is disabled unless a token is configured
+ADMIN_TOKEN = os.getenv('TYPEID_ADMIN_TOKEN')
+
+# Partitioned login_session and the rollup trigger are SQLite-only
+# (sqlite_master, INSTEAD OF triggers); PostgreSQL keeps a plain login_session
+SQLITE_STORAGE = get_db().dialect == 'sqlite'
+
+# Storage layout: partitioned login_session + rollup trigger
+try:
+    if SQLITE_STORAGE:
+        session_partition_service.ensure_schema()
+        login_stats_service.ensure_schema()
+    else:
+        print("ℹ️ login_session partitioning and login rollups are SQLite-only - disabled")
+    user_service.ensure_indexes()
+    admin_query_service.ensure_indexes()
+    auth_service.verifier_service.ensure_schema()
+except Exception as e:
+    print(f"⚠️ Storage schema setup failed: {e}")
+
+# Background housekeeping (never on the request path)
+maintenance = MaintenanceRunner()
+if SQLITE_STORAGE:
+    maintenance.register('login_session_partitions', session_partition_service.run_maintenance)
+maintenance.register('enrollment_retention', enrollment_retention_service.compact)
+if get_username_filter() is not None:
+    maintenance.register('username_filter', get_username_filter().rebuild_if_full)
+maintenance.start()
+
+# Multi-worker deployments: this process publishes the shared template snapshot
+if TEMPLATE_SNAPSHOT == 'builder' and auth_service.template_service is not None:
+    TemplateSnapshotBuilder(auth_service.template_service).start()
+
+# Prime pools, models, templates and page caches; /api/ready reports progress
+warmup_service = WarmupService(auth_service)
+warmup_service.start()
+
+# Endpoints guarded by admission control (checked before any DB/model work)
+ADMISSION_GUARDED_ENDPOINTS = {
+    'login', 'login_hybrid', 'login_password', 'continuous_start', 'enrollment_start'
+}
 
 print("Starting TypeID Backend")
 
 
+# Caller-supplied trace IDs that force sampling (X-Trace-Id request header,
+# honoured only together with a valid X-Admin-Token)
+TRACE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+def is_admin_request():
+    """True if the request carries the configured TYPEID_ADMIN_TOKEN"""
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN)
+
+
+# Registered before admission_check so rejected requests are traced too
+@app.before_request
+def trace_start():
+    """Head-based sampling decision and root span for this request"""
+    trace_id = request.headers.get('X-Trace-Id')
+    if trace_id is not None and not (TRACE_ID_PATTERN.match(trace_id) and is_admin_request()):
+        # Anyone else would bypass sampling and add a disk write per request
+        trace_id = None
+    g.trace = tracer.start_trace(
+        f"{request.method} {request.path}",
+        trace_id=trace_id,
+        force=trace_id is not None,
+        method=request.method,
+        path=request.path,
+        endpoint=request.endpoint
+    )
+
+
+@app.before_request
+def admission_check():
+    """Reject login floods per user / per IP before they reach the pipeline"""
+    if request.endpoint not in ADMISSION_GUARDED_ENDPOINTS or request.method == 'OPTIONS':
+        return None
+    
+    data = request.get_json(silent=True) or {}
+    username = data.get('username') or data.get('name')
+    ticket = admission_controller.admit(
+        username if isinstance(username, str) else None,
+        request.remote_addr
+    )
+    
+    if not ticket.admitted:
+        response = json_response({
+            'access_granted': False,
+            'success': False,
+            'message': ticket.reason
+        })
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(1, int(min(ticket.retry_after, 3600) + 0.999)))
+        return response
+    
+    g.admission_ticket = ticket
+    return None
+
+
+@app.teardown_request
+def admission_release(exc):
+    ticket = g.pop('admission_ticket', None)
+    if ticket is not None:
+        ticket.release()
+
+
+@app.before_request
+def trace_handler():
+    """Span around the route handler (only reached once admission passed)"""
+    if g.get('trace') is not None:
+        g.trace_handler = tracer.start_span(f"handler.{request.endpoint}")
+
+
+@app.after_request
+def trace_response(response):
+    tracer.end_span(g.pop('trace_handler', None))
+    if g.get('trace') is not None:
+        g.trace_status = response.status_code
+        response.headers['X-Trace-Id'] = tracer.current_trace_id()
+    return response
+
+
+@app.teardown_request
+def trace_end(exc):
+    handle = g.pop('trace', None)
+    if handle is not None:
+        attributes = {'status': g.pop('trace_status', 500)}
+        if exc is not None:
+            attributes['error'] = type(exc).__name__
+        tracer.end_trace(handle, **attributes)
+
+
 @app.route('/api/register', methods=['POST'])
 def register():
     """Register endpoint - saves keystroke samples to database"""
@@ -42,23 +201,34 @@ def register():
         keystroke_features = data.get('keystroke_features')
         sample_text = data.get('sample_text', 'The quick brown fox jumps over the lazy dog')
         attempt_number = data.get('attempt', 1)
+        password = data.get('password')
         
         if not username or not email or not keystroke_features:
-            return jsonify({
+            return json_response({
                 'success': False,
                 'message': 'Username, email, and keystroke features are required'
             }), 400
         
+        if password and not validate_password(password):
+            return json_response({
+                'success': False,
+                'message': PASSWORD_TOO_LONG
+            }), 400
+        
         # Check if user exists, if not create
         user = user_service.find_user_by_name(username)
         if not user:
             print(f"🆕 Creating new user: {username}")
             user = user_service.create_user(username, email)
             if not user:
-                return jsonify({
+                return json_response({
                     'success': False,
                     'message': 'Failed to create user'
                 }), 500
+            
+            # Optional fallback password (hashed on the bcrypt pool)
+            if password:
+                user_service.save_password(user.get('user_id') or user.get('id'), password)
         
         user_id = user.get('user_id') or user.get('id')
         
@@ -72,14 +242,19 @@ def register():
         
         if success:
             print(f"✅ Saved keystroke profile for {username} (attempt {attempt_number}) to DATABASE")
-            return jsonify({
+            
+            # Retrain this user's verifier and template (no-op until enough samples exist)
+            samples = user_service.get_keystroke_samples_by_user_id(user_id)
+            auth_service.refresh_enrollment(user_id, samples)
+            
+            return json_response({
                 'success': True,
                 'message': f'Sample {attempt_number} registered successfully',
                 'user_id': user_id,
                 'attempt': attempt_number
             }), 201
         else:
-            return jsonify({
+            return json_response({
                 'success': False,
                 'message': 'Failed to save keystroke profile'
             }), 500
@@ -88,7 +263,7 @@ def register():
         print(f"❌ Registration error: {e}")
         import traceback
         traceback.print_exc()
-        return jsonify({
+        return json_response({
             'success': False,
             'message': f'Internal server error: {str(e)}'
         }), 500
@@ -109,20 +284,29 @@ def login_password():
         print(f"{'='*60}")
         
         if not username or not password:
-            return jsonify({
+            return json_response({
                 'success': False,
                 'message': 'Username and password are required'
             }), 400
         
-        # Simple check - just verify user exists
-        # You can add password hashing/verification here later
         user = user_service.find_user_by_name(username)
         
+        # Verify the bcrypt hash when the user has set a password.
+        # Users enrolled without one keep the legacy existence-only check,
+        # which proves nothing about the caller, so it gets no continuous grant.
+        password_ok = False
+        password_verified = False
         if user:
+            user_id = user.get('user_id') or user.get('id')
+            if user_service.get_password_hash(user_id):
+                password_ok = password_verified = user_service.verify_password(user_id, password)
+            else:
+                password_ok = True
+        
+        if password_ok:
             print(f"✅ Password login successful for {username}")
             
             # Record login session
-            user_id = user.get('user_id') or user.get('id')
             user_service.create_login_session(
                 user_id=user_id,
                 reg_id=user_id,
@@ -140,20 +324,21 @@ def login_password():
                     'email': user.get('email')
                 }
             }
-            print(f"📤 Sending response: {response_data}")
-            return jsonify(response_data), 200
+            if password_verified:
+                response_data['continuous_token'] = continuous_auth_service.issue_grant(user_id, username)
+            return json_response(response_data), 200
         else:
-            print(f"❌ User not found: {username}")
+            print(f"❌ Invalid username or password: {username}")
             
             # Record failed login attempt
             user_service.create_login_session(
-                user_id=0,  # Unknown user
-                reg_id=0,
+                user_id=user_id if user else 0,  # 0 = unknown user
+                reg_id=user_id if user else 0,
                 login_method='password',
                 status='failed'
             )
             
-            return jsonify({
+            return json_response({
                 'access_granted': False,  # Frontend expects this
                 'success': False,
                 'error': 'Invalid username or password'
@@ -163,7 +348,7 @@ def login_password():
         print(f"❌ Password login error: {e}")
         import traceback
         traceback.print_exc()
-        return jsonify({
+        return json_response({
             'success': False,
             'message': 'Internal server error'
         }), 500
@@ -187,37 +372,30 @@ def login():
         print(f"{'='*60}")
         
         if not username:
-            return jsonify({
+            return json_response({
                 'success': False,
                 'message': 'Username is required'
             }), 400
         
         if not keystroke_features:
-            return jsonify({
+            return json_response({
                 'success': False,
                 'message': 'Keystroke data is required'
             }), 400
         
-        # Validate keystroke features have required fields
-        required_fields = ['ks_count', 'ks_rate', 'dwell_mean', 'dwell_std', 
-                          'flight_mean', 'flight_std', 'digraph_mean', 
-                          'digraph_std', 'backspace_rate', 'wps', 'wpm']
-        
-        if isinstance(keystroke_features, list):
-            sample = keystroke_features[0] if keystroke_features else {}
-        else:
-            sample = keystroke_features
-        
-        missing_fields = [f for f in required_fields if f not in sample]
-        if missing_fields:
-            print(f"⚠️ Missing fields: {missing_fields}")
-            return jsonify({
+        # Validate and convert every sample once - the resulting array feeds
+        # both authentication layers
+        try:
+            login_matrix = FEATURE_SCHEMA.parse(keystroke_features)
+        except FeatureValidationError as e:
+            print(f"⚠️ Invalid keystroke features: {e}")
+            return json_response({
                 'success': False,
-                'message': f'Missing required fields: {", ".join(missing_fields)}'
+                'message': str(e)
             }), 400
         
         # TWO-LAYER AUTHENTICATION
-        auth_result = auth_service.authenticate_user(username, keystroke_features)
+        auth_result = auth_service.authenticate_user(username, login_matrix)
         
         if auth_result['authenticated']:
             print(f"\n{'='*60}")
@@ -233,26 +411,7 @@ def login():
                 status='success'
             )
             
-            # Convert all boolean/numpy types to native Python types for JSON serialization
-            details = auth_result['details']
-            if details:
-                details = {
-                    'statistical_match': {
-                        'score': float(details['statistical_match']['score']),
-                        'passed': bool(details['statistical_match']['passed']),
-                        'threshold': float(details['statistical_match']['threshold'])
-                    },
-                    'ml_prediction': {
-                        'predicted_user': str(details['ml_prediction']['predicted_user']),
-                        'confidence': float(details['ml_prediction']['confidence']),
-                        'user_match': bool(details['ml_prediction']['user_match']),
-                        'confidence_pass': bool(details['ml_prediction']['confidence_pass']),
-                        'passed': bool(details['ml_prediction']['passed']),
-                        'threshold': float(details['ml_prediction']['threshold'])
-                    }
-                }
-            
-            return jsonify({
+            return json_response({
                 'access_granted': True,  # Frontend expects this
                 'success': True,
                 'predicted_user': username,  # Frontend expects this
@@ -261,7 +420,8 @@ def login():
                     'username': username,
                     'user_id': user_id
                 },
-                'authentication_details': details
+                'authentication_details': auth_details(auth_result['details']),
+                'continuous_token': continuous_auth_service.issue_grant(user_id, username)
             }), 200
         else:
             print(f"\n{'='*60}")
@@ -282,31 +442,12 @@ def login():
             # Get the predicted user from ML model
             predicted_user = auth_result['details']['ml_prediction']['predicted_user'] if auth_result['details'] else 'unknown'
             
-            # Convert all boolean/numpy types to native Python types for JSON serialization
-            details = auth_result['details']
-            if details:
-                details = {
-                    'statistical_match': {
-                        'score': float(details['statistical_match']['score']),
-                        'passed': bool(details['statistical_match']['passed']),
-                        'threshold': float(details['statistical_match']['threshold'])
-                    },
-                    'ml_prediction': {
-                        'predicted_user': str(details['ml_prediction']['predicted_user']),
-                        'confidence': float(details['ml_prediction']['confidence']),
-                        'user_match': bool(details['ml_prediction']['user_match']),
-                        'confidence_pass': bool(details['ml_prediction']['confidence_pass']),
-                        'passed': bool(details['ml_prediction']['passed']),
-                        'threshold': float(details['ml_prediction']['threshold'])
-                    }
-                }
-            
-            return jsonify({
+            return json_response({
                 'access_granted': False,  # Frontend expects this
                 'success': False,
                 'predicted_user': predicted_user,  # Frontend expects this
                 'message': auth_result['message'],
-                'authentication_details': details
+                'authentication_details': auth_details(auth_result['details'])
             }), 401
             
     except Exception as e:
@@ -316,7 +457,7 @@ def login():
         import traceback
         traceback.print_exc()
         
-        return jsonify({
+        return json_response({
             'success': False,
             'message': 'Internal server error during authentication'
         }), 500
@@ -344,23 +485,33 @@ def login_hybrid():
         print(f"{'='*60}")
         
         if not username:
-            return jsonify({
+            return json_response({
                 'access_granted': False,
                 'message': 'Username is required'
             }), 400
         
         if not keystroke_features_list or len(keystroke_features_list) == 0:
-            return jsonify({
+            return json_response({
                 'access_granted': False,
                 'message': 'Keystroke features are required'
             }), 400
         
+        # Same validation as /api/login; the array feeds both layers
+        try:
+            login_matrix = FEATURE_SCHEMA.parse(keystroke_features_list)
+        except FeatureValidationError as e:
+            print(f"⚠️ Invalid keystroke features: {e}")
+            return json_response({
+                'access_granted': False,
+                'message': str(e)
+            }), 400
+        
         # Step 1: Check if user exists in database
         user = user_service.find_user_by_name(username)
         
         if not user:
             print(f"❌ User '{username}' not found in database")
-            return jsonify({
+            return json_response({
                 'access_granted': False,
                 'message': 'User not found'
             }), 404
@@ -377,11 +528,11 @@ def login_hybrid():
             try:
                 # Use the existing auth_service which has ML model logic
                 # Pass the first sample for compatibility (or modify auth_service to handle lists)
-                auth_result = auth_service.authenticate_user(username, keystroke_features_list)
+                auth_result = auth_service.authenticate_user(username, login_matrix)
+                
+                ml_details = auth_result['details']['ml_prediction']
                 
                 if auth_result['authenticated']:
-                    ml_details = auth_result['details']['ml_prediction']
-                    
                     # Record successful login
                     user_service.create_login_session(
                         user_id=user_id,
@@ -390,23 +541,17 @@ def login_hybrid():
                         status='success'
                     )
                     
-                    return jsonify({
+                    return json_response({
                         'access_granted': True,
                         'username': username,
                         'method': 'ML_MODEL',
-                        'confidence': float(ml_details['confidence']),
+                        'confidence': ml_details['confidence'],
                         'message': 'Login successful (High accuracy - ML Model)',
-                        'details': {
-                            'predicted_user': str(ml_details['predicted_user']),
-                            'confidence': float(ml_details['confidence']),
-                            'threshold': float(ml_details['threshold'])
-                        }
+                        'details': hybrid_details('ML_MODEL', auth_result['details']),
+                        'continuous_token': continuous_auth_service.issue_grant(user_id, username)
                     }), 200
                 else:
-                    # ML model rejected
-                    ml_details = auth_result['details']['ml_prediction']
-                    
-                    # Record failed login
+                    # ML model rejected - record failed login
                     user_service.create_login_session(
                         user_id=user_id,
                         reg_id=user_id,
@@ -414,23 +559,19 @@ def login_hybrid():
                         status='failed'
                     )
                     
-                    return jsonify({
+                    return json_response({
                         'access_granted': False,
                         'username': username,
                         'method': 'ML_MODEL',
                         'message': 'Authentication failed - Typing pattern does not match',
-                        'details': {
-                            'predicted_user': str(ml_details['predicted_user']),
-                            'confidence': float(ml_details['confidence']),
-                            'threshold': float(ml_details['threshold'])
-                        }
+                        'details': hybrid_details('ML_MODEL', auth_result['details'])
                     }), 401
                     
             except Exception as e:
                 print(f"❌ ML Model error: {e}")
                 import traceback
                 traceback.print_exc()
-                return jsonify({
+                return json_response({
                     'access_granted': False,
                     'message': f'ML Model authentication failed: {str(e)}'
                 }), 500
@@ -441,11 +582,11 @@ def login_hybrid():
             
             try:
                 # Use existing auth_service for statistical matching
-                auth_result = auth_service.authenticate_user(username, keystroke_features_list)
+                auth_result = auth_service.authenticate_user(username, login_matrix)
+                
+                stat_details = auth_result['details']['statistical_match']
                 
                 if auth_result['authenticated']:
-                    stat_details = auth_result['details']['statistical_match']
-                    
                     # Record successful login
                     user_service.create_login_session(
                         user_id=user_id,
@@ -454,22 +595,17 @@ def login_hybrid():
                         status='success'
                     )
                     
-                    return jsonify({
+                    return json_response({
                         'access_granted': True,
                         'username': username,
                         'method': 'DATABASE_COMPARISON',
-                        'similarity': float(stat_details['score']),
+                        'similarity': stat_details['score'],
                         'message': 'Login successful (Database profile match)',
-                        'details': {
-                            'similarity': float(stat_details['score']),
-                            'threshold': float(stat_details['threshold'])
-                        }
+                        'details': hybrid_details('DATABASE_COMPARISON', auth_result['details']),
+                        'continuous_token': continuous_auth_service.issue_grant(user_id, username)
                     }), 200
                 else:
-                    # Statistical matching failed
-                    stat_details = auth_result['details']['statistical_match']
-                    
-                    # Record failed login
+                    # Statistical matching failed - record failed login
                     user_service.create_login_session(
                         user_id=user_id,
                         reg_id=user_id,
@@ -477,22 +613,19 @@ def login_hybrid():
                         status='failed'
                     )
                     
-                    return jsonify({
+                    return json_response({
                         'access_granted': False,
                         'username': username,
                         'method': 'DATABASE_COMPARISON',
                         'message': 'Authentication failed - Typing pattern does not match stored profile',
-                        'details': {
-                            'similarity': float(stat_details['score']),
-                            'threshold': float(stat_details['threshold'])
-                        }
+                        'details': hybrid_details('DATABASE_COMPARISON', auth_result['details'])
                     }), 401
                     
             except Exception as e:
                 print(f"❌ Database comparison error: {e}")
                 import traceback
                 traceback.print_exc()
-                return jsonify({
+                return json_response({
                     'access_granted': False,
                     'message': f'Database comparison failed: {str(e)}'
                 }), 500
@@ -501,20 +634,427 @@ def login_hybrid():
         print(f"❌ Hybrid login error: {e}")
         import traceback
         traceback.print_exc()
-        return jsonify({
+        return json_response({
             'access_granted': False,
             'message': 'Internal server error during authentication'
         }), 500
 
 
+@app.route('/api/enrollment/start', methods=['POST'])
+def enrollment_start():
+    """
+    Open an enrollment session; nothing is written until /complete
+    
+    Request body: {"name": "string", "email": "string", "password": "string" (optional)}
+    Response: {"enrollment_token": "...", "required": 5}
+    """
+    try:
+        data = request.get_json() or {}
+        token = enrollment_service.start(
+            data.get('name') or data.get('username'), data.get('email'), data.get('password')
+        )
+        return json_response({
+            'success': True,
+            'enrollment_token': token,
+            'required': enrollment_service.required_samples
+        }), 201
+        
+    except EnrollmentError as e:
+        return json_response({
+            'success': False,
+            'message': str(e)
+        }), 409 if str(e) == 'Username already exists' else 400
+    except Exception as e:
+        print(f"❌ Enrollment start error: {e}")
+        import traceback
+        traceback.print_exc()
+        return json_response({
+            'success': False,
+            'message': 'Internal server error'
+        }), 500
+
+
+@app.route('/api/enrollment/sample', methods=['POST'])
+def enrollment_sample():
+    """
+    Buffer one typing attempt in an enrollment session
+    
+    Request body: {"enrollment_token": "...", "keystroke_features": {...}, "sample_text": "..." (optional)}
+    Response: {"samples": 3, "required": 5, "ready": false}
+    """
+    try:
+        data = request.get_json() or {}
+        token = data.get('enrollment_token')
+        keystroke_features = data.get('keystroke_features')
+        
+        if not token or not keystroke_features:
+            return json_response({
+                'success': False,
+                'message': 'enrollment_token and keystroke_features are required'
+            }), 400
+        
+        progress = enrollment_service.add_sample(token, keystroke_features, data.get('sample_text'))
+        if progress is None:
+            return json_response({
+                'success': False,
+                'message': 'Unknown or expired enrollment session'
+            }), 404
+        
+        return json_response({'success': True, **progress}), 200
+        
+    except (FeatureValidationError, EnrollmentError) as e:
+        return json_response({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        print(f"❌ Enrollment sample error: {e}")
+        import traceback
+        traceback.print_exc()
+        return json_response({
+            'success': False,
+            'message': 'Internal server error'
+        }), 500
+
+
+@app.route('/api/enrollment/complete', methods=['POST'])
+def enrollment_complete():
+    """
+    Commit the user, registration, samples and verifier model in one
+    transaction
+    
+    Request body: {"enrollment_token": "..."}
+    """
+    try:
+        data = request.get_json() or {}
+        token = data.get('enrollment_token')
+        
+        if not token:
+            return json_response({
+                'success': False,
+                'message': 'enrollment_token is required'
+            }), 400
+        
+        user = enrollment_service.complete(token)
+        if user is None:
+            return json_response({
+                'success': False,
+                'message': 'Unknown or expired enrollment session'
+            }), 404
+        
+        return json_response({
+            'success': True,
+            'message': 'Enrollment complete',
+            'user_id': user['user_id'],
+            'username': user['name']
+        }), 201
+        
+    except EnrollmentError as e:
+        return json_response({
+            'success': False,
+            'message': str(e)
+        }), 409 if 'already' in str(e) else 400
+    except Exception as e:
+        print(f"❌ Enrollment commit error: {e}")
+        import traceback
+        traceback.print_exc()
+        return json_response({
+            'success': False,
+            'message': 'Internal server error'
+        }), 500
+
+
+@app.route('/api/enrollment/cancel', methods=['POST'])
+def enrollment_cancel():
+    """Drop an enrollment session (nothing was written for it)"""
+    data = request.get_json() or {}
+    cancelled = enrollment_service.cancel(data.get('enrollment_token'))
+    return json_response({'success': cancelled}), 200 if cancelled else 404
+
+
+@app.route('/api/continuous/start', methods=['POST'])
+def continuous_start():
+    """
+    Open a continuous authentication session
+    
+    Request body: {"login_token": "..."} - the continuous_token returned by
+        a successful login (single use)
+    Response: {"session_token": "..."} - pass it to /api/continuous/events
+    """
+    try:
+        data = request.get_json() or {}
+        login_token = data.get('login_token')
+        
+        if not login_token:
+            return json_response({
+                'success': False,
+                'message': 'login_token is required'
+            }), 400
+        
+        token, error = continuous_auth_service.start_session(login_token)
+        if not token:
+            return json_response({
+                'success': False,
+                'message': error
+            }), 401 if error == INVALID_LOGIN_TOKEN else 400
+        
+        return json_response({
+            'success': True,
+            'session_token': token
+        }), 201
+        
+    except Exception as e:
+        print(f"❌ Continuous session start error: {e}")
+        import traceback
+        traceback.print_exc()
+        return json_response({
+            'success': False,
+            'message': 'Internal server error'
+        }), 500
+
+
+@app.route('/api/continuous/events', methods=['POST'])
+def continuous_events():
+    """
+    Stream a chunk of new key events into a continuous session
+    
+    Request body:
+        {
+            "session_token": "...",
+            "events": [{"type": "down"|"up", "key": "a", "time": ms}, ...]
+        }
+    
+    Only send events not sent before - cost is constant per event and the
+    server never replays the session history.
+    """
+    try:
+        data = request.get_json() or {}
+        token = data.get('session_token')
+        events = data.get('events') or []
+        
+        if not token:
+            return json_response({
+                'success': False,
+                'message': 'session_token is required'
+            }), 400
+        
+        wait = continuous_auth_service.admit_events(token)
+        if wait > 0:
+            response = json_response({
+                'success': False,
+                'message': 'Too many event chunks for this session'
+            })
+            response.status_code = 429
+            response.headers['Retry-After'] = str(max(1, int(min(wait, 3600) + 0.999)))
+            return response
+        
+        result = continuous_auth_service.add_events(token, events)
+        if result is None:
+            return json_response({
+                'success': False,
+                'message': 'Unknown or expired session'
+            }), 404
+        
+        return json_response({'success': True, **result}), 200
+        
+    except (KeyError, TypeError, ValueError) as e:
+        return json_response({
+            'success': False,
+            'message': f'Invalid event data: {str(e)}'
+        }), 400
+    except Exception as e:
+        print(f"❌ Continuous events error: {e}")
+        import traceback
+        traceback.print_exc()
+        return json_response({
+            'success': False,
+            'message': 'Internal server error'
+        }), 500
+
+
+@app.route('/api/continuous/end', methods=['POST'])
+def continuous_end():
+    """Close a continuous authentication session"""
+    data = request.get_json() or {}
+    ended = continuous_auth_service.end_session(data.get('session_token'))
+    return json_response({'success': ended}), 200 if ended else 404
+
+
+@app.route('/api/stats/logins', methods=['GET'])
+def login_stats():
+    """
+    Login attempts and success/failure rates from the rollup counters
+    
+    Query params:
+        start, end: ISO datetimes (default: last 24 hours), hour resolution
+        login_method: optional filter (biometric, password, ml_model, ...)
+    """
+    if not SQLITE_STORAGE:
+        return json_response({
+            'success': False,
+            'message': 'Login statistics require the SQLite rollup tables'
+        }), 501
+    
+    try:
+        end = datetime.fromisoformat(request.args['end']) if 'end' in request.args \
+            else datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        start = datetime.fromisoformat(request.args['start']) if 'start' in request.args \
+            else end - timedelta(hours=24)
+    except ValueError as e:
+        return json_response({
+            'success': False,
+            'message': f'Invalid date: {str(e)}'
+        }), 400
+    
+    stats = login_stats_service.get_stats(start, end, request.args.get('login_method'))
+    return json_response({'success': True, **stats}), 200
+
+
+@app.route('/api/admin/<resource>', methods=['GET'])
+def admin_list(resource):
+    """
+    Keyset-paginated listing of users, enrollments or sessions (streamed)
+    
+    Headers:
+        X-Admin-Token: must match TYPEID_ADMIN_TOKEN
+    
+    Query params:
+        fields: comma-separated projection (default: a small summary set)
+        after: next_after value from the previous page
+        limit: page size (default 100)
+        order: asc (default) or desc
+        user_id: filter enrollments/sessions to one user
+    """
+    if not ADMIN_TOKEN:
+        return json_response({
+            'success': False,
+            'message': 'Admin API is disabled (TYPEID_ADMIN_TOKEN not set)'
+        }), 403
+    if not is_admin_request():
+        return json_response({
+            'success': False,
+            'message': 'Invalid admin token'
+        }), 401
+    
+    try:
+        args = request.args
+        filters = {'user_id': int(args['user_id'])} if 'user_id' in args else None
+        order = args.get('order', 'asc')
+        if order not in ('asc', 'desc'):
+            raise AdminQueryError("order must be 'asc' or 'desc'")
+        rows, limit = admin_query_service.iter_rows(
+            resource,
+            fields=[f.strip() for f in args['fields'].split(',') if f.strip()] if 'fields' in args else None,
+            after=int(args['after']) if 'after' in args else None,
+            limit=int(args['limit']) if 'limit' in args else None,
+            descending=order == 'desc',
+            filters=filters
+        )
+    except (AdminQueryError, ValueError) as e:
+        return json_response({
+            'success': False,
+            'message': str(e)
+        }), 400
+    
+    return json_stream_page(rows, limit), 200
+
+
+@app.route('/api/extract-features', methods=['POST'])
+def extract_keystroke_features():
+    """
+    Compute the 11 keystroke features server-side from raw key events
+    
+    Request body (one session, or {"sessions": [...]} for several):
+        {
+            "down_times": [ms, ...],
+            "up_times": [ms, ...],
+            "down_keys": ["a", ...],   # optional
+            "up_keys": ["a", ...],     # optional
+            "text": "typed text",
+            "extended": false          # optional - add percentile stats
+        }
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return json_response({
+                'success': False,
+                'message': 'Request body is required'
+            }), 400
+        
+        sessions = data.get('sessions') if 'sessions' in data else [data]
+        results = []
+        for i, session in enumerate(sessions):
+            if 'down_times' not in session or 'up_times' not in session:
+                return json_response({
+                    'success': False,
+                    'message': f'Session {i}: down_times and up_times are required'
+                }), 400
+            
+            features = extract_features(
+                session['down_times'],
+                session['up_times'],
+                text=session.get('text', ''),
+                down_keys=session.get('down_keys'),
+                up_keys=session.get('up_keys')
+            )
+            if features is None:
+                return json_response({
+                    'success': False,
+                    'message': f'Session {i}: not enough typing data (need at least 10 key presses)'
+                }), 400
+            
+            result = {'keystroke_features': features}
+            if session.get('extended'):
+                result['extended_features'] = extract_extended_features(
+                    session['down_times'], session['up_times']
+                )
+            results.append(result)
+        
+        if 'sessions' in data:
+            return json_response({'success': True, 'sessions': results}), 200
+        return json_response({'success': True, **results[0]}), 200
+        
+    except (TypeError, ValueError) as e:
+        return json_response({
+            'success': False,
+            'message': f'Invalid keystroke event data: {str(e)}'
+        }), 400
+    except Exception as e:
+        print(f"❌ Feature extraction error: {e}")
+        import traceback
+        traceback.print_exc()
+        return json_response({
+            'success': False,
+            'message': 'Internal server error during feature extraction'
+        }), 500
+
+
 @app.route('/api/health', methods=['GET'])
 def health():
     """Health check endpoint"""
-    return jsonify({
+    return json_response({
         'status': 'ok',
         'message': 'TypeID Backend is running'
     }), 200
 
 
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness: 200 once the startup warm-up has finished, 503 until then"""
+    status = warmup_service.status()
+    return json_response(status), 200 if status['ready'] else 503
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """In-process metrics (counters and latency summaries)"""
+    snapshot = metrics.snapshot()
+    username_filter = get_username_filter()
+    if username_filter is not None:
+        snapshot['username_filter'] = username_filter.stats()
+    return json_response(snapshot), 200
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
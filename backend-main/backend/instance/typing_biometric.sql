@@ -6,6 +6,8 @@ CREATE TABLE IF NOT EXISTS user (
     created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE INDEX IF NOT EXISTS idx_user_name ON user (name);
+
 -- UserRegistration table
 CREATE TABLE IF NOT EXISTS user_registration (
     registration_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -42,8 +44,11 @@ CREATE TABLE IF NOT EXISTS biometric_profile (
     FOREIGN KEY (reg_id) REFERENCES user_registration(registration_id)
 );
 
--- LoginSession table
-CREATE TABLE IF NOT EXISTS login_session (
+CREATE INDEX IF NOT EXISTS idx_biometric_profile_user ON biometric_profile (user_id, biometric_id);
+
+-- LoginSession hot partition (current month)
+-- Closed months move to login_session_YYYY_MM tables; see services/session_partition_service.py
+CREATE TABLE IF NOT EXISTS login_session_hot (
     session_id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INTEGER NOT NULL,
     reg_id INTEGER NOT NULL,
@@ -56,6 +61,32 @@ CREATE TABLE IF NOT EXISTS login_session (
     FOREIGN KEY (reg_id) REFERENCES user_registration(registration_id)
 );
 
+CREATE INDEX IF NOT EXISTS idx_login_session_hot_login_time ON login_session_hot (login_time);
+CREATE INDEX IF NOT EXISTS idx_login_session_hot_user_session ON login_session_hot (user_id, session_id);
+
+-- LoginSession view (hot + monthly partitions, rebuilt on rotation)
+CREATE VIEW IF NOT EXISTS login_session AS
+    SELECT session_id, user_id, reg_id, login_time, logout_time, status, login_method, IP_address
+    FROM login_session_hot;
+
+CREATE TRIGGER IF NOT EXISTS login_session_insert
+INSTEAD OF INSERT ON login_session
+BEGIN
+    INSERT INTO login_session_hot (session_id, user_id, reg_id, login_time, logout_time,
+                                   status, login_method, IP_address)
+    VALUES (NEW.session_id, NEW.user_id, NEW.reg_id,
+            COALESCE(NEW.login_time, CURRENT_TIMESTAMP), NEW.logout_time,
+            NEW.status, NEW.login_method, NEW.IP_address);
+END;
+
+CREATE TRIGGER IF NOT EXISTS login_session_update
+INSTEAD OF UPDATE ON login_session
+BEGIN
+    UPDATE login_session_hot
+    SET logout_time = NEW.logout_time, status = NEW.status, IP_address = NEW.IP_address
+    WHERE session_id = OLD.session_id;
+END;
+
 -- AuditLog table
 CREATE TABLE IF NOT EXISTS audit_log (
     log_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -113,6 +144,24 @@ CREATE TABLE IF NOT EXISTS ml_model (
     FOREIGN KEY (user_id) REFERENCES user(user_id)
 );
 
+-- Per-user verifier models (float32 mean + scale vectors)
+CREATE TABLE IF NOT EXISTS user_verifier (
+    user_id INTEGER PRIMARY KEY,
+    model BLOB NOT NULL,
+    sample_count INTEGER NOT NULL,
+    trained_at TEXT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES user(user_id)
+);
+
+-- Near-duplicate typist pairs (offline all-pairs job, user_id_a < user_id_b)
+CREATE TABLE IF NOT EXISTS typist_similarity (
+    user_id_a INTEGER NOT NULL,
+    user_id_b INTEGER NOT NULL,
+    similarity REAL NOT NULL,
+    computed_at TEXT NOT NULL,
+    PRIMARY KEY (user_id_a, user_id_b)
+);
+
 -- Dashboard (Admin) table
 CREATE TABLE IF NOT EXISTS dashboard (
     dashboard_id INTEGER PRIMARY KEY AUTOINCREMENT,
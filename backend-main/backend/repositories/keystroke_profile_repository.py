@@ -1,38 +1,68 @@
-from extensions import db
-from models.keystroke_profile import BiometricProfile
-from models.user_registration import UserRegistration
+import json
 import logging
+from datetime import datetime
+
+from utils.db_util import get_db
 
 logger = logging.getLogger(__name__)
 
+PROFILE_COLUMNS = 'biometric_id, user_id, reg_id, sample_text, typing_pattern, created_date, last_updated'
+
+
+def _profile_dict(row):
+    """biometric_profile row -> dict with typing_pattern decoded"""
+    profile = dict(row)
+    profile['keystroke_features'] = json.loads(profile['typing_pattern']) if profile['typing_pattern'] else {}
+    return profile
+
 
 class KeystrokeProfileRepository:
-    """Repository for BiometricProfile (your biometric_profile table)"""
+    """Repository for biometric_profile rows (shared data-access layer)"""
     
     @staticmethod
     def create(user_id, keystroke_features, sample_text="", attempts=1):
         """
-        Create biometric profile in YOUR existing table
+        Create a biometric profile for a registered user
         """
-        try:
+        return KeystrokeProfileRepository.create_many(user_id, [(sample_text, keystroke_features)])[0]
+    
+    @staticmethod
+    def create_many(user_id, samples):
+        """
+        Insert several profiles for one user in a single transaction
+        
+        Args:
+            user_id: User ID
+            samples: list of (sample_text, keystroke_features dict)
+        
+        Returns:
+            list of created profile dicts
+        """
+        now = datetime.now().isoformat()
+        
+        def insert(conn):
             # Get reg_id from user_registration
-            registration = UserRegistration.query.filter_by(user_id=user_id).first()
+            registration = conn.execute(
+                "SELECT registration_id FROM user_registration WHERE user_id = ?", (user_id,)
+            ).fetchone()
             if not registration:
                 raise ValueError(f"No registration found for user_id {user_id}")
             
-            profile = BiometricProfile(
-                user_id=user_id,
-                reg_id=registration.registration_id,
-                sample_text=sample_text
-            )
-            profile.set_keystroke_features(keystroke_features)
-            
-            db.session.add(profile)
-            db.session.commit()
-            return profile
-            
+            return [
+                _profile_dict(conn.execute(
+                    f"""
+                    INSERT INTO biometric_profile (user_id, reg_id, sample_text, typing_pattern, created_date, last_updated)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    RETURNING {PROFILE_COLUMNS}
+                    """,
+                    (user_id, registration[0], sample_text, json.dumps(features), now, now)
+                ).fetchone())
+                for sample_text, features in samples
+            ]
+        
+        try:
+            return get_db().write_sync(insert)
         except Exception as e:
-            db.session.rollback()  # Critical: rollback to release the lock
             logger.error(f"Error creating keystroke profile: {str(e)}")
             raise
     
@@ -40,9 +70,12 @@ class KeystrokeProfileRepository:
     def find_by_user_id(user_id):
         """Find all biometric profiles for a user"""
         try:
-            return BiometricProfile.query.filter_by(user_id=user_id).all()
+            rows = get_db().fetch_all(
+                f"SELECT {PROFILE_COLUMNS} FROM biometric_profile WHERE user_id = ? ORDER BY biometric_id",
+                (user_id,)
+            )
+            return [_profile_dict(row) for row in rows]
         except Exception as e:
-            db.session.rollback()
             logger.error(f"Error finding profiles for user {user_id}: {str(e)}")
             raise
     
@@ -50,10 +83,12 @@ class KeystrokeProfileRepository:
     def find_latest_by_user_id(user_id):
         """Find the latest biometric profile"""
         try:
-            return BiometricProfile.query.filter_by(user_id=user_id).order_by(
-                BiometricProfile.created_date.desc()
-            ).first()
+            row = get_db().fetch_one(
+                f"SELECT {PROFILE_COLUMNS} FROM biometric_profile WHERE user_id = ? "
+                "ORDER BY biometric_id DESC LIMIT 1",
+                (user_id,)
+            )
+            return _profile_dict(row) if row else None
         except Exception as e:
-            db.session.rollback()
             logger.error(f"Error finding latest profile for user {user_id}: {str(e)}")
-            raise
\ No newline at end of file
+            raise
@@ -1,43 +1,54 @@
-from models.user import User
-from models.user_registration import UserRegistration
-from extensions import db
+from datetime import datetime
+
+from utils.db_util import get_db
+
+
+def _as_dict(row):
+    return dict(row) if row else None
 
 
 class UserRepository:
-    """Repository for User model database operations."""
+    """Repository for 'user' / 'user_registration' rows (shared data-access layer)."""
+    
+    def __init__(self, db=None):
+        self.db = db or get_db()
     
     def create_user(self, name, email):
         """Create user in 'user' table"""
-        user = User(name=name, email=email)
-        db.session.add(user)
-        db.session.commit()
-        return user
+        row = self.db.write_sync(lambda conn: conn.execute(
+            'INSERT INTO "user" (name, email, created_at) VALUES (?, ?, ?) '
+            'RETURNING user_id, name, email, created_at',
+            (name, email, datetime.now().isoformat())
+        ).fetchone())
+        return _as_dict(row)
     
     def create_registration(self, user_id, password_hash):
         """Create entry in 'user_registration' table"""
-        registration = UserRegistration(
-            user_id=user_id,
-            reg_id=user_id,  # Use user_id as reg_id
-            password=password_hash,
-            biometriclogin='enabled'
-        )
-        db.session.add(registration)
-        db.session.commit()
-        return registration
+        row = self.db.write_sync(lambda conn: conn.execute(
+            """
+            INSERT INTO user_registration (reg_id, user_id, password, biometriclogin, registration_date)
+            VALUES (?, ?, ?, ?, ?)
+            RETURNING registration_id, reg_id, user_id, biometriclogin, registration_date
+            """,
+            (user_id, user_id, password_hash, 'enabled', datetime.now().isoformat())  # user_id as reg_id
+        ).fetchone())
+        return _as_dict(row)
     
     def find_by_email(self, email):
         """Find user by email"""
-        return User.query.filter_by(email=email).first()
+        return _as_dict(self.db.fetch_one('SELECT * FROM "user" WHERE email = ?', (email,)))
     
     def find_by_name(self, name):
         """Find user by name"""
-        return User.query.filter_by(name=name).first()
+        return _as_dict(self.db.fetch_one('SELECT * FROM "user" WHERE name = ?', (name,)))
     
     def find_by_id(self, user_id):
         """Find user by ID"""
-        return User.query.filter_by(user_id=user_id).first()
+        return _as_dict(self.db.fetch_one('SELECT * FROM "user" WHERE user_id = ?', (user_id,)))
     
     def get_user_password(self, user_id):
         """Get hashed password from user_registration"""
-        registration = UserRegistration.query.filter_by(user_id=user_id).first()
-        return registration.password if registration else None
\ No newline at end of file
+        row = self.db.fetch_one(
+            "SELECT password FROM user_registration WHERE user_id = ?", (user_id,)
+        )
+        return row[0] if row else None
@@ -4,6 +4,7 @@ Saves 5 keystroke samples to database (not CSV).
 """
 from flask import Blueprint, request, jsonify
 from services.user_service import UserService
+from utils.password_util import validate_password, PASSWORD_TOO_LONG
 
 registration_bp = Blueprint('registration', __name__)
 user_service = UserService()
@@ -53,6 +54,8 @@ def register_user():
         # Validate required fields
         if not all([name, email, password, keystroke_features]):
             return jsonify({'error': 'Missing required fields'}), 400
+        if not validate_password(password):
+            return jsonify({'error': PASSWORD_TOO_LONG}), 400
 
         # Validate attempt number
         if attempt not in [1, 2, 3, 4, 5]:
@@ -0,0 +1,143 @@
+"""
+Convert the four training pickles (xgb_model_raw.pkl, scaler_raw.pkl,
+encoder_raw.pkl, feature_cols_raw.pkl) into one memory-mappable model
+bundle. Needs joblib, xgboost and scikit-learn; serving the bundle does not.
+
+Before the bundle replaces OUT, its predictions are compared with the
+pickled pipeline (encoder.inverse_transform(model.predict(scaler.transform(X))))
+on probe rows spread around the scaler's fitted range; any difference
+aborts the build and nothing is written.
+
+Usage (from the backend/ directory):
+    python -m scripts.build_model_bundle ARTIFACT_DIR [OUT] [--version V] [--probe-rows N]
+    python -m scripts.build_model_bundle --inspect BUNDLE
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from utils.model_bundle import (
+    ModelBundle, ModelBundleError, affine_scaler, flatten_xgboost, write_bundle
+)
+
+PICKLES = {
+    'model': 'xgb_model_raw.pkl',
+    'scaler': 'scaler_raw.pkl',
+    'encoder': 'encoder_raw.pkl',
+    'feature_cols': 'feature_cols_raw.pkl',
+}
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def probe_rows(scale_mul, scale_add, n_rows, seed=0):
+    """Raw feature rows whose scaled values are spread around 0 (about +-3 units)"""
+    rng = np.random.default_rng(seed)
+    scaled = rng.normal(0.0, 1.5, size=(n_rows, len(scale_mul)))
+    mul = np.where(scale_mul != 0, scale_mul, 1.0)
+    return (scaled - scale_add) / mul
+
+
+def reference_labels(model, scaler, encoder, X):
+    """What the pickled pipeline predicts for raw rows X"""
+    scaled = scaler.transform(X)
+    if hasattr(model, 'get_booster'):
+        encoded = model.predict(scaled)
+    else:
+        import xgboost
+        output = model.predict(xgboost.DMatrix(scaled))
+        encoded = output.argmax(axis=1) if output.ndim == 2 else (output > 0.5).astype(np.int64)
+    return encoder.inverse_transform(np.asarray(encoded, dtype=np.int64))
+
+
+def check_parity(path, model, scaler, encoder, X):
+    """
+    Raises:
+        ModelBundleError: the bundle at path predicts a different label for any row
+    """
+    bundle = ModelBundle(path)
+    got = bundle.predict_labels(X)
+    expected = reference_labels(model, scaler, encoder, X)
+    mismatched = np.flatnonzero(got != np.asarray(expected, dtype=object))
+    if len(mismatched):
+        row = int(mismatched[0])
+        raise ModelBundleError(
+            f"Bundle disagrees with the pickled model on {len(mismatched)} of {len(X)} probe rows "
+            f"(row {row}: bundle {got[row]!r}, model {expected[row]!r})"
+        )
+
+
+def build(artifact_dir, out, version=None, n_probe_rows=1000):
+    import joblib
+
+    paths = {name: os.path.join(artifact_dir, filename) for name, filename in PICKLES.items()}
+    model = joblib.load(paths['model'])
+    scaler = joblib.load(paths['scaler'])
+    encoder = joblib.load(paths['encoder'])
+    feature_cols = [str(f) for f in joblib.load(paths['feature_cols'])]
+
+    # Refuse parts that visibly come from different training runs
+    names_in = getattr(scaler, 'feature_names_in_', None)
+    if names_in is not None and [str(f) for f in names_in] != feature_cols:
+        raise ModelBundleError('Scaler was fitted on different feature columns than feature_cols_raw.pkl')
+
+    scale_mul, scale_add = affine_scaler(scaler, len(feature_cols))
+    tree_arrays, model_info = flatten_xgboost(model)
+    sources = {name: file_sha256(path) for name, path in paths.items()}
+    if version is None:
+        version = hashlib.sha256(''.join(sorted(sources.values())).encode()).hexdigest()[:12]
+
+    # Written next to OUT and only renamed over it once it matches the model
+    tmp = f"{out}.unverified"
+    manifest = write_bundle(tmp, version, feature_cols, list(encoder.classes_),
+                            scale_mul, scale_add, tree_arrays, model_info, sources)
+    try:
+        check_parity(tmp, model, scaler, encoder, probe_rows(scale_mul, scale_add, n_probe_rows))
+    except Exception:
+        os.remove(tmp)
+        raise
+    os.replace(tmp, out)
+    return manifest
+
+
+def inspect(path):
+    start = time.perf_counter()
+    bundle = ModelBundle(path)
+    elapsed = (time.perf_counter() - start) * 1000
+    manifest = dict(bundle.manifest, labels=f"{len(bundle.labels)} labels")
+    print(json.dumps(manifest, indent=2))
+    print(f"✅ Loaded and verified in {elapsed:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='artifact directory (or bundle with --inspect)')
+    parser.add_argument('out', nargs='?')
+    parser.add_argument('--version')
+    parser.add_argument('--probe-rows', type=int, default=1000,
+                        help='rows compared against the pickled model before writing (default: 1000)')
+    parser.add_argument('--inspect', action='store_true')
+    args = parser.parse_args()
+
+    if args.inspect:
+        inspect(args.source)
+        return
+
+    out = args.out or os.path.join(args.source, 'model.bundle')
+    manifest = build(args.source, out, args.version, args.probe_rows)
+    print(f"✅ Wrote {out} (version {manifest['version']}, {manifest['model']['n_trees']} trees, "
+          f"{len(manifest['labels'])} classes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Find accounts whose enrollment templates are near-duplicates (one typist,
+several accounts) and store the top pairs in typist_similarity.
+
+Usage (from the backend/ directory):
+    python -m scripts.find_duplicate_typists [--top-k K] [--min-similarity S] [--workers W]
+    python -m scripts.find_duplicate_typists --synthetic 100000   # timing run, nothing stored
+"""
+import argparse
+import time
+
+import numpy as np
+
+from services.duplicate_typist_service import (
+    DuplicateTypistService, find_similar_pairs,
+    DUPLICATE_TOP_K, DUPLICATE_MIN_SIMILARITY, DUPLICATE_WORKERS
+)
+
+
+def synthetic_templates(n_users, duplicates=50, seed=3):
+    """Random templates with `duplicates` planted near-copies at the end"""
+    rng = np.random.default_rng(seed)
+    centre = np.array([60, 5.0, 100, 25, 150, 60, 250, 80, 0.05, 0.8, 45])
+    templates = centre * rng.lognormal(0.0, 0.35, size=(n_users, len(centre)))
+    source = rng.integers(0, n_users - duplicates, duplicates)
+    templates[-duplicates:] = templates[source] * rng.lognormal(0.0, 0.01, size=(duplicates, len(centre)))
+    return templates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top-k', type=int, default=DUPLICATE_TOP_K)
+    parser.add_argument('--min-similarity', type=float, default=DUPLICATE_MIN_SIMILARITY)
+    parser.add_argument('--workers', type=int, default=DUPLICATE_WORKERS)
+    parser.add_argument('--synthetic', type=int, metavar='N')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        templates = synthetic_templates(args.synthetic)
+        start = time.perf_counter()
+        pairs = find_similar_pairs(templates, args.top_k, args.min_similarity, args.workers)
+        print(f"🔎 {args.synthetic} templates, {args.workers} workers: "
+              f"{len(pairs)} pairs in {time.perf_counter() - start:.1f}s")
+        for a, b, similarity in pairs[:10]:
+            print(f"   {a} ~ {b}: {similarity:.4f}")
+        return
+
+    stored = DuplicateTypistService().run(args.top_k, args.min_similarity, args.workers)
+    print(f"✅ Stored {stored} pairs in typist_similarity")
+
+
+if __name__ == '__main__':
+    main()
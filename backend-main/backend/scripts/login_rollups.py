@@ -0,0 +1,33 @@
+"""
+Maintain the login_rollup counters.
+
+Usage (from the backend/ directory):
+    python -m scripts.login_rollups rebuild
+    python -m scripts.login_rollups report ADMIN_ID START END   # ISO datetimes
+"""
+import json
+import sys
+from datetime import datetime
+
+from services.login_stats_service import LoginStatsService
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    service = LoginStatsService()
+
+    if command == 'rebuild':
+        service.rebuild()
+    elif command == 'report' and len(sys.argv) == 5:
+        start = datetime.fromisoformat(sys.argv[3])
+        end = datetime.fromisoformat(sys.argv[4])
+        print(json.dumps(service.get_stats(start, end), indent=2))
+        report_id = service.create_report(int(sys.argv[2]), start, end)
+        print(f"✅ Created report {report_id}")
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
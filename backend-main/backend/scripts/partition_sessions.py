@@ -0,0 +1,36 @@
+"""
+Maintain the partitioned login_session storage.
+
+Usage (from the backend/ directory):
+    python -m scripts.partition_sessions migrate   # convert login_session to the partitioned layout
+    python -m scripts.partition_sessions rotate    # move closed months out of the hot table
+    python -m scripts.partition_sessions archive   # compress and drop partitions past retention
+    python -m scripts.partition_sessions status
+"""
+import json
+import sys
+
+from services.session_partition_service import SessionPartitionService
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    service = SessionPartitionService()
+
+    if command == 'migrate':
+        service.ensure_schema()
+    elif command == 'rotate':
+        service.ensure_schema()
+        print(json.dumps(service.rotate(), indent=2))
+    elif command == 'archive':
+        service.ensure_schema()
+        print(json.dumps(service.archive(), indent=2))
+    elif command == 'status':
+        print(json.dumps(service.status(), indent=2))
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,409 @@
+"""
+Concurrency stress test for the SQLite access paths.
+
+Drives UserService.create_user, save_keystroke_profile, create_login_session
+and get_user_keystroke_samples from many threads in several processes at
+once against a temporary WAL database, then checks every write that
+reported success is really there.
+
+The workload is generated from --seed (each thread replays the same
+operation sequence on every run), so results from runs with the same
+arguments are comparable; --baseline prints the deltas against an
+earlier --out file.
+
+Reported per operation: throughput, p50/p95/p99/max latency, retries (a
+failed call is retried up to --retries times) and failures. Across the
+run: writer lock waits (BEGIN IMMEDIATE blocked by another process),
+failed write batches, and lost / duplicate / stale results.
+
+Usage (from the backend/ directory):
+    python -m scripts.stress_db [--processes 4] [--threads 8] [--ops 250] [--seed 1]
+                                [--busy-timeout 30] [--write-batch 64] [--out run.json] [--baseline old.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'instance', 'typing_biometric.sql')
+
+# Operation mix (relative weights); create_user is forced while a thread owns no user
+OPERATION_MIX = {
+    'create_user': 1,
+    'save_keystroke_profile': 4,
+    'create_login_session': 4,
+    'get_user_keystroke_samples': 6,
+}
+RETRY_BACKOFF_S = 0.01
+PERCENTILES = (50, 95, 99)
+
+FEATURE_CENTRE = {
+    'ks_count': 40, 'ks_rate': 4.0, 'dwell_mean': 110, 'dwell_std': 25,
+    'flight_mean': 150, 'flight_std': 40, 'digraph_mean': 130, 'digraph_std': 30,
+    'backspace_rate': 0.02, 'wps': 0.8, 'wpm': 48,
+}
+
+
+def create_database(path):
+    """Fresh WAL database with the application schema, partitions and rollup trigger"""
+    conn = sqlite3.connect(path)
+    with open(SCHEMA_PATH) as f:
+        conn.executescript(f.read())
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.close()
+
+    from utils.db_util import configure_db
+    from services.session_partition_service import SessionPartitionService
+    from services.login_stats_service import LoginStatsService
+    configure_db(f'sqlite:///{path}')
+    SessionPartitionService().ensure_schema()
+    LoginStatsService().ensure_schema()
+
+
+# ---------------------------------------------------
+# WORKERS (run in child processes)
+# ---------------------------------------------------
+class ThreadResult:
+    """What one thread did, as plain data for the parent"""
+
+    def __init__(self):
+        self.latencies = {op: [] for op in OPERATION_MIX}
+        self.retries = {op: 0 for op in OPERATION_MIX}
+        self.failures = {op: 0 for op in OPERATION_MIX}
+        self.users = []                # confirmed (user_id, email)
+        self.profiles = []             # confirmed sample_text markers
+        self.sessions = {}             # user_id -> confirmed session count
+        self.stale_reads = 0           # fewer samples read back than confirmed written
+
+    def to_dict(self):
+        return {
+            'latencies': self.latencies, 'retries': self.retries, 'failures': self.failures,
+            'users': self.users, 'profiles': self.profiles,
+            'sessions': {str(k): v for k, v in self.sessions.items()}, 'stale_reads': self.stale_reads,
+        }
+
+
+def run_thread(user_service, process_index, thread_index, ops, seed, retries, window):
+    rng = random.Random(f'{seed}:{process_index}:{thread_index}')
+    names, weights = zip(*OPERATION_MIX.items())
+    result = ThreadResult()
+    owned = []                         # (user_id, name)
+    confirmed_samples = {}             # user_id -> confirmed profile count
+
+    for seq in range(ops):
+        op = rng.choices(names, weights)[0] if owned else 'create_user'
+        tag = f'stress-{seed}-{process_index}-{thread_index}-{seq}'
+        user_id, name = rng.choice(owned) if owned else (None, None)
+
+        if op == 'create_user':
+            call = lambda: user_service.create_user(tag, f'{tag}@stress.test')
+        elif op == 'save_keystroke_profile':
+            features = {k: v * rng.uniform(0.9, 1.1) for k, v in FEATURE_CENTRE.items()}
+            call = lambda: user_service.save_keystroke_profile(user_id, user_id, tag, features)
+        elif op == 'create_login_session':
+            call = lambda: user_service.create_login_session(user_id, user_id, login_method='stress',
+                                                             status=rng.choice(('success', 'failed')))
+        else:
+            call = lambda: user_service.get_user_keystroke_samples(name)
+
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            outcome = call()
+            result.latencies[op].append((time.perf_counter() - start) * 1000.0)
+            # Reads return [] for a user without samples yet; writes signal failure with False/None
+            if outcome or op == 'get_user_keystroke_samples':
+                break
+            if attempt < retries:
+                result.retries[op] += 1
+                time.sleep(RETRY_BACKOFF_S * (2 ** attempt))
+        else:
+            result.failures[op] += 1
+            continue
+
+        if op == 'create_user':
+            owned.append((outcome['user_id'], tag))
+            result.users.append((outcome['user_id'], f'{tag}@stress.test'))
+        elif op == 'save_keystroke_profile':
+            result.profiles.append(tag)
+            confirmed_samples[user_id] = confirmed_samples.get(user_id, 0) + 1
+        elif op == 'create_login_session':
+            result.sessions[user_id] = result.sessions.get(user_id, 0) + 1
+        else:
+            expected = confirmed_samples.get(user_id, 0)
+            if len(outcome) < (min(expected, window) if window else expected):
+                result.stale_reads += 1
+    return result
+
+
+def run_process(db_path, process_index, threads, ops, seed, retries, verbose=False, barrier=None):
+    """One child process: its own pool and writer thread, `threads` workers"""
+    if not verbose:
+        # The services log every write; keep the report readable
+        sys.stdout = open(os.devnull, 'w')
+
+    from utils.db_util import configure_db
+    from utils.metrics_util import metrics
+    from services.user_service import UserService
+
+    configure_db(f'sqlite:///{db_path}')
+    user_service = UserService()
+    results = [None] * threads
+
+    def target(i):
+        results[i] = run_thread(user_service, process_index, i, ops, seed, retries,
+                                user_service.enrollment_window)
+
+    workers = [threading.Thread(target=target, args=(i,)) for i in range(threads)]
+    if barrier is not None:
+        # Every process starts its load at the same moment (spawn/import times differ)
+        barrier.wait()
+    started_at = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return {
+        'started_at': started_at,
+        'finished_at': time.time(),
+        'threads': [r.to_dict() for r in results],
+        'metrics': metrics.snapshot(),
+    }
+
+
+def _process_main(results, *args):
+    try:
+        results.put(run_process(*args))
+    except BaseException as e:
+        # Tell the parent, and release the siblings waiting at the start barrier
+        results.put({'error': traceback.format_exc(), 'broken_barrier': isinstance(e, threading.BrokenBarrierError)})
+        barrier = args[-1]
+        if barrier is not None:
+            barrier.abort()
+
+
+def collect_outputs(results, processes, poll_s=1.0):
+    """
+    One result per process. A child that dies without reporting (killed,
+    crashed in the interpreter) is noticed through its exit code instead
+    of blocking the parent forever.
+
+    Raises:
+        RuntimeError: a child failed or exited without a result
+    """
+    outputs = []
+    while len(outputs) < len(processes):
+        try:
+            outputs.append(results.get(timeout=poll_s))
+        except queue.Empty:
+            dead = [p for p in processes if p.exitcode not in (None, 0)]
+            if dead:
+                raise RuntimeError(f"Stress process {dead[0].name} exited with code {dead[0].exitcode} "
+                                   f"without a result")
+    # Siblings released by an aborted barrier only report the symptom
+    errors = sorted((output for output in outputs if 'error' in output), key=lambda o: o['broken_barrier'])
+    if errors:
+        raise RuntimeError(f"Stress process failed:\n{errors[0]['error']}")
+    return outputs
+
+
+# ---------------------------------------------------
+# VERIFICATION + REPORT (parent)
+# ---------------------------------------------------
+def verify(db_path, threads):
+    """Compare every confirmed write with what is in the database"""
+    conn = sqlite3.connect(db_path)
+    try:
+        users = {row[0]: row[1] for row in conn.execute('SELECT user_id, email FROM "user"')}
+        registrations = {row[0] for row in conn.execute('SELECT user_id FROM user_registration')}
+        profiles = {}
+        for (text,) in conn.execute('SELECT sample_text FROM biometric_profile'):
+            profiles[text] = profiles.get(text, 0) + 1
+        sessions = dict(conn.execute(
+            "SELECT user_id, COUNT(*) FROM login_session WHERE login_method = 'stress' GROUP BY user_id"
+        ).fetchall())
+    finally:
+        conn.close()
+
+    confirmed_users = [u for t in threads for u in t['users']]
+    confirmed_profiles = [p for t in threads for p in t['profiles']]
+    confirmed_sessions = {}
+    for t in threads:
+        for user_id, n in t['sessions'].items():
+            confirmed_sessions[int(user_id)] = confirmed_sessions.get(int(user_id), 0) + n
+
+    return {
+        'lost_users': sum(1 for user_id, email in confirmed_users if users.get(user_id) != email),
+        'users_without_registration': sum(1 for user_id, _ in confirmed_users if user_id not in registrations),
+        'lost_profiles': sum(1 for p in confirmed_profiles if p not in profiles),
+        'duplicate_profiles': sum(n - 1 for p, n in profiles.items() if n > 1),
+        'lost_sessions': sum(max(0, n - sessions.get(u, 0)) for u, n in confirmed_sessions.items()),
+        # Written although the call reported failure (then possibly retried)
+        'unconfirmed_sessions': sum(max(0, n - confirmed_sessions.get(u, 0)) for u, n in sessions.items()),
+        'stale_reads': sum(t['stale_reads'] for t in threads),
+    }
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q / 100.0 * (len(sorted_values) - 1))))]
+
+
+def merge_lock_waits(snapshots):
+    """Sum the per-process db.write.lock_wait histograms (buckets are mergeable)"""
+    merged = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'buckets': {}}
+    for snapshot in snapshots:
+        stat = snapshot['latency'].get('db.write.lock_wait')
+        if not stat:
+            continue
+        merged['count'] += stat['count']
+        merged['total_ms'] += stat['avg_ms'] * stat['count']
+        merged['max_ms'] = max(merged['max_ms'], stat['max_ms'])
+        for bucket, n in stat['buckets'].items():
+            merged['buckets'][bucket] = merged['buckets'].get(bucket, 0) + n
+    over_1ms = merged['count'] - merged['buckets'].get('le_1', 0)
+    return {
+        'transactions': merged['count'],
+        'waited_over_1ms': over_1ms,
+        'avg_ms': round(merged['total_ms'] / merged['count'], 3) if merged['count'] else 0.0,
+        'max_ms': round(merged['max_ms'], 3),
+        'buckets': merged['buckets'],
+        'failed_batches': sum(s['counters'].get('db.write.failed_batches', 0) for s in snapshots),
+    }
+
+
+def build_report(args, outputs, wall_s, checks):
+    threads = [t for output in outputs for t in output['threads']]
+    operations = {}
+    total_ops = 0
+    for op in OPERATION_MIX:
+        latencies = sorted(x for t in threads for x in t['latencies'][op])
+        completed = len(latencies) - sum(t['retries'][op] for t in threads) - sum(t['failures'][op] for t in threads)
+        total_ops += completed
+        operations[op] = {
+            'completed': completed,
+            'ops_per_s': round(completed / wall_s, 1),
+            **{f'p{q}_ms': round(percentile(latencies, q), 3) for q in PERCENTILES},
+            'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+            'retries': sum(t['retries'][op] for t in threads),
+            'failures': sum(t['failures'][op] for t in threads),
+        }
+    return {
+        'config': {
+            'processes': args.processes, 'threads': args.threads, 'ops': args.ops, 'seed': args.seed,
+            'retries': args.retries, 'busy_timeout_s': args.busy_timeout, 'write_batch': args.write_batch,
+        },
+        'environment': {
+            'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+            'cpus': os.cpu_count(), 'platform': platform.platform(),
+        },
+        'wall_s': round(wall_s, 3),
+        'ops_per_s': round(total_ops / wall_s, 1),
+        'operations': operations,
+        'lock_waits': merge_lock_waits([output['metrics'] for output in outputs]),
+        'checks': checks,
+    }
+
+
+def print_report(report, baseline=None):
+    def delta(path, value):
+        if baseline is None:
+            return ''
+        old = baseline
+        for key in path:
+            old = old.get(key, {}) if isinstance(old, dict) else {}
+        if not isinstance(old, (int, float)) or not old:
+            return ''
+        return f' ({(value - old) / old:+.0%})'
+
+    config = report['config']
+    print(f"🏋️ {config['processes']} processes x {config['threads']} threads x {config['ops']} ops "
+          f"(seed {config['seed']}): {report['ops_per_s']} ops/s{delta(['ops_per_s'], report['ops_per_s'])} "
+          f"in {report['wall_s']}s")
+    print(f"   {'operation':<28}{'ops/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>10}{'retries':>9}{'failed':>8}")
+    for op, r in report['operations'].items():
+        print(f"   {op:<28}{r['ops_per_s']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}"
+              f"{r['max_ms']:>10}{r['retries']:>9}{r['failures']:>8}"
+              f"{delta(['operations', op, 'p99_ms'], r['p99_ms'])}")
+    waits = report['lock_waits']
+    print(f"   lock waits: {waits['waited_over_1ms']}/{waits['transactions']} write transactions waited >1 ms, "
+          f"max {waits['max_ms']} ms, {waits['failed_batches']} failed batches")
+    checks = report['checks']
+    bad = {k: v for k, v in checks.items() if v}
+    print(f"   {'✅ no lost writes' if not bad else '❌ ' + ', '.join(f'{k}={v}' for k, v in bad.items())}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8, help='threads per process')
+    parser.add_argument('--ops', type=int, default=250, help='operations per thread')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--busy-timeout', type=float, default=30.0,
+                        help='SQLite busy timeout in seconds (small values provoke "database is locked")')
+    parser.add_argument('--write-batch', type=int, default=64, help='writer jobs per transaction')
+    parser.add_argument('--verbose', action='store_true', help='keep the services\' per-operation logging')
+    parser.add_argument('--keep', metavar='DB', help='write the database here instead of a temp dir')
+    parser.add_argument('--out', help='write the report as JSON')
+    parser.add_argument('--baseline', help='earlier --out report to compare against')
+    args = parser.parse_args()
+
+    # Read by utils.db_util at import time in every child process
+    os.environ['TYPEID_SQLITE_BUSY_TIMEOUT'] = str(args.busy_timeout)
+    os.environ['TYPEID_DB_WRITE_BATCH'] = str(args.write_batch)
+
+    workdir = tempfile.mkdtemp(prefix='typeid-stress-')
+    db_path = args.keep or os.path.join(workdir, 'stress.db')
+    try:
+        create_database(db_path)
+        # One OS process per --processes (a pool could run two on one worker)
+        context = multiprocessing.get_context('spawn')
+        results, barrier = context.Queue(), context.Barrier(args.processes)
+        processes = [
+            context.Process(target=_process_main, args=(results, db_path, p, args.threads, args.ops,
+                                                         args.seed, args.retries, args.verbose, barrier))
+            for p in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            outputs = collect_outputs(results, processes)
+        except BaseException:
+            for process in processes:
+                process.terminate()
+            raise
+        finally:
+            for process in processes:
+                process.join()
+        wall_s = max(o['finished_at'] for o in outputs) - min(o['started_at'] for o in outputs)
+
+        report = build_report(args, outputs, wall_s, verify(db_path, [t for o in outputs for t in o['threads']]))
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        print_report(report, baseline)
+        if args.out:
+            with open(args.out, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"✅ Wrote {args.out}")
+        if any(report['checks'].values()):
+            sys.exit(1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
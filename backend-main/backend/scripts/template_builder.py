@@ -0,0 +1,36 @@
+"""
+Build and publish the shared template snapshot that worker processes map
+(run workers with TYPEID_TEMPLATE_SNAPSHOT=worker).
+
+Usage (from the backend/ directory):
+    python -m scripts.template_builder          # publish, then republish on every enrollment change
+    python -m scripts.template_builder --once
+"""
+import sys
+
+from services.template_store_service import TemplateService
+from services.template_snapshot_service import TemplateSnapshotBuilder
+
+
+def main():
+    args = sys.argv[1:]
+    if args not in ([], ['--once']):
+        print(__doc__)
+        sys.exit(1)
+
+    builder = TemplateSnapshotBuilder(TemplateService())
+    generation = builder.build()
+    print(f"✅ Published generation {generation} to {builder.directory}")
+    if args == ['--once']:
+        return
+
+    try:
+        while True:
+            builder._stop.wait(builder.interval)
+            builder.refresh()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
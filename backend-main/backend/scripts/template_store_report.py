@@ -0,0 +1,87 @@
+"""
+Measure the quantized template store: memory per user and similarity error
+against the exact float64 templates.
+
+Usage (from the backend/ directory):
+    python -m scripts.template_store_report                  # templates from the database
+    python -m scripts.template_store_report --synthetic 10000
+"""
+import sys
+
+import numpy as np
+
+from services.template_store_service import (
+    QuantizedTemplateStore, TemplateService, batch_similarity
+)
+
+# Login vectors scored against every template per dtype
+PROBES = 200
+# AuthService.STATISTICAL_THRESHOLD
+DECISION_THRESHOLD = 0.65
+
+
+def synthetic_templates(n_users, seed=7):
+    """Plausible per-user means (ms / rates) with log-normal spread"""
+    rng = np.random.default_rng(seed)
+    #             ks_count ks_rate dwell  d_std flight f_std digraph g_std bksp  wps   wpm
+    centre = np.array([60, 5.0, 100, 25, 150, 60, 250, 80, 0.05, 0.8, 45])
+    return centre * rng.lognormal(0.0, 0.35, size=(n_users, len(centre)))
+
+
+def database_templates():
+    service = TemplateService(dtype='float16')
+    service.load_all()
+    store = service.store
+    rows = store.live_rows()
+    return store.user_ids[rows].copy(), store.dequantize(store.codes[rows])
+
+
+def report(user_ids, exact, dtype):
+    store = QuantizedTemplateStore(dtype)
+    store.calibrate(exact)
+    store.put_many(user_ids, exact)
+    stats = store.memory_stats()
+
+    rng = np.random.default_rng(11)
+    probes = exact[rng.integers(0, len(exact), PROBES)] * rng.lognormal(0.0, 0.15, size=(PROBES, exact.shape[1]))
+    approx = store.get_many(user_ids)
+    threshold = DECISION_THRESHOLD
+
+    errors, flips, total = [], 0, 0
+    for probe in probes:
+        s_exact = batch_similarity(probe, exact)
+        s_approx = batch_similarity(probe, approx)
+        errors.append(np.abs(s_exact - s_approx))
+        flips += int(np.count_nonzero((s_exact >= threshold) != (s_approx >= threshold)))
+        total += len(s_exact)
+    errors = np.concatenate(errors)
+
+    print(f"\n{dtype}")
+    print(f"   users:              {stats['users']}")
+    print(f"   bytes/user:         {stats['bytes_per_user']:.1f} (float64 template: {exact.shape[1] * 8})")
+    print(f"   mean |Δsimilarity|: {errors.mean():.6f}")
+    print(f"   max  |Δsimilarity|: {errors.max():.6f}")
+    print(f"   decision flips @ {threshold}: {flips} / {total} ({flips / total:.4%})")
+
+
+def main():
+    args = sys.argv[1:]
+    if args[:1] == ['--synthetic'] and len(args) == 2:
+        exact = synthetic_templates(int(args[1]))
+        user_ids = np.arange(1, len(exact) + 1)
+    elif not args:
+        user_ids, exact = database_templates()
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+    if not len(exact):
+        print("⚠️ No enrolled users with enough samples")
+        return
+
+    for dtype in ('int8', 'float16'):
+        report(user_ids, exact, dtype)
+
+
+if __name__ == '__main__':
+    main()
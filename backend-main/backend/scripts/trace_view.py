@@ -0,0 +1,121 @@
+"""
+Render request traces from the tracing JSONL sink as a waterfall.
+
+Usage (from the backend/ directory):
+    python -m scripts.trace_view                   # the most recent trace
+    python -m scripts.trace_view 3f9c2a...         # one trace by ID (a prefix is enough)
+    python -m scripts.trace_view --list [--limit 20]
+    python -m scripts.trace_view --slowest 5 [--name "POST /api/login"]
+    python -m scripts.trace_view --file instance/traces/traces.jsonl.1
+
+Rotated files (traces.jsonl.1, .2, ...) are searched too unless --file is given.
+"""
+import argparse
+import glob
+import json
+import os
+from datetime import datetime
+
+from utils.tracing_util import TRACE_FILE
+
+BAR_WIDTH = 50
+
+
+def trace_files(path):
+    """Newest first: traces.jsonl, then traces.jsonl.1, .2, ... ({pid} matches every worker)"""
+    pattern = path.replace('{pid}', '*')
+    current = sorted(glob.glob(pattern), key=os.path.getmtime, reverse=True)
+    rotated = sorted(glob.glob(pattern + '.*'), key=lambda p: int(p.rsplit('.', 1)[1])
+                     if p.rsplit('.', 1)[1].isdigit() else 0)
+    return current + rotated
+
+
+def read_traces(files):
+    for path in files:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # partially written last line
+
+
+def format_attributes(attributes):
+    return ' '.join(f"{key}={value}" for key, value in attributes.items() if value is not None)
+
+
+def render(trace, width=BAR_WIDTH):
+    """Indented span tree with a bar per span on the trace's time axis"""
+    total = max(trace['duration_ms'], 1e-6)
+    started = datetime.fromtimestamp(trace['started_at']).isoformat(sep=' ', timespec='milliseconds')
+    lines = [f"🔎 trace {trace['trace_id']}  {trace['name']}  {trace['duration_ms']:.1f} ms  "
+             f"({started}, pid {trace.get('pid')})"]
+
+    children = {}
+    for span in trace['spans']:
+        children.setdefault(span['parent_id'], []).append(span)
+
+    rows = []
+
+    def walk(span, depth):
+        rows.append((span, depth))
+        for child in sorted(children.get(span['span_id'], []), key=lambda s: s['start_ms']):
+            walk(child, depth + 1)
+
+    for root in children.get(None, []):
+        walk(root, 0)
+
+    label_width = min(48, max(len(span['name']) + 2 * depth for span, depth in rows))
+    for span, depth in rows:
+        offset = int(span['start_ms'] / total * width)
+        length = max(1, int(round(span['duration_ms'] / total * width)))
+        bar = (' ' * offset + '█' * length)[:width].ljust(width)
+        label = ('  ' * depth + span['name'])[:label_width].ljust(label_width)
+        lines.append(f"  {label} |{bar}| {span['duration_ms']:9.2f} ms  {format_attributes(span['attributes'])}")
+
+    if trace.get('dropped_spans'):
+        lines.append(f"  ⚠️ {trace['dropped_spans']} spans dropped (per-trace limit)")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('trace_id', nargs='?', help='trace ID or prefix (default: the most recent trace)')
+    parser.add_argument('--file', help=f'trace file (default: {TRACE_FILE} and its rotations)')
+    parser.add_argument('--list', action='store_true', help='list traces instead of rendering one')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--slowest', type=int, metavar='N', help='render the N slowest traces')
+    parser.add_argument('--name', help='only traces with this root name, e.g. "POST /api/login"')
+    args = parser.parse_args()
+
+    files = [args.file] if args.file else trace_files(TRACE_FILE)
+    if not files or not all(os.path.exists(path) for path in files):
+        print(f"❌ No trace file found ({args.file or TRACE_FILE}); set TYPEID_TRACE_SAMPLE_RATE to record traces")
+        return
+
+    traces = [t for t in read_traces(files) if args.name is None or t['name'] == args.name]
+    if args.trace_id:
+        traces = [t for t in traces if t['trace_id'].startswith(args.trace_id)]
+    if not traces:
+        print("❌ No matching traces")
+        return
+
+    if args.list:
+        for trace in sorted(traces, key=lambda t: t['started_at'], reverse=True)[:args.limit]:
+            started = datetime.fromtimestamp(trace['started_at']).isoformat(sep=' ', timespec='seconds')
+            print(f"{trace['trace_id']}  {started}  {trace['duration_ms']:9.1f} ms  "
+                  f"{len(trace['spans']):3d} spans  {trace['name']}")
+        return
+
+    if args.slowest:
+        selected = sorted(traces, key=lambda t: t['duration_ms'], reverse=True)[:args.slowest]
+    else:
+        selected = [max(traces, key=lambda t: t['started_at'])]
+    print('\n\n'.join(render(trace) for trace in selected))
+
+
+if __name__ == '__main__':
+    main()
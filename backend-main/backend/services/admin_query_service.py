@@ -0,0 +1,170 @@
+"""
+Admin query API over user, biometric_profile and login_session
+
+Every listing is keyset (seek) paginated on an indexed integer key:
+
+    WHERE key > :after ORDER BY key LIMIT :limit
+
+so page 10,000 costs the same index seek as page 1 (no OFFSET scan), and
+only the requested columns are selected. Rows are read from the cursor in
+small batches and handed to the caller as a generator, so the response can
+be streamed without holding a whole page in memory.
+"""
+import json
+import os
+
+from services.user_service import get_db_connection
+
+ADMIN_PAGE_SIZE = int(os.getenv('TYPEID_ADMIN_PAGE_SIZE', '100'))
+ADMIN_MAX_PAGE_SIZE = int(os.getenv('TYPEID_ADMIN_MAX_PAGE_SIZE', '5000'))
+
+# Rows pulled from the SQLite cursor per fetchmany()
+STREAM_BATCH = 256
+
+# resource -> source, keyset column, selectable fields, default projection, filters
+RESOURCES = {
+    'users': {
+        'source': '"user"',
+        'key': 'user_id',
+        'fields': ('user_id', 'name', 'email', 'created_at'),
+        'default_fields': ('user_id', 'name', 'email', 'created_at'),
+        'filters': (),
+    },
+    'enrollments': {
+        'source': 'biometric_profile',
+        'key': 'biometric_id',
+        'fields': ('biometric_id', 'user_id', 'reg_id', 'sample_text', 'typing_pattern',
+                   'created_date', 'last_updated'),
+        'default_fields': ('biometric_id', 'user_id', 'sample_text', 'created_date'),
+        'filters': ('user_id',),
+    },
+    'sessions': {
+        'source': 'login_session',
+        'key': 'session_id',
+        'fields': ('session_id', 'user_id', 'reg_id', 'login_time', 'logout_time',
+                   'status', 'login_method', 'IP_address'),
+        'default_fields': ('session_id', 'user_id', 'login_time', 'status', 'login_method'),
+        'filters': ('user_id',),
+    },
+}
+
+# Columns stored as JSON text that are returned as objects
+JSON_FIELDS = {'typing_pattern'}
+
+INDEX_DDL = (
+    "CREATE INDEX IF NOT EXISTS idx_biometric_profile_user ON biometric_profile (user_id, biometric_id)",
+)
+
+
+class AdminQueryError(ValueError):
+    """Invalid admin query parameters (unknown resource/field, bad cursor)"""
+
+
+class AdminQueryService:
+    """Keyset-paginated, projected listings for the admin API"""
+
+    def _get_conn(self):
+        return get_db_connection()
+
+    def ensure_indexes(self):
+        """Indexes backing the filtered keyset scans (idempotent)"""
+        conn = self._get_conn()
+        try:
+            for ddl in INDEX_DDL:
+                conn.execute(ddl)
+        finally:
+            conn.close()
+
+    def build_query(self, resource, fields=None, after=None, limit=None,
+                    descending=False, filters=None):
+        """
+        Validate parameters and build the keyset query
+
+        Args:
+            resource: 'users' | 'enrollments' | 'sessions'
+            fields: column names to return (default projection if None)
+            after: last key of the previous page (None for the first page)
+            limit: page size, capped at ADMIN_MAX_PAGE_SIZE
+            descending: newest first
+            filters: dict of equality filters, e.g. {'user_id': 7}
+
+        Returns:
+            (sql, params, fields, key, limit)
+
+        Raises:
+            AdminQueryError
+        """
+        spec = RESOURCES.get(resource)
+        if spec is None:
+            raise AdminQueryError(f"Unknown resource '{resource}'")
+
+        fields = tuple(fields) if fields else spec['default_fields']
+        unknown = [f for f in fields if f not in spec['fields']]
+        if unknown:
+            raise AdminQueryError(
+                f"Unknown field(s) for {resource}: {', '.join(unknown)}. "
+                f"Allowed: {', '.join(spec['fields'])}"
+            )
+
+        key = spec['key']
+        # The key is always selected first so the next cursor can be produced
+        columns = (key,) + tuple(f for f in fields if f != key)
+
+        limit = ADMIN_PAGE_SIZE if limit is None else limit
+        if limit < 1:
+            raise AdminQueryError('limit must be at least 1')
+        limit = min(limit, ADMIN_MAX_PAGE_SIZE)
+
+        where, params = [], []
+        for name, value in (filters or {}).items():
+            if name not in spec['filters']:
+                raise AdminQueryError(f"Cannot filter {resource} by '{name}'")
+            where.append(f"{name} = ?")
+            params.append(value)
+        if after is not None:
+            where.append(f"{key} {'<' if descending else '>'} ?")
+            params.append(after)
+
+        sql = f"SELECT {', '.join(columns)} FROM {spec['source']}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {key} {'DESC' if descending else 'ASC'} LIMIT ?"
+        params.append(limit)
+        return sql, params, fields, key, limit
+
+    def iter_rows(self, resource, **kwargs):
+        """
+        Stream one page as dicts of the projected fields
+
+        Parameters are validated before the first row is produced, so
+        errors surface before a streamed response has started.
+
+        Returns:
+            (generator of (key, row dict), effective limit)
+        """
+        sql, params, fields, _, limit = self.build_query(resource, **kwargs)
+        return self._generate(sql, params, fields), limit
+
+    def _generate(self, sql, params, fields):
+        conn = self._get_conn()
+        try:
+            cursor = conn.execute(sql, params)
+            names = [d[0] for d in cursor.description]
+            positions = [names.index(f) for f in fields]
+            while True:
+                batch = cursor.fetchmany(STREAM_BATCH)
+                if not batch:
+                    break
+                for row in batch:
+                    item = {}
+                    for field, pos in zip(fields, positions):
+                        value = row[pos]
+                        if field in JSON_FIELDS and value:
+                            try:
+                                value = json.loads(value)
+                            except ValueError:
+                                pass
+                        item[field] = value
+                    yield row[0], item
+        finally:
+            conn.close()
@@ -0,0 +1,190 @@
+"""
+Admission control for login endpoints
+
+Runs before any DB or model work so floods of login attempts (brute force,
+client retry loops) are rejected in microseconds instead of each running
+the full sample fetch + statistical + XGBoost pipeline.
+
+- Token bucket per username and per client IP
+- Global limit on concurrently running logins (per process)
+
+Bucket state lives in process memory by default. With a prefork server
+(gunicorn -w N) set TYPEID_ADMISSION_BACKEND=sqlite so all workers share
+the buckets through a small SQLite file next to the main database.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from utils.metrics_util import metrics
+
+ADMISSION_BACKEND = os.getenv('TYPEID_ADMISSION_BACKEND', 'memory')
+ADMISSION_DB_PATH = os.getenv(
+    'TYPEID_ADMISSION_DB',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'admission.db')
+)
+
+USER_BUCKET_CAPACITY = float(os.getenv('TYPEID_RATE_USER_CAPACITY', '5'))
+USER_BUCKET_REFILL = float(os.getenv('TYPEID_RATE_USER_REFILL', '0.2'))    # tokens/second
+IP_BUCKET_CAPACITY = float(os.getenv('TYPEID_RATE_IP_CAPACITY', '20'))
+IP_BUCKET_REFILL = float(os.getenv('TYPEID_RATE_IP_REFILL', '1.0'))        # tokens/second
+MAX_CONCURRENT_LOGINS = int(os.getenv('TYPEID_MAX_CONCURRENT_LOGINS', '16'))
+
+# Memory backend: most buckets kept before the least recently used are dropped
+MAX_TRACKED_KEYS = 100000
+# SQLite backend: idle buckets older than this are deleted during cleanup
+STALE_BUCKET_SECONDS = 3600
+CLEANUP_EVERY = 1000
+
+
+def _refill(tokens, updated, now, capacity, refill_rate):
+    return min(capacity, tokens + (now - updated) * refill_rate)
+
+
+class MemoryBucketStore:
+    """Token buckets in process memory (LRU-bounded)"""
+
+    def __init__(self, max_keys=MAX_TRACKED_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate, now=None):
+        """
+        Take one token from the bucket for key
+
+        Returns:
+            0.0 if admitted, otherwise seconds until a token is available
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = capacity if bucket is None else _refill(bucket[0], bucket[1], now, capacity, refill_rate)
+
+            if tokens >= 1.0:
+                self._buckets[key] = (tokens - 1.0, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1.0 - tokens) / refill_rate if refill_rate > 0 else float('inf')
+
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class SQLiteBucketStore:
+    """Token buckets shared across worker processes through a SQLite file"""
+
+    def __init__(self, db_path=ADMISSION_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._ops = 0
+        conn = self._get_conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS admission_bucket (
+                bucket_key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+
+    def _get_conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, capacity, refill_rate, now=None):
+        # Wall clock: monotonic clocks are not comparable across processes
+        now = time.time() if now is None else now
+        conn = self._get_conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated FROM admission_bucket WHERE bucket_key = ?", (key,)
+            ).fetchone()
+            tokens = capacity if row is None else _refill(row[0], row[1], now, capacity, refill_rate)
+
+            if tokens >= 1.0:
+                tokens -= 1.0
+                wait = 0.0
+            else:
+                wait = (1.0 - tokens) / refill_rate if refill_rate > 0 else float('inf')
+
+            conn.execute(
+                "INSERT OR REPLACE INTO admission_bucket (bucket_key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens, now)
+            )
+            self._ops += 1
+            if self._ops % CLEANUP_EVERY == 0:
+                conn.execute(
+                    "DELETE FROM admission_bucket WHERE updated < ?", (now - STALE_BUCKET_SECONDS,)
+                )
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class AdmissionTicket:
+    """Result of an admission check; release() frees the concurrency slot"""
+
+    __slots__ = ('admitted', 'reason', 'retry_after', '_semaphore')
+
+    def __init__(self, admitted, reason=None, retry_after=0.0, semaphore=None):
+        self.admitted = admitted
+        self.reason = reason
+        self.retry_after = retry_after
+        self._semaphore = semaphore
+
+    def release(self):
+        if self._semaphore is not None:
+            self._semaphore.release()
+            self._semaphore = None
+
+
+class AdmissionController:
+    """Per-user / per-IP token buckets plus a global concurrency limit"""
+
+    def __init__(self, backend=ADMISSION_BACKEND, max_concurrent=MAX_CONCURRENT_LOGINS):
+        self.store = SQLiteBucketStore() if backend == 'sqlite' else MemoryBucketStore()
+        self.max_concurrent = max_concurrent
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+
+    def admit(self, username=None, client_ip=None):
+        """
+        Decide whether a login attempt may proceed
+
+        Returns:
+            AdmissionTicket - call release() when the request finishes
+        """
+        try:
+            if client_ip:
+                wait = self.store.take(f'ip:{client_ip}', IP_BUCKET_CAPACITY, IP_BUCKET_REFILL)
+                if wait > 0:
+                    metrics.incr('admission.rejected.ip')
+                    return AdmissionTicket(False, 'Too many login attempts from this address', wait)
+
+            if username:
+                wait = self.store.take(f'user:{username.lower()}', USER_BUCKET_CAPACITY, USER_BUCKET_REFILL)
+                if wait > 0:
+                    metrics.incr('admission.rejected.user')
+                    return AdmissionTicket(False, 'Too many login attempts for this user', wait)
+        except sqlite3.Error as e:
+            # Fail open - a broken limiter must not lock everyone out
+            print(f"⚠️ Admission store error: {e}")
+
+        if not self._semaphore.acquire(blocking=False):
+            metrics.incr('admission.rejected.concurrency')
+            return AdmissionTicket(False, 'Server busy, please retry', 1.0)
+
+        metrics.incr('admission.admitted')
+        return AdmissionTicket(True, semaphore=self._semaphore)
@@ -5,6 +5,7 @@ Two-Layer Authentication:
 2. ML model prediction
 """
 
+import importlib
 import sys
 import os
 import numpy as np
@@ -13,8 +14,14 @@ from scipy.stats import zscore
 from collections import Counter
 
 # ---------------------------------------------------
-# ML MODEL PATH FIX (folder name has space)
+# LAYER 2 PREDICTOR
 # ---------------------------------------------------
+# TYPEID_PREDICT_MODULE names the module serving predict_user(): by default
+# the in-repo services.predict, which loads TYPEID_MODEL_BUNDLE (or the
+# legacy pickles). If it cannot be imported, the legacy `ml model/predict.py`
+# next to the repository is tried, then a stub that predicts "unknown".
+PREDICT_MODULE = os.getenv('TYPEID_PREDICT_MODULE', 'services.predict')
+
 current_file = os.path.abspath(__file__)
 services_dir = os.path.dirname(current_file)
 backend_dir = os.path.dirname(services_dir)
@@ -24,39 +31,67 @@ typing_outer = os.path.dirname(typing_inner)
 
 ml_model_path = os.path.join(typing_outer, "ml model")
 
-print(f"🔍 Current file: {current_file}")
-print(f"🔍 ML Model Path: {ml_model_path}")
-print(f"📁 ML Model exists: {os.path.exists(ml_model_path)}")
-print(f"📁 predict.py exists: {os.path.exists(os.path.join(ml_model_path, 'predict.py'))}")
-
-if os.path.exists(ml_model_path):
-    sys.path.insert(0, ml_model_path)
-    print(f"✅ Added {ml_model_path} to sys.path")
-else:
-    print("❌ ML Model path does not exist")
-
-# Import predict_user
-try:
-    from predict import predict_user
-    print("✅ Successfully imported predict_user")
-except Exception as e:
-    print(f"❌ Failed to import predict_user: {e}")
+
+def _import_predictor():
+    """(module, predict_user) for the first predictor that imports, or (None, stub)"""
+    try:
+        module = importlib.import_module(PREDICT_MODULE)
+        print(f"✅ Layer 2 predictor: {PREDICT_MODULE} (model {getattr(module, 'MODEL_VERSION', '?')})")
+        return module, module.predict_user
+    except Exception as e:
+        print(f"⚠️ Failed to import {PREDICT_MODULE}: {e}")
+
+    # Legacy external model folder (name has a space)
+    if os.path.exists(os.path.join(ml_model_path, 'predict.py')):
+        sys.path.insert(0, ml_model_path)
+        try:
+            module = importlib.import_module('predict')
+            print(f"✅ Layer 2 predictor: {ml_model_path}/predict.py")
+            return module, module.predict_user
+        except Exception as e:
+            print(f"❌ Failed to import {ml_model_path}/predict.py: {e}")
+
+    print("❌ No layer 2 predictor - global-engine logins will fail layer 2")
+
     def predict_user(x):
         return {
             "predicted_user": "unknown",
             "confidence": 0.0,
             "raw_predictions": []
         }
+    return None, predict_user
+
+
+predict_module, predict_user = _import_predictor()
 
 from services.user_service import UserService
+from services.verifier_service import VerifierService
+from services.enrollment_retention_service import MIN_ENROLLMENT_SAMPLES
+from services.template_store_service import TEMPLATE_STORE_ENABLED
+from services.template_snapshot_service import create_template_service
+from services.score_memo_service import ScoreMemo, SCORE_MEMO_ENABLED
+from utils.metrics_util import metrics
+from utils.tracing_util import tracer
+from utils.feature_schema import FEATURE_SCHEMA
+
+# Predictors that take the (n, 11) schema array directly declare
+# ACCEPTS_ARRAYS; any other predict.py gets the feature dicts it reads
+PREDICT_ACCEPTS_ARRAYS = getattr(predict_module, 'ACCEPTS_ARRAYS', False)
+
+# Layer 2 engine: 'global' (multi-class XGBoost) or 'per_user' (one-class verifiers)
+VERIFICATION_ENGINE = os.getenv('TYPEID_VERIFICATION_ENGINE', 'global')
 
 
 # ===================================================
 # AUTH SERVICE (FIXED)
 # ===================================================
 class AuthService:
-    def __init__(self):
+    def __init__(self, verification_engine=VERIFICATION_ENGINE):
         self.user_service = UserService()
+        self.verification_engine = verification_engine
+        self.verifier_service = VerifierService()
+        self.template_service = create_template_service() if TEMPLATE_STORE_ENABLED else None
+        self.score_memo = ScoreMemo() if SCORE_MEMO_ENABLED else None
         
         # Thresholds
         self.STATISTICAL_THRESHOLD = 0.65   # 65% similarity required
@@ -72,7 +107,19 @@ class AuthService:
         2. ML model prediction
         
         Both must pass for authentication to succeed
+        
+        keystroke_features_list may be an array already parsed by
+        FEATURE_SCHEMA (as the login routes do) or a raw payload, which is
+        validated here; either way the same array feeds both layers.
+
+        Raises:
+            FeatureValidationError: a raw payload failed validation
         """
+        if isinstance(keystroke_features_list, np.ndarray):
+            login_matrix = FEATURE_SCHEMA.to_array(keystroke_features_list)
+        else:
+            login_matrix = FEATURE_SCHEMA.parse(keystroke_features_list)
+        
         print(f"\n{'='*80}")
         print(f"🔐 AUTHENTICATION REQUEST for user: {username}")
         print(f"{'='*80}")
@@ -88,28 +135,62 @@ class AuthService:
                 "details": None
             }
 
-        # Get registered samples from database
-        registered_samples = self.user_service.get_user_keystroke_samples(username)
-        if not registered_samples or len(registered_samples) < 3:
-            print(f"⚠️  Insufficient registered samples: {len(registered_samples) if registered_samples else 0}")
-            return {
-                "authenticated": False,
-                "message": "Insufficient training data. Please register first.",
-                "user": None,
-                "details": None
-            }
-
-        print(f"✅ Found {len(registered_samples)} registered samples for {username}")
+        user_id = user.get('user_id') or user.get('id')
+        tracer.set_attributes(user=username, user_id=user_id, samples=len(login_matrix))
+        insufficient = {
+            "authenticated": False,
+            "message": "Insufficient training data. Please register first.",
+            "user": None,
+            "details": None
+        }
+        
+        # In-memory template first: no biometric_profile reads on a hit
+        template, template_version = self.get_template_version(user_id)
+
+        # A retried identical payload gets the decision already made for it
+        memo = self.memoized_decision(user_id, username, login_matrix, template_version)
+        if memo is not None:
+            tracer.set_attributes(memo_hit=True, authenticated=memo['authenticated'])
+            print(f"♻️ Identical login payload for {username} - reusing the memoized decision")
+            return memo
+
+        if template is not None:
+            print(f"✅ Using in-memory template for {username}")
+        else:
+            # Indexed, bounded count before fetching anything
+            if not self.user_service.has_enough_samples(user_id):
+                print("⚠️  Insufficient registered samples")
+                return insufficient
+
+            # Get the retained enrollment window from database
+            with metrics.timer('stage.fetch_samples'):
+                registered_samples = self.user_service.get_keystroke_samples_by_user_id(user_id)
+            if not registered_samples or len(registered_samples) < MIN_ENROLLMENT_SAMPLES:
+                print(f"⚠️  Insufficient registered samples: {len(registered_samples) if registered_samples else 0}")
+                return insufficient
+
+            print(f"✅ Found {len(registered_samples)} registered samples for {username}")
+            if self.template_service is not None:
+                self.template_service.update_user(user_id, registered_samples)
+                # Score against the stored (quantized) template, exactly as
+                # every later hit will, so the decision does not depend on
+                # whether this login happened to miss the cache
+                template, template_version = self.get_template_version(user_id)
+            if template is None:
+                template = FEATURE_SCHEMA.to_array(registered_samples).mean(axis=0)
 
         # ---------------- LAYER 1: Statistical Matching ----------------
         print(f"\n{'─'*80}")
         print("📊 LAYER 1: Statistical Matching Against Database Samples")
         print(f"{'─'*80}")
         
-        statistical_score = self.statistical_matching(
-            keystroke_features_list,
-            registered_samples
-        )
+        with metrics.timer('stage.statistical'), \
+                tracer.span('statistical_matching', user=username, samples=len(login_matrix),
+                            template_version=template_version):
+            statistical_score = self.statistical_matching(
+                login_matrix,
+                reference=template
+            )
         
         statistical_pass = statistical_score >= self.STATISTICAL_THRESHOLD
         
@@ -122,9 +203,17 @@ class AuthService:
         print("🤖 LAYER 2: ML Model Prediction")
         print(f"{'─'*80}")
         
-        predicted_user, ml_confidence = self.predict_user_from_keystroke(
-            keystroke_features_list
-        )
+        with metrics.timer('stage.ml'), \
+                tracer.span('predict_user', user=username, samples=len(login_matrix),
+                            engine=self.verification_engine, model_version=self.model_version()):
+            if self.verification_engine == 'per_user':
+                predicted_user, ml_confidence = self.verify_user_from_keystroke(
+                    user, login_matrix
+                )
+            else:
+                predicted_user, ml_confidence = self.predict_user_from_keystroke(
+                    login_matrix
+                )
 
         ml_user_match = predicted_user.lower() == username.lower()
         ml_confidence_pass = ml_confidence >= self.ML_CONFIDENCE_THRESHOLD
@@ -145,6 +234,8 @@ class AuthService:
         
         # BOTH layers must pass
         authenticated = statistical_pass and ml_pass
+        tracer.set_attributes(authenticated=authenticated, statistical_score=round(statistical_score, 4),
+                              ml_confidence=ml_confidence, memo_hit=False)
 
         print(f"   Layer 1 (Statistical): {'✅ PASS' if statistical_pass else '❌ FAIL'}")
         print(f"   Layer 2 (ML Model):     {'✅ PASS' if ml_pass else '❌ FAIL'}")
@@ -163,7 +254,7 @@ class AuthService:
                 reasons.append(f"confidence too low ({ml_confidence:.1f}% < {self.ML_CONFIDENCE_THRESHOLD:.1f}%)")
             message = f"Authentication failed: {', '.join(reasons)}"
 
-        return {
+        result = {
             "authenticated": authenticated,
             "user": user if authenticated else None,
             "message": message,
@@ -183,29 +274,85 @@ class AuthService:
                 }
             }
         }
+        self.memoize_decision(user_id, username, login_matrix, template_version, result)
+        return result
+
+    # ---------------------------------------------------
+    # ENROLLMENT TEMPLATES
+    # ---------------------------------------------------
+    def get_template(self, user_id):
+        """User's enrollment template from the in-memory store, or None"""
+        template, _ = self.get_template_version(user_id)
+        return template
+
+    def get_template_version(self, user_id):
+        """(template, version) from the in-memory store, or (None, 0); compare versions only for equality"""
+        if self.template_service is None:
+            return None, 0
+        return self.template_service.get_template(user_id)
+
+    def refresh_enrollment(self, user_id, samples):
+        """
+        Rebuild everything derived from a user's enrollment window
+        (per-user verifier and statistical template) after new samples
+        """
+        self.verifier_service.train_user(user_id, samples)
+        if self.template_service is not None:
+            self.template_service.update_user(user_id, samples)
+        if self.score_memo is not None:
+            self.score_memo.invalidate_user(user_id)
+
+    # ---------------------------------------------------
+    # DECISION MEMO
+    # ---------------------------------------------------
+    def model_version(self):
+        """Version of the layer 2 model currently serving (changes on a model swap)"""
+        if self.verification_engine == 'per_user':
+            return 'per_user'
+        return getattr(predict_module, 'MODEL_VERSION', None)
+
+    def _memo_key(self, user_id, username, login_matrix, template_version):
+        return ScoreMemo.make_key(user_id, username, login_matrix, template_version,
+                                  self.model_version(), self.verification_engine)
+
+    def memoized_decision(self, user_id, username, login_matrix, template_version):
+        """Result of an identical recent authentication, or None"""
+        if self.score_memo is None:
+            return None
+        return self.score_memo.get(self._memo_key(user_id, username, login_matrix, template_version))
+
+    def memoize_decision(self, user_id, username, login_matrix, template_version, result):
+        if self.score_memo is not None:
+            self.score_memo.put(self._memo_key(user_id, username, login_matrix, template_version), result)
 
     # ---------------------------------------------------
     # STATISTICAL MATCHING
     # ---------------------------------------------------
-    def statistical_matching(self, login_samples, registered_samples):
+    def statistical_matching(self, login_samples, registered_samples=None, reference=None):
         """
         Compare login keystroke features against stored registration samples
         Uses cosine similarity of normalized feature vectors
+        
+        Both arguments may be lists of feature dicts or FEATURE_SCHEMA arrays.
+        reference: precomputed registered average (the user's template),
+        used instead of registered_samples
         """
         try:
-            # Extract feature vectors from login samples
-            login_vectors = [self._extract_feature_vector(s) for s in login_samples]
-            login_avg = np.mean(login_vectors, axis=0)
+            login_vectors = FEATURE_SCHEMA.to_array(login_samples)
+            login_avg = login_vectors.mean(axis=0)
             
-            print(f"   📥 Login samples: {len(login_samples)}")
+            print(f"   📥 Login samples: {len(login_vectors)}")
             print(f"   📥 Login avg vector: {login_avg[:3]}... (showing first 3)")
 
-            # Extract feature vectors from registered samples
-            reg_vectors = [self._extract_feature_vector(s) for s in registered_samples]
-            reg_avg = np.mean(reg_vectors, axis=0)
-            
-            print(f"   📊 Registered samples: {len(registered_samples)}")
-            print(f"   📊 Registered avg vector: {reg_avg[:3]}... (showing first 3)")
+            if reference is not None:
+                reg_avg = np.asarray(reference, dtype=np.float64)
+                print(f"   📊 Registered template: {reg_avg[:3]}... (showing first 3)")
+            else:
+                reg_vectors = FEATURE_SCHEMA.to_array(registered_samples)
+                reg_avg = reg_vectors.mean(axis=0)
+                
+                print(f"   📊 Registered samples: {len(reg_vectors)}")
+                print(f"   📊 Registered avg vector: {reg_avg[:3]}... (showing first 3)")
 
             # Calculate similarity
             similarity = self._calculate_similarity(login_avg, reg_avg)
@@ -218,36 +365,6 @@ class AuthService:
             traceback.print_exc()
             return 0.0
 
-    # ---------------------------------------------------
-    # FEATURE EXTRACTION (FIXED ORDER)
-    # ---------------------------------------------------
-    def _extract_feature_vector(self, sample):
-        """
-        Extract feature vector in the EXACT order used during training
-        CRITICAL: Must match train_model.py feature order
-        """
-        if isinstance(sample, list):
-            sample = sample[0]
-
-        # EXACT order from training
-        feature_keys = [
-            "ks_count", "ks_rate",
-            "dwell_mean", "dwell_std",
-            "flight_mean", "flight_std",
-            "digraph_mean", "digraph_std",
-            "backspace_rate", "wps", "wpm"
-        ]
-
-        vector = []
-        for key in feature_keys:
-            value = sample.get(key, 0.0)
-            # Handle None values
-            if value is None:
-                value = 0.0
-            vector.append(float(value))
-        
-        return np.array(vector)
-
     # ---------------------------------------------------
     # SIMILARITY CALCULATION
     # ---------------------------------------------------
@@ -286,6 +403,8 @@ class AuthService:
             confidence is on 0-100 scale
         """
         try:
+            if isinstance(keystroke_features_list, np.ndarray) and not PREDICT_ACCEPTS_ARRAYS:
+                keystroke_features_list = [FEATURE_SCHEMA.to_dict(row) for row in keystroke_features_list]
             result = predict_user(keystroke_features_list)
 
             predicted_user = result.get("predicted_user", "unknown")
@@ -302,4 +421,36 @@ class AuthService:
             print(f"   ❌ ML Prediction error: {e}")
             import traceback
             traceback.print_exc()
-            return "unknown", 0.0
\ No newline at end of file
+            return "unknown", 0.0
+
+    # ---------------------------------------------------
+    # PER-USER VERIFIER
+    # ---------------------------------------------------
+    def verify_user_from_keystroke(self, user, keystroke_features_list):
+        """
+        Score keystroke features against the claimed user's own verifier model
+
+        Returns:
+            (predicted_user, confidence) in the same shape as
+            predict_user_from_keystroke, so the decision logic is unchanged
+        """
+        try:
+            user_id = user.get('user_id') or user.get('id')
+            confidence = self.verifier_service.verify(user_id, keystroke_features_list)
+
+            if confidence is None:
+                print(f"   ⚠️  No verifier model for user_id {user_id}")
+                return "unknown", 0.0
+
+            print(f"   🤖 Per-user verifier returned:")
+            print(f"      Confidence: {confidence:.2f}%")
+
+            # A one-class model can only claim the user it was trained for
+            predicted_user = user['name'] if confidence >= self.ML_CONFIDENCE_THRESHOLD else "unknown"
+            return predicted_user, round(confidence, 2)
+
+        except Exception as e:
+            print(f"   ❌ Verifier error: {e}")
+            import traceback
+            traceback.print_exc()
+            return "unknown", 0.0
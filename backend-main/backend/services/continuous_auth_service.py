@@ -0,0 +1,357 @@
+"""
+Continuous authentication service
+
+Keeps verifying a user during a session from incrementally streamed key
+events instead of re-posting the full typing history to /api/login.
+
+Each session holds O(1) state: Welford running mean/variance for dwell,
+flight and digraph intervals, a few counters, and two small ring buffers
+used to pair the i-th keydown with the i-th keyup (same pairing as the
+frontend's calculateFeatures). Every event is processed in constant time
+and the match score is recomputed from the running state, never from the
+event history.
+
+A session can only be opened with a login token: a single-use grant that a
+successful /api/login, /api/login-hybrid or /api/login-password returns
+as "continuous_token". Scores are therefore only ever reported to someone
+who already authenticated as that user. Grants live in process memory
+like the sessions themselves (sticky routing behind a prefork server).
+
+Event chunks are rate-limited per session with their own token bucket, not
+the login admission buckets: a busy typist must neither be cut off by the
+per-IP login limit nor use it up for the logins behind the same address.
+"""
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from services.admission_service import MemoryBucketStore
+from services.enrollment_retention_service import MIN_ENROLLMENT_SAMPLES
+from utils.feature_schema import FEATURE_SCHEMA
+from utils.feature_extractor import (
+    MIN_KEY_DOWNS, MAX_DWELL_MS, MAX_FLIGHT_MS, MAX_DIGRAPH_MS,
+    DEFAULT_DWELL_MEAN, DEFAULT_FLIGHT_MEAN, DEFAULT_DIGRAPH_MEAN, DEFAULT_STD,
+    DEFAULT_BACKSPACE_RATE, DEFAULT_WPS, DEFAULT_WPM
+)
+
+CONTINUOUS_MAX_SESSIONS = int(os.getenv('TYPEID_CONTINUOUS_MAX_SESSIONS', '10000'))
+CONTINUOUS_SESSION_TTL = float(os.getenv('TYPEID_CONTINUOUS_SESSION_TTL', '1800'))  # seconds idle
+CONTINUOUS_GRANT_TTL = float(os.getenv('TYPEID_CONTINUOUS_GRANT_TTL', '300'))  # seconds after login
+CONTINUOUS_EVENTS_CAPACITY = float(os.getenv('TYPEID_CONTINUOUS_EVENTS_CAPACITY', '20'))
+CONTINUOUS_EVENTS_REFILL = float(os.getenv('TYPEID_CONTINUOUS_EVENTS_REFILL', '5.0'))  # chunks/second
+
+# Single error for every rejected start, so it reveals nothing about the user
+INVALID_LOGIN_TOKEN = 'Invalid or expired login token'
+
+# How far keydowns and keyups may drift apart (held/rolled-over keys)
+PAIRING_WINDOW = 32
+
+# Weight of the newest chunk score in the rolling (EWMA) score
+ROLLING_ALPHA = 0.3
+
+
+class RunningStat:
+    """Welford running mean / population variance"""
+
+    __slots__ = ('n', 'mean', 'm2')
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def push(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def get_mean(self, default):
+        return (self.mean if self.n else 0.0) or default
+
+    def get_std(self):
+        if self.n < 2:
+            return float(DEFAULT_STD)
+        return (self.m2 / self.n) ** 0.5
+
+
+class _Ring:
+    """Fixed-size index -> timestamp buffer"""
+
+    __slots__ = ('times', 'indexes')
+
+    def __init__(self, size=PAIRING_WINDOW):
+        self.times = [0.0] * size
+        self.indexes = [-1] * size
+
+    def put(self, index, t):
+        slot = index % len(self.times)
+        self.times[slot] = t
+        self.indexes[slot] = index
+
+    def get(self, index):
+        if index < 0:
+            return None
+        slot = index % len(self.times)
+        return self.times[slot] if self.indexes[slot] == index else None
+
+
+class ContinuousSession:
+    """Bounded per-session state"""
+
+    def __init__(self, user_id, username, reference_vector):
+        self.user_id = user_id
+        self.username = username
+        self.reference_vector = reference_vector
+        self.created = time.time()
+        self.last_seen = self.created
+
+        self.dwell = RunningStat()
+        self.flight = RunningStat()
+        self.digraph = RunningStat()
+
+        self.n_down = 0
+        self.n_up = 0
+        self.first_down = None
+        self.last_down = None
+        self.backspace_events = 0
+        self.space_downs = 0
+        self.char_downs = 0
+
+        self._downs = _Ring()
+        self._ups = _Ring()
+
+        self.score = None
+        self.rolling_score = None
+        self.lock = threading.Lock()
+
+    # ---------------------------------------------------
+    # EVENT INGESTION - O(1) per event
+    # ---------------------------------------------------
+    def add_event(self, event_type, t, key=None):
+        if key == 'Backspace':
+            self.backspace_events += 1
+
+        if event_type == 'down':
+            i = self.n_down
+            self.n_down += 1
+            self._downs.put(i, t)
+
+            if self.first_down is None:
+                self.first_down = t
+            if self.last_down is not None:
+                self._push_window(self.digraph, t - self.last_down, MAX_DIGRAPH_MS)
+            self.last_down = t
+
+            if key == ' ':
+                self.space_downs += 1
+            if key is not None and len(key) == 1:
+                self.char_downs += 1
+
+            # dwell[i] = up[i] - down[i]  (keyup arrived first)
+            up = self._ups.get(i)
+            if up is not None:
+                self._push_window(self.dwell, up - t, MAX_DWELL_MS)
+            # flight[i-1] = down[i] - up[i-1]
+            up = self._ups.get(i - 1)
+            if up is not None:
+                self._push_window(self.flight, t - up, MAX_FLIGHT_MS)
+
+        elif event_type == 'up':
+            i = self.n_up
+            self.n_up += 1
+            self._ups.put(i, t)
+
+            # dwell[i] = up[i] - down[i]
+            down = self._downs.get(i)
+            if down is not None:
+                self._push_window(self.dwell, t - down, MAX_DWELL_MS)
+            # flight[i] = down[i+1] - up[i]  (next keydown arrived first)
+            down = self._downs.get(i + 1)
+            if down is not None:
+                self._push_window(self.flight, down - t, MAX_FLIGHT_MS)
+
+    @staticmethod
+    def _push_window(stat, value, high):
+        if 0 < value < high:
+            stat.push(value)
+
+    # ---------------------------------------------------
+    # FEATURES FROM RUNNING STATE
+    # ---------------------------------------------------
+    def features(self):
+        """Current 11 features, or None until enough keydowns were seen"""
+        if self.n_down < MIN_KEY_DOWNS:
+            return None
+
+        total_time_sec = (self.last_down - self.first_down) / 1000
+        total_time_min = total_time_sec / 60
+        total_events = self.n_down + self.n_up
+
+        return {
+            'ks_count': self.n_down,
+            'ks_rate': self.n_down / max(total_time_sec, 1),
+            'dwell_mean': self.dwell.get_mean(DEFAULT_DWELL_MEAN),
+            'dwell_std': self.dwell.get_std(),
+            'flight_mean': self.flight.get_mean(DEFAULT_FLIGHT_MEAN),
+            'flight_std': self.flight.get_std(),
+            'digraph_mean': self.digraph.get_mean(DEFAULT_DIGRAPH_MEAN),
+            'digraph_std': self.digraph.get_std(),
+            'backspace_rate': self.backspace_events / max(total_events, 1) or DEFAULT_BACKSPACE_RATE,
+            'wps': (self.space_downs + 1) / max(total_time_sec, 1) or DEFAULT_WPS,
+            'wpm': (self.char_downs / 5) / max(total_time_min, 1) or DEFAULT_WPM
+        }
+
+
+class ContinuousAuthService:
+    """Manages continuous authentication sessions"""
+
+    def __init__(self, auth_service, max_sessions=CONTINUOUS_MAX_SESSIONS,
+                 session_ttl=CONTINUOUS_SESSION_TTL, grant_ttl=CONTINUOUS_GRANT_TTL):
+        self.auth_service = auth_service
+        self.user_service = auth_service.user_service
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.grant_ttl = grant_ttl
+        self._sessions = OrderedDict()
+        self._grants = OrderedDict()      # login token -> (user_id, username, issued)
+        self._event_buckets = MemoryBucketStore(max_keys=max_sessions)
+        self._lock = threading.Lock()
+
+    def issue_grant(self, user_id, username):
+        """
+        Login token for one continuous session, called after a successful login
+
+        Returns:
+            single-use token valid for grant_ttl seconds
+        """
+        token = secrets.token_urlsafe(16)
+        with self._lock:
+            self._expire_grants()
+            self._grants[token] = (user_id, username, time.time())
+            while len(self._grants) > self.max_sessions:
+                self._grants.popitem(last=False)
+        return token
+
+    def start_session(self, login_token):
+        """
+        Open a continuous session for the user a login token was issued to
+
+        Returns:
+            (token, error_message) - token is None on error
+        """
+        with self._lock:
+            grant = self._grants.pop(login_token, None) if isinstance(login_token, str) else None
+        if grant is None or time.time() - grant[2] > self.grant_ttl:
+            return None, INVALID_LOGIN_TOKEN
+
+        user_id, username, _ = grant
+
+        # Enrollment reference is computed once; scoring never touches the DB
+        reference = self.auth_service.get_template(user_id)
+        if reference is None:
+            if not self.user_service.has_enough_samples(user_id):
+                return None, 'Insufficient training data. Please register first.'
+
+            samples = self.user_service.get_keystroke_samples_by_user_id(user_id)
+            if len(samples) < MIN_ENROLLMENT_SAMPLES:
+                return None, 'Insufficient training data. Please register first.'
+            reference = FEATURE_SCHEMA.to_array(samples).mean(axis=0)
+
+        token = secrets.token_urlsafe(16)
+        with self._lock:
+            self._expire()
+            self._sessions[token] = ContinuousSession(user_id, username, reference)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+        print(f"🔄 Continuous session started for {username}")
+        return token, None
+
+    def get_session(self, token):
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            if time.time() - session.last_seen > self.session_ttl:
+                del self._sessions[token]
+                return None
+            self._sessions.move_to_end(token)
+            return session
+
+    def admit_events(self, token):
+        """
+        Take one token from the session's event bucket
+
+        Returns:
+            0.0 if the chunk may be processed (or the session does not
+            exist - add_events reports that), otherwise seconds to wait
+        """
+        with self._lock:
+            if token not in self._sessions:
+                return 0.0
+        return self._event_buckets.take(token, CONTINUOUS_EVENTS_CAPACITY, CONTINUOUS_EVENTS_REFILL)
+
+    def add_events(self, token, events):
+        """
+        Feed a chunk of key events and rescore
+
+        Args:
+            token: session token
+            events: list of {"type": "down"|"up", "time": ms, "key": str}
+
+        Returns:
+            result dict, or None if the session does not exist
+        """
+        session = self.get_session(token)
+        if session is None:
+            return None
+
+        with session.lock:
+            for event in events:
+                session.add_event(event['type'], float(event['time']), event.get('key'))
+            session.last_seen = time.time()
+
+            features = session.features()
+            if features is not None:
+                vector = FEATURE_SCHEMA.to_array(features)[0]
+                session.score = self.auth_service._calculate_similarity(vector, session.reference_vector)
+                if session.rolling_score is None:
+                    session.rolling_score = session.score
+                else:
+                    session.rolling_score = (
+                        ROLLING_ALPHA * session.score + (1 - ROLLING_ALPHA) * session.rolling_score
+                    )
+
+            threshold = self.auth_service.STATISTICAL_THRESHOLD
+            return {
+                'username': session.username,
+                'events_processed': session.n_down + session.n_up,
+                'score': session.score,
+                'rolling_score': session.rolling_score,
+                'threshold': threshold,
+                'match': session.rolling_score is not None and session.rolling_score >= threshold,
+                'features': features
+            }
+
+    def end_session(self, token):
+        with self._lock:
+            return self._sessions.pop(token, None) is not None
+
+    def _expire(self):
+        now = time.time()
+        while self._sessions:
+            token, session = next(iter(self._sessions.items()))
+            if now - session.last_seen <= self.session_ttl:
+                break
+            del self._sessions[token]
+
+    def _expire_grants(self):
+        now = time.time()
+        while self._grants:
+            token, grant = next(iter(self._grants.items()))
+            if now - grant[2] <= self.grant_ttl:
+                break
+            del self._grants[token]
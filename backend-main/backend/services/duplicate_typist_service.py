@@ -0,0 +1,191 @@
+"""
+Offline near-duplicate typist detection
+
+Finds accounts whose enrollment templates are suspiciously close, i.e. one
+typist behind several accounts. The similarity is the same one statistical
+matching uses (z-score each template across its features, Euclidean
+distance, exp(-d / n_features)), but computed for all pairs at once:
+
+    z-scored rows have ||z||^2 = n (or 0 for a constant row), so
+    d(i, j)^2 = ||z_i||^2 + ||z_j||^2 - 2 z_i . z_j
+
+which turns every BLOCK_SIZE x BLOCK_SIZE tile into one matrix product.
+Row strips of tiles (i <= j only) are spread over a process pool; each
+strip returns just its best TOP_K pairs, so memory is bounded by
+workers x tile size + strips x TOP_K however many users there are.
+Results replace the contents of the typist_similarity table.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from utils.db_util import get_db
+from services.template_store_service import TemplateService, zscore_rows
+
+DUPLICATE_TOP_K = int(os.getenv('TYPEID_DUPLICATE_TOP_K', '1000'))
+DUPLICATE_MIN_SIMILARITY = float(os.getenv('TYPEID_DUPLICATE_MIN_SIMILARITY', '0.9'))
+DUPLICATE_WORKERS = int(os.getenv('TYPEID_DUPLICATE_WORKERS', str(os.cpu_count() or 1)))
+
+# 1024 x 1024 float64 tile = 8 MB: one tile plus its mask stays cache friendly
+BLOCK_SIZE = 1024
+
+SIMILARITY_DDL = """
+CREATE TABLE IF NOT EXISTS typist_similarity (
+    user_id_a INTEGER NOT NULL,
+    user_id_b INTEGER NOT NULL,
+    similarity REAL NOT NULL,
+    computed_at TEXT NOT NULL,
+    PRIMARY KEY (user_id_a, user_id_b)
+)
+"""
+
+# float32 screening error bound on d^2 (|z|^2 = 11, ~1e-6 relative)
+FLOAT32_SLACK = 1e-3
+
+# Set in each pool worker by _init_worker
+_Z = None
+_Z32 = None
+_SQ32 = None
+
+
+def _init_worker(Z):
+    global _Z, _Z32, _SQ32
+    _Z = Z
+    _Z32 = Z.astype(np.float32)
+    _SQ32 = np.einsum('ij,ij->i', _Z32, _Z32)
+
+
+def _top_k(rows, cols, sims, k):
+    if len(sims) <= k:
+        return rows, cols, sims
+    keep = np.argpartition(sims, -k)[-k:]
+    return rows[keep], cols[keep], sims[keep]
+
+
+def _strip(start, block_size, top_k, min_similarity):
+    """
+    Best pairs (i, j), i in [start, start + block_size), j > i
+
+    Tiles are screened in float32 (half the memory traffic); the few
+    candidates that pass are rescored exactly in float64.
+
+    Returns:
+        (rows, cols, similarities) - at most top_k entries
+    """
+    Z, Z32, SQ32 = _Z, _Z32, _SQ32
+    n_features = Z.shape[1]
+    stop = min(start + block_size, len(Z))
+    A, sq_a = Z32[start:stop], SQ32[start:stop, None]
+    # exp(-d / n) >= min_similarity  <=>  d^2 <= (-n log min_similarity)^2
+    max_d2 = (-n_features * np.log(min_similarity)) ** 2 if min_similarity > 0 else np.inf
+
+    best = (np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0))
+    for col_start in range(start, len(Z), block_size):
+        col_stop = min(col_start + block_size, len(Z))
+        d2 = A @ Z32[col_start:col_stop].T
+        d2 *= -2.0
+        d2 += sq_a
+        d2 += SQ32[col_start:col_stop]
+        candidate = d2 <= max_d2 + FLOAT32_SLACK
+        if col_start == start:
+            candidate &= np.triu(np.ones(d2.shape, dtype=bool), k=1)
+        r, c = np.nonzero(candidate)
+        if not len(r):
+            continue
+        r += start
+        c += col_start
+        exact = np.einsum('ij,ij->i', Z[r] - Z[c], Z[r] - Z[c])
+        keep = exact <= max_d2
+        sims = np.exp(-np.sqrt(exact[keep]) / n_features)
+        best = _top_k(
+            np.concatenate([best[0], r[keep]]),
+            np.concatenate([best[1], c[keep]]),
+            np.concatenate([best[2], sims]),
+            top_k
+        )
+        if len(best[2]) == top_k:
+            # Only pairs beating the current k-th best can still make it
+            max_d2 = min(max_d2, (-n_features * np.log(best[2].min())) ** 2)
+    return best
+
+
+def find_similar_pairs(templates, top_k=DUPLICATE_TOP_K, min_similarity=DUPLICATE_MIN_SIMILARITY,
+                       workers=DUPLICATE_WORKERS, block_size=BLOCK_SIZE):
+    """
+    Top-k most similar template pairs
+
+    Args:
+        templates: (n, n_features) float64
+        top_k: pairs to return
+        min_similarity: ignore pairs below this similarity
+        workers: processes (1 = run in this process)
+
+    Returns:
+        list of (row_a, row_b, similarity), most similar first
+    """
+    Z = zscore_rows(templates)
+    # Largest strips (the first ones) go first so the pool finishes evenly
+    starts = list(range(0, len(Z), block_size))
+    args = (block_size, top_k, min_similarity)
+
+    if workers <= 1 or len(starts) == 1:
+        _init_worker(Z)
+        results = [_strip(start, *args) for start in starts]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(Z,)) as pool:
+            results = list(pool.map(_strip, starts, *[[a] * len(starts) for a in args]))
+
+    rows = np.concatenate([r[0] for r in results]) if results else np.empty(0, np.int64)
+    cols = np.concatenate([r[1] for r in results]) if results else np.empty(0, np.int64)
+    sims = np.concatenate([r[2] for r in results]) if results else np.empty(0)
+    rows, cols, sims = _top_k(rows, cols, sims, top_k)
+    order = np.argsort(-sims, kind='stable')
+    return [(int(rows[i]), int(cols[i]), float(sims[i])) for i in order]
+
+
+class DuplicateTypistService:
+    """Runs the all-pairs job over the enrolled templates and stores the result"""
+
+    def __init__(self, template_service=None):
+        self.template_service = template_service or TemplateService()
+
+    def load_templates(self):
+        """(user_ids, (n, n_features) float64 templates) for every enrolled user"""
+        store = self.template_service.store
+        if not len(store):
+            self.template_service.load_all()
+        rows = store.live_rows()
+        return store.user_ids[rows].copy(), store.dequantize(store.codes[rows])
+
+    def run(self, top_k=DUPLICATE_TOP_K, min_similarity=DUPLICATE_MIN_SIMILARITY, workers=DUPLICATE_WORKERS):
+        """
+        Compute the top-k near-duplicate pairs and replace typist_similarity
+
+        Returns:
+            number of pairs stored
+        """
+        start = time.perf_counter()
+        user_ids, templates = self.load_templates()
+        pairs = find_similar_pairs(templates, top_k, min_similarity, workers)
+        elapsed = time.perf_counter() - start
+        print(f"🔎 Compared {len(user_ids)} templates ({len(user_ids) * (len(user_ids) - 1) // 2} pairs) "
+              f"in {elapsed:.1f}s: {len(pairs)} pairs >= {min_similarity}")
+
+        now = datetime.now().isoformat()
+        rows = [
+            (int(min(user_ids[a], user_ids[b])), int(max(user_ids[a], user_ids[b])), sim, now)
+            for a, b, sim in pairs
+        ]
+
+        def replace(conn):
+            conn.execute(SIMILARITY_DDL)
+            conn.execute("DELETE FROM typist_similarity")
+            conn.executemany(
+                "INSERT INTO typist_similarity (user_id_a, user_id_b, similarity, computed_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+        get_db().write_sync(replace)
+        return len(rows)
@@ -0,0 +1,92 @@
+"""
+Enrollment sample retention
+
+Users who re-enroll keep adding biometric_profile rows. Only a bounded
+window of them is used for matching:
+
+    recent     the newest TYPEID_ENROLLMENT_WINDOW samples (default)
+    reservoir  a uniform sample of everything the user ever enrolled,
+               kept as the rows with the smallest hashed biometric_id
+               (bottom-k sampling: order independent, so compaction can
+               run at any time and always keeps the same rows)
+
+Logins read only the window (an indexed LIMIT query); compact() deletes
+rows outside it in the background.
+"""
+import os
+
+from utils.db_util import get_db
+
+ENROLLMENT_WINDOW = int(os.getenv('TYPEID_ENROLLMENT_WINDOW', '20'))   # 0 = keep everything
+ENROLLMENT_RETENTION = os.getenv('TYPEID_ENROLLMENT_RETENTION', 'recent')
+MIN_ENROLLMENT_SAMPLES = 3
+
+# Users compacted per write transaction
+COMPACT_BATCH_USERS = 200
+
+# Knuth multiplicative hash: a fixed pseudo-random priority per row
+RESERVOIR_PRIORITY_SQL = "((biometric_id * 2654435761) % 4294967296)"
+
+RETENTION_ORDER = {
+    'recent': "biometric_id DESC",
+    'reservoir': f"{RESERVOIR_PRIORITY_SQL}, biometric_id",
+}
+
+
+def window_order(policy=ENROLLMENT_RETENTION):
+    """ORDER BY clause that puts the retained samples first"""
+    try:
+        return RETENTION_ORDER[policy]
+    except KeyError:
+        raise ValueError(f"Unknown enrollment retention policy '{policy}'") from None
+
+
+class EnrollmentRetentionService:
+    """Prunes biometric_profile rows that fall outside each user's window"""
+
+    def __init__(self, window=ENROLLMENT_WINDOW, policy=ENROLLMENT_RETENTION):
+        self.window = window
+        self.order = window_order(policy)
+
+    def users_over_window(self):
+        rows = get_db().fetch_all(
+            "SELECT user_id FROM biometric_profile GROUP BY user_id HAVING COUNT(*) > ?",
+            (self.window,)
+        )
+        return [row[0] for row in rows]
+
+    def compact(self):
+        """
+        Delete samples outside the retention window for every user
+
+        Returns:
+            number of rows deleted
+        """
+        if self.window <= 0:
+            return 0
+
+        query = f"""
+        DELETE FROM biometric_profile
+        WHERE user_id = ? AND biometric_id NOT IN (
+            SELECT biometric_id FROM biometric_profile
+            WHERE user_id = ?
+            ORDER BY {self.order}
+            LIMIT ?
+        )
+        """
+
+        def prune(user_ids):
+            return lambda conn: sum(
+                conn.execute(query, (user_id, user_id, self.window)).rowcount for user_id in user_ids
+            )
+
+        users = self.users_over_window()
+        deleted = 0
+        db = get_db()
+        # Short transactions so logins are never queued behind a long purge
+        for i in range(0, len(users), COMPACT_BATCH_USERS):
+            deleted += db.write_sync(prune(users[i:i + COMPACT_BATCH_USERS]))
+
+        if deleted:
+            print(f"🧹 Pruned {deleted} enrollment samples outside the window for {len(users)} users")
+        return deleted
@@ -0,0 +1,234 @@
+"""
+Server-side enrollment sessions
+
+/api/register is called once per typing attempt (3-5 times per user) and
+each call autocommits: a user abandoning enrollment after the first
+attempt is left behind with one sample. An enrollment session instead
+buffers the attempts in memory under a token and writes everything at
+completion as one job on the database writer, i.e. one transaction:
+
+    user + user_registration (with the password hash)
+    every biometric_profile sample
+    the per-user verifier model (user_verifier)
+
+Nothing reaches the database until completion, so an abandoned or expired
+session leaves no rows. After the commit the in-memory derived state (the
+template store, the username filter) is updated.
+
+Sessions live in process memory, like continuous sessions; behind a
+prefork server route an enrollment to one worker (sticky sessions).
+"""
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from services.enrollment_retention_service import ENROLLMENT_WINDOW, MIN_ENROLLMENT_SAMPLES
+from services.username_filter_service import get_username_filter
+from services.verifier_service import UserVerifierModel, MIN_TRAINING_SAMPLES
+from utils.db_util import get_db
+from utils.feature_schema import FEATURE_SCHEMA
+from utils.tracing_util import tracer
+from utils.password_util import hash_password_async, validate_password, PASSWORD_TOO_LONG
+from utils.validation_util import validate_email
+
+ENROLLMENT_REQUIRED_SAMPLES = int(os.getenv('TYPEID_ENROLLMENT_SAMPLES', '5'))
+ENROLLMENT_MAX_SESSIONS = int(os.getenv('TYPEID_ENROLLMENT_MAX_SESSIONS', '10000'))
+ENROLLMENT_SESSION_TTL = float(os.getenv('TYPEID_ENROLLMENT_SESSION_TTL', '1800'))  # seconds idle
+
+# Samples one session may buffer (the retained window, or 20 if unbounded)
+MAX_SESSION_SAMPLES = ENROLLMENT_WINDOW or 20
+
+DEFAULT_SAMPLE_TEXT = 'The quick brown fox jumps over the lazy dog'
+
+
+class EnrollmentError(ValueError):
+    """Enrollment request that cannot proceed (message is safe to return)"""
+
+
+class EnrollmentSession:
+    """Buffered enrollment attempts for one prospective user"""
+
+    def __init__(self, name, email, password_future=None):
+        self.name = name
+        self.email = email
+        # bcrypt runs on the hash pool while the user types their samples
+        self.password_future = password_future
+        self.samples = []                 # (sample_text, feature dict)
+        self.created = time.time()
+        self.last_seen = self.created
+        self.completed = False
+        self.lock = threading.Lock()
+
+
+class EnrollmentService:
+    """Manages enrollment sessions and their single-transaction commit"""
+
+    def __init__(self, auth_service, required_samples=ENROLLMENT_REQUIRED_SAMPLES,
+                 max_sessions=ENROLLMENT_MAX_SESSIONS, session_ttl=ENROLLMENT_SESSION_TTL):
+        self.auth_service = auth_service
+        self.user_service = auth_service.user_service
+        self.required_samples = max(required_samples, MIN_ENROLLMENT_SAMPLES)
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, name, email, password=None):
+        """
+        Open an enrollment session
+
+        Returns:
+            enrollment token
+
+        Raises:
+            EnrollmentError: missing/invalid fields or the username is taken
+        """
+        if not name or not email:
+            raise EnrollmentError('Username and email are required')
+        if not validate_email(email):
+            raise EnrollmentError('Invalid email address')
+        if password and not validate_password(password):
+            raise EnrollmentError(PASSWORD_TOO_LONG)
+        if self.user_service.find_user_by_name(name):
+            raise EnrollmentError('Username already exists')
+
+        session = EnrollmentSession(name, email, hash_password_async(password) if password else None)
+        token = secrets.token_urlsafe(16)
+        with self._lock:
+            self._expire()
+            self._sessions[token] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+        print(f"📝 Enrollment session started for {name}")
+        return token
+
+    def get_session(self, token):
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            if time.time() - session.last_seen > self.session_ttl:
+                del self._sessions[token]
+                return None
+            self._sessions.move_to_end(token)
+            return session
+
+    def add_sample(self, token, keystroke_features, sample_text=None):
+        """
+        Validate and buffer one typing attempt
+
+        Returns:
+            progress dict, or None if the session does not exist
+
+        Raises:
+            FeatureValidationError: invalid keystroke features
+            EnrollmentError: the session is full or already completed
+        """
+        session = self.get_session(token)
+        if session is None:
+            return None
+
+        vector = FEATURE_SCHEMA.parse(keystroke_features)
+        if len(vector) != 1:
+            raise EnrollmentError('Send one keystroke sample per attempt')
+
+        with session.lock:
+            if session.completed:
+                raise EnrollmentError('Enrollment already completed')
+            if len(session.samples) >= MAX_SESSION_SAMPLES:
+                raise EnrollmentError(f'At most {MAX_SESSION_SAMPLES} samples per enrollment')
+            session.samples.append((sample_text or DEFAULT_SAMPLE_TEXT, FEATURE_SCHEMA.to_dict(vector[0])))
+            session.last_seen = time.time()
+            return self._progress(session)
+
+    def status(self, token):
+        session = self.get_session(token)
+        if session is None:
+            return None
+        with session.lock:
+            return self._progress(session)
+
+    def complete(self, token):
+        """
+        Write the user, registration, samples and verifier model in one
+        transaction, then refresh the in-memory derived state
+
+        Returns:
+            the new user dict, or None if the session does not exist
+
+        Raises:
+            EnrollmentError: too few samples, or the username/email was
+                taken meanwhile (nothing is written)
+        """
+        session = self.get_session(token)
+        if session is None:
+            return None
+
+        with session.lock:
+            if session.completed:
+                raise EnrollmentError('Enrollment already completed')
+            if len(session.samples) < self.required_samples:
+                raise EnrollmentError(
+                    f'{self.required_samples} samples required, {len(session.samples)} received'
+                )
+
+            samples = list(session.samples)
+            password_hash = session.password_future.result() if session.password_future else None
+            vectors = FEATURE_SCHEMA.to_array([features for _, features in samples])
+            model = UserVerifierModel.fit(vectors) if len(samples) >= MIN_TRAINING_SAMPLES else None
+            verifier_service = self.auth_service.verifier_service
+
+            def write(conn):
+                # Re-checked inside the transaction: another session may have won the name
+                if conn.execute('SELECT 1 FROM "user" WHERE name = ?', (session.name,)).fetchone():
+                    raise EnrollmentError('Username already exists')
+                if conn.execute('SELECT 1 FROM "user" WHERE email = ?', (session.email,)).fetchone():
+                    raise EnrollmentError('Email already registered')
+                user = self.user_service.insert_user(conn, session.name, session.email, password_hash)
+                self.user_service.insert_keystroke_profiles(conn, user['user_id'], user['user_id'], samples)
+                if model is not None:
+                    verifier_service.store_model(conn, user['user_id'], model, len(samples))
+                return user
+
+            with tracer.span('enrollment.commit', user=session.name, samples=len(samples)):
+                user = get_db().write_sync(write)
+            session.completed = True
+
+        with self._lock:
+            self._sessions.pop(token, None)
+
+        # Derived in-memory state, now that the rows are committed
+        user_id = user['user_id']
+        template_service = self.auth_service.template_service
+        if template_service is not None:
+            template_service.update_user(user_id, vectors)
+        username_filter = get_username_filter()
+        if username_filter is not None:
+            username_filter.add(user['name'])
+
+        print(f"✅ Enrollment committed for {user['name']} (user_id {user_id}, {len(samples)} samples)")
+        return user
+
+    def cancel(self, token):
+        """Drop a session; nothing was written for it"""
+        with self._lock:
+            return self._sessions.pop(token, None) is not None
+
+    def _progress(self, session):
+        return {
+            'username': session.name,
+            'samples': len(session.samples),
+            'required': self.required_samples,
+            'ready': len(session.samples) >= self.required_samples,
+        }
+
+    def _expire(self):
+        now = time.time()
+        while self._sessions:
+            token, session = next(iter(self._sessions.items()))
+            if now - session.last_seen <= self.session_ttl:
+                break
+            del self._sessions[token]
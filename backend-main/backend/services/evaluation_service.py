@@ -0,0 +1,401 @@
+"""
+Batched FAR/FRR/EER evaluation of both authentication layers
+
+Instead of calling authenticate_user once per genuine/impostor pair, a
+labeled sample set is split per user into enrollment samples (the first
+`enroll` of each user) and login attempts (the rest, `attempt_size`
+samples each). Every attempt is then scored against every enrolled user
+in one batched pass per layer:
+
+    statistical   z-scored attempt mean vs. template similarity (one GEMM)
+    ml (global)   share of the attempt's samples the model assigns to the
+                  claimed user, if that user wins the vote (else 0)
+    ml (per_user) scaled-Manhattan verifier confidence (UserVerifierModel)
+
+giving (attempts x users) score matrices. The diagonal-by-label entries
+are genuine pairs, everything else impostor pairs. Error rates come from
+sorted scores and searchsorted, and the two-layer AND decision over a
+whole threshold grid from one 2-D histogram, so millions of pairs take
+seconds.
+
+A pair passes a layer when score >= threshold, as in AuthService.
+"""
+import json
+
+import numpy as np
+from scipy.stats import norm
+
+from utils.db_util import get_db
+from utils.feature_schema import FEATURE_SCHEMA
+from services.template_store_service import zscore_rows
+from services.verifier_service import SCALE_FLOOR_RATIO, SCALE_EPSILON, DISTANCE_SCALE
+
+# Current AuthService thresholds
+STATISTICAL_THRESHOLD = 0.65
+ML_CONFIDENCE_THRESHOLD = 30.0
+
+DEFAULT_ENROLL_SAMPLES = 5
+# Samples scored per block by the per-user verifier layer
+VERIFIER_BLOCK_SAMPLES = 4096
+# Points kept in returned ROC/DET curves
+CURVE_POINTS = 500
+# Candidate thresholds searched for the EER crossing
+EER_CANDIDATES = 20000
+
+
+# ---------------------------------------------------
+# ERROR RATES
+# ---------------------------------------------------
+def error_rates(genuine, impostor, thresholds, presorted=False):
+    """
+    FAR and FRR at each threshold (accept when score >= threshold)
+
+    Args:
+        presorted: genuine/impostor are already sorted ascending (sort
+            once, then query many thresholds)
+
+    Returns:
+        (far, frr) arrays shaped like thresholds
+    """
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    if not presorted:
+        genuine, impostor = np.sort(genuine), np.sort(impostor)
+    far = 1.0 - np.searchsorted(impostor, thresholds, side='left') / max(len(impostor), 1)
+    frr = np.searchsorted(genuine, thresholds, side='left') / max(len(genuine), 1)
+    return far, frr
+
+
+def _candidate_thresholds(genuine, impostor, limit, reject_all=True):
+    """Up to `limit` thresholds spread over the quantiles of both sorted score sets"""
+    picks = []
+    for scores in (genuine, impostor):
+        if len(scores) > limit // 2:
+            scores = scores[np.linspace(0, len(scores) - 1, limit // 2).astype(np.int64)]
+        picks.append(np.asarray(scores, dtype=np.float64))
+    # +inf: the "reject everything" end of the curve
+    if reject_all:
+        picks.append([np.inf])
+    return np.unique(np.concatenate(picks))
+
+
+def equal_error_rate(genuine, impostor, limit=EER_CANDIDATES, presorted=False):
+    """
+    EER and its threshold, interpolated where FAR and FRR cross
+
+    Returns:
+        (eer, threshold)
+    """
+    if not presorted:
+        genuine, impostor = np.sort(genuine), np.sort(impostor)
+    thresholds = _candidate_thresholds(genuine, impostor, limit)
+    far, frr = error_rates(genuine, impostor, thresholds, presorted=True)
+    diff = far - frr                    # decreasing in the threshold
+    i = int(np.argmax(diff <= 0))
+    if i == 0:
+        return float(frr[0]), float(thresholds[0])
+    d0, d1 = diff[i - 1], diff[i]
+    w = d0 / (d0 - d1) if d0 != d1 else 0.0
+    eer = (1 - w) * (far[i - 1] + frr[i - 1]) / 2 + w * (far[i] + frr[i]) / 2
+    t1 = thresholds[i] if np.isfinite(thresholds[i]) else thresholds[i - 1]
+    return float(eer), float((1 - w) * thresholds[i - 1] + w * t1)
+
+
+def roc_curve(genuine, impostor, points=CURVE_POINTS, presorted=False):
+    """
+    ROC / DET curve sampled at about `points` thresholds
+
+    Returns:
+        dict of thresholds, far, frr, tpr and the DET axes (probit of FAR/FRR)
+    """
+    if not presorted:
+        genuine, impostor = np.sort(genuine), np.sort(impostor)
+    thresholds = _candidate_thresholds(genuine, impostor, points, reject_all=False)
+    far, frr = error_rates(genuine, impostor, thresholds, presorted=True)
+    clip = lambda p: np.clip(p, 1e-6, 1 - 1e-6)
+    return {
+        'thresholds': thresholds,
+        'far': far,
+        'frr': frr,
+        'tpr': 1.0 - frr,
+        'det_far': norm.ppf(clip(far)),
+        'det_frr': norm.ppf(clip(frr)),
+    }
+
+
+def operating_point(genuine_stat, genuine_ml, impostor_stat, impostor_ml, stat_threshold, ml_threshold):
+    """FAR/FRR of the two-layer decision (both layers must pass) at one threshold pair"""
+    accept_genuine = (genuine_stat >= stat_threshold) & (genuine_ml >= ml_threshold)
+    accept_impostor = (impostor_stat >= stat_threshold) & (impostor_ml >= ml_threshold)
+    return {
+        'stat_threshold': float(stat_threshold),
+        'ml_threshold': float(ml_threshold),
+        'far': float(accept_impostor.mean()) if len(accept_impostor) else 0.0,
+        'frr': float(1.0 - accept_genuine.mean()) if len(accept_genuine) else 0.0,
+    }
+
+
+def joint_error_surface(genuine_stat, genuine_ml, impostor_stat, impostor_ml, stat_grid, ml_grid):
+    """
+    Two-layer FAR/FRR for every (stat, ml) threshold pair of a grid
+
+    One 2-D histogram per class over the grid cells, then reversed
+    cumulative sums give "both scores >= thresholds" counts for all pairs.
+
+    Returns:
+        (far, frr) arrays shaped (len(stat_grid), len(ml_grid))
+    """
+    stat_grid = np.asarray(stat_grid, dtype=np.float64)
+    ml_grid = np.asarray(ml_grid, dtype=np.float64)
+
+    def accepted_fraction(stat, ml):
+        if not len(stat):
+            return np.zeros((len(stat_grid), len(ml_grid)))
+        # Cell k holds scores in [grid[k], grid[k+1]); cell -1 is below grid[0]
+        si = np.searchsorted(stat_grid, stat, side='right') - 1
+        mi = np.searchsorted(ml_grid, ml, side='right') - 1
+        keep = (si >= 0) & (mi >= 0)
+        counts = np.bincount(si[keep] * len(ml_grid) + mi[keep], minlength=len(stat_grid) * len(ml_grid))
+        counts = counts.reshape(len(stat_grid), len(ml_grid))[::-1, ::-1].cumsum(axis=0).cumsum(axis=1)[::-1, ::-1]
+        return counts / len(stat)
+
+    far = accepted_fraction(impostor_stat, impostor_ml)
+    frr = 1.0 - accepted_fraction(genuine_stat, genuine_ml)
+    return far, frr
+
+
+# ---------------------------------------------------
+# SCORING
+# ---------------------------------------------------
+def statistical_scores(attempt_means, templates):
+    """(attempts, users) statistical similarities, as AuthService._calculate_similarity"""
+    A, T = zscore_rows(attempt_means), zscore_rows(templates)
+    sq_a = np.einsum('ij,ij->i', A, A)[:, None]
+    sq_t = np.einsum('ij,ij->i', T, T)[None, :]
+    d2 = sq_a + sq_t - 2.0 * (A @ T.T)
+    return np.exp(-np.sqrt(np.maximum(d2, 0.0)) / templates.shape[1]).astype(np.float32)
+
+
+def vote_scores(predicted_user, attempt_size, n_users):
+    """
+    (attempts, users) global-model confidence for each claimed user:
+    vote share (0-100) when the claimed user wins the attempt's vote, else 0
+
+    Args:
+        predicted_user: per-sample predicted user index (-1 = not enrolled),
+            attempt_size consecutive samples per attempt
+    """
+    n_attempts = len(predicted_user) // attempt_size
+    attempt = np.repeat(np.arange(n_attempts), attempt_size)
+    known = predicted_user >= 0
+    counts = np.bincount(attempt[known] * n_users + predicted_user[known], minlength=n_attempts * n_users)
+    counts = counts.reshape(n_attempts, n_users)
+    winner = (counts == counts.max(axis=1, keepdims=True)) & (counts > 0)
+    return np.where(winner, counts * (100.0 / attempt_size), 0.0).astype(np.float32)
+
+
+def verifier_scores(samples, attempt_size, enrollments, block_samples=VERIFIER_BLOCK_SAMPLES):
+    """
+    (attempts, users) per-user verifier confidences (0-100), fitting each
+    user's UserVerifierModel from their enrollment samples
+
+    Accumulates one feature at a time over (samples, users) float32 blocks,
+    which keeps the temporaries in cache instead of materializing
+    (samples, users, features).
+    """
+    means = np.stack([e.mean(axis=0) for e in enrollments])
+    spread = np.stack([np.abs(e - e.mean(axis=0)).mean(axis=0) for e in enrollments])
+    scales = np.maximum(np.maximum(spread, np.abs(means) * SCALE_FLOOR_RATIO), SCALE_EPSILON)
+    # (features, users), contiguous per feature
+    means_t = np.ascontiguousarray(means.T, dtype=np.float32)
+    inv_scales_t = np.ascontiguousarray(1.0 / scales.T.astype(np.float32))
+
+    X = samples.astype(np.float32)
+    n_features = X.shape[1]
+    distance = np.empty((len(X), len(enrollments)), dtype=np.float32)
+    for start in range(0, len(X), block_samples):
+        block = X[start:start + block_samples]
+        d = distance[start:start + len(block)]
+        d.fill(0.0)
+        tmp = np.empty_like(d)
+        for f in range(n_features):
+            np.subtract(block[:, f, None], means_t[f], out=tmp)
+            np.abs(tmp, out=tmp)
+            tmp *= inv_scales_t[f]
+            d += tmp
+    n_attempts = len(X) // attempt_size
+    distance = distance.reshape(n_attempts, attempt_size, -1).mean(axis=1) / n_features
+    return (np.exp(-distance / DISTANCE_SCALE) * 100.0).astype(np.float32)
+
+
+def _global_model_predictor():
+    """Per-sample label predictor from the module serving layer 2 (bundle or legacy pickles), or None"""
+    from services.auth_service import predict_module as predict
+    if predict is None:
+        print("⚠️ ML model unavailable for evaluation")
+        return None
+    bundle = getattr(predict, 'bundle', None)
+    if bundle is not None:
+        return lambda X: bundle.predict_labels(X[:, [FEATURE_SCHEMA.index[f] for f in bundle.feature_order]])
+    return lambda X: predict.encoder.inverse_transform(
+        predict.model.predict(predict.scaler.transform(X[:, [FEATURE_SCHEMA.index[f] for f in predict.feature_cols]]))
+    )
+
+
+class EvaluationEngine:
+    """
+    Scores a labeled sample set with both layers and reports error rates
+
+    Args:
+        labels: per-sample user label (username), samples grouped in
+            enrollment order
+        samples: (n, 11) FEATURE_SCHEMA array
+        enroll: samples per user used as enrollment
+        attempt_size: samples per login attempt
+        ml_engine: 'global', 'per_user' or None (statistical layer only)
+        predictor: per-sample label predictor for the global engine
+            (defaults to predict.py)
+    """
+
+    def __init__(self, labels, samples, enroll=DEFAULT_ENROLL_SAMPLES, attempt_size=1,
+                 ml_engine='per_user', predictor=None):
+        self.enroll = enroll
+        self.attempt_size = attempt_size
+        self.ml_engine = ml_engine
+        self.predictor = predictor
+        self._pairs = None
+        self._split(np.asarray(labels), FEATURE_SCHEMA.to_array(samples))
+
+    @classmethod
+    def from_database(cls, **kwargs):
+        """Labeled samples from biometric_profile (username labels, enrollment order)"""
+        rows = get_db().fetch_all(
+            'SELECT u.name, b.typing_pattern FROM biometric_profile b '
+            'JOIN "user" u ON u.user_id = b.user_id ORDER BY b.user_id, b.biometric_id'
+        )
+        labels, samples = [], []
+        for name, pattern in rows:
+            try:
+                samples.append(json.loads(pattern) if isinstance(pattern, str) else pattern)
+                labels.append(name)
+            except ValueError:
+                continue
+        return cls(labels, samples, **kwargs)
+
+    def _split(self, labels, X):
+        """Per user: first `enroll` samples enroll, the rest form attempts"""
+        order = np.argsort(labels, kind='stable')
+        labels, X = labels[order], X[order]
+        users, starts, counts = np.unique(labels, return_index=True, return_counts=True)
+
+        enrollments, user_names, probe_rows, attempt_user = [], [], [], []
+        for name, start, count in zip(users, starts, counts):
+            n_probe = (count - self.enroll) // self.attempt_size * self.attempt_size
+            if count < self.enroll or n_probe <= 0:
+                continue
+            u = len(user_names)
+            user_names.append(name)
+            enrollments.append(X[start:start + self.enroll])
+            rows = np.arange(start + self.enroll, start + self.enroll + n_probe)
+            probe_rows.append(rows)
+            attempt_user.append(np.full(n_probe // self.attempt_size, u))
+
+        if len(user_names) < 2:
+            raise ValueError('Need at least two users with enrollment and probe samples')
+
+        self.users = np.asarray(user_names)
+        self.enrollments = enrollments
+        self.templates = np.stack([e.mean(axis=0) for e in enrollments])
+        # Probe rows: attempt_size consecutive samples per attempt
+        self.probes = X[np.concatenate(probe_rows)]
+        self.attempt_user = np.concatenate(attempt_user)
+        self.n_attempts = len(self.attempt_user)
+        self.attempt_means = self.probes.reshape(self.n_attempts, self.attempt_size, -1).mean(axis=1)
+
+    # ---------------------------------------------------
+    # SCORE MATRICES
+    # ---------------------------------------------------
+    def score_matrices(self):
+        """(statistical, ml) score matrices shaped (attempts, users); ml may be None"""
+        stat = statistical_scores(self.attempt_means, self.templates)
+        ml = None
+        if self.ml_engine == 'per_user':
+            ml = verifier_scores(self.probes, self.attempt_size, self.enrollments)
+        elif self.ml_engine == 'global':
+            predictor = self.predictor or _global_model_predictor()
+            if predictor is not None:
+                index = {name: i for i, name in enumerate(self.users)}
+                predicted = np.fromiter(
+                    (index.get(label, -1) for label in predictor(self.probes)), dtype=np.int64, count=len(self.probes)
+                )
+                ml = vote_scores(predicted, self.attempt_size, len(self.users))
+        return stat, ml
+
+    def score_pairs(self):
+        """
+        Genuine/impostor score arrays, aligned across layers
+
+        Returns:
+            dict of genuine_stat, impostor_stat, genuine_ml, impostor_ml
+            (ml entries are None without an ML layer); computed once
+        """
+        if self._pairs is not None:
+            return self._pairs
+        stat, ml = self.score_matrices()
+        genuine = np.zeros(stat.shape, dtype=bool)
+        genuine[np.arange(self.n_attempts), self.attempt_user] = True
+        self._pairs = {
+            'genuine_stat': stat[genuine], 'impostor_stat': stat[~genuine],
+            'genuine_ml': ml[genuine] if ml is not None else None,
+            'impostor_ml': ml[~genuine] if ml is not None else None,
+        }
+        return self._pairs
+
+    # ---------------------------------------------------
+    # REPORT
+    # ---------------------------------------------------
+    def evaluate(self, stat_threshold=STATISTICAL_THRESHOLD, ml_threshold=ML_CONFIDENCE_THRESHOLD,
+                 curve_points=CURVE_POINTS):
+        """
+        Full report: per-layer EER, ROC/DET curves and FAR/FRR at the given
+        thresholds, plus the combined two-layer operating point
+        """
+        pairs = self.score_pairs()
+        report = {
+            'users': len(self.users),
+            'attempts': self.n_attempts,
+            'genuine_pairs': len(pairs['genuine_stat']),
+            'impostor_pairs': len(pairs['impostor_stat']),
+            'layers': {},
+        }
+        layers = [('statistical', 'stat', stat_threshold)]
+        if pairs['genuine_ml'] is not None:
+            layers.append(('ml', 'ml', ml_threshold))
+        for name, key, threshold in layers:
+            # Sort once; every query below is a binary search
+            genuine, impostor = np.sort(pairs[f'genuine_{key}']), np.sort(pairs[f'impostor_{key}'])
+            eer, eer_threshold = equal_error_rate(genuine, impostor, presorted=True)
+            far, frr = error_rates(genuine, impostor, [threshold], presorted=True)
+            report['layers'][name] = {
+                'eer': eer,
+                'eer_threshold': eer_threshold,
+                'threshold': threshold,
+                'far': float(far[0]),
+                'frr': float(frr[0]),
+                'curve': {k: v.tolist() for k, v in roc_curve(genuine, impostor, curve_points, presorted=True).items()},
+            }
+        if pairs['genuine_ml'] is not None:
+            report['combined'] = operating_point(
+                pairs['genuine_stat'], pairs['genuine_ml'], pairs['impostor_stat'], pairs['impostor_ml'],
+                stat_threshold, ml_threshold
+            )
+        return report
+
+    def combined_surface(self, stat_grid, ml_grid):
+        """Two-layer FAR/FRR over a threshold grid (see joint_error_surface)"""
+        pairs = self.score_pairs()
+        if pairs['genuine_ml'] is None:
+            raise ValueError('No ML layer scores to combine')
+        return joint_error_surface(
+            pairs['genuine_stat'], pairs['genuine_ml'], pairs['impostor_stat'], pairs['impostor_ml'],
+            stat_grid, ml_grid
+        )
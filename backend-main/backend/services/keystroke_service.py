@@ -20,7 +20,7 @@ class KeystrokeService:
             attempts: Attempt number (1-3)
             
         Returns:
-            BiometricProfile object
+            biometric_profile row dict (typing_pattern decoded as keystroke_features)
         """
         return self.profile_repo.create(
             user_id=user_id,
@@ -0,0 +1,248 @@
+"""
+Login success/failure rollups
+
+login_rollup holds attempt/success counters per (granularity, bucket,
+login_method) for hour, day and month buckets. An AFTER INSERT trigger on
+the session table bumps all three levels in the same transaction as the
+session write, so the counters never drift and reading them never scans
+login_session.
+
+A range query is decomposed into at most two partial days of hours, two
+partial months of days and the whole months in between, so its cost is
+bounded by the calendar, not by the number of sessions.
+"""
+from datetime import datetime, timedelta
+
+from services.user_service import get_db_connection
+from services.session_partition_service import HOT_TABLE
+from utils.db_util import get_db
+
+ROLLUP_DDL = """
+CREATE TABLE IF NOT EXISTS login_rollup (
+    granularity TEXT NOT NULL,          -- 'hour' | 'day' | 'month'
+    bucket TEXT NOT NULL,               -- 'YYYY-MM-DD HH' | 'YYYY-MM-DD' | 'YYYY-MM'
+    login_method TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    successes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (granularity, bucket, login_method)
+) WITHOUT ROWID
+"""
+
+# Bucket expressions over a login_time column (ISO 'T' or space separated)
+BUCKET_SQL = {
+    'hour': "substr(replace({col}, 'T', ' '), 1, 13)",
+    'day': "substr({col}, 1, 10)",
+    'month': "substr({col}, 1, 7)",
+}
+
+TRIGGER_DDL = """
+CREATE TRIGGER IF NOT EXISTS login_rollup_after_insert
+AFTER INSERT ON {table}
+BEGIN
+    INSERT INTO login_rollup (granularity, bucket, login_method, attempts, successes)
+    VALUES ('hour', {hour}, COALESCE(NEW.login_method, ''), 1, NEW.status = 'success'),
+           ('day', {day}, COALESCE(NEW.login_method, ''), 1, NEW.status = 'success'),
+           ('month', {month}, COALESCE(NEW.login_method, ''), 1, NEW.status = 'success')
+    ON CONFLICT (granularity, bucket, login_method) DO UPDATE SET
+        attempts = attempts + excluded.attempts,
+        successes = successes + excluded.successes;
+END
+"""
+
+
+def _hour_key(dt):
+    return dt.strftime('%Y-%m-%d %H')
+
+
+def _day_key(dt):
+    return dt.strftime('%Y-%m-%d')
+
+
+def _month_key(dt):
+    return dt.strftime('%Y-%m')
+
+
+def _next_day(dt):
+    return datetime(dt.year, dt.month, dt.day) + timedelta(days=1)
+
+
+def _next_month(dt):
+    return datetime(dt.year + (dt.month == 12), dt.month % 12 + 1, 1)
+
+
+def decompose_range(start, end):
+    """
+    Split [start, end) into rollup bucket ranges
+
+    Args:
+        start, end: datetimes, truncated to the hour
+
+    Returns:
+        list of (granularity, first_bucket, last_bucket_exclusive)
+    """
+    start = start.replace(minute=0, second=0, microsecond=0)
+    end = end.replace(minute=0, second=0, microsecond=0)
+    if start >= end:
+        return []
+
+    day_start = start if start.hour == 0 else _next_day(start)
+    day_end = datetime(end.year, end.month, end.day)
+    if day_start >= day_end:
+        return [('hour', _hour_key(start), _hour_key(end))]
+
+    ranges = []
+    if start < day_start:
+        ranges.append(('hour', _hour_key(start), _hour_key(day_start)))
+    if day_end < end:
+        ranges.append(('hour', _hour_key(day_end), _hour_key(end)))
+
+    month_start = day_start if day_start.day == 1 else _next_month(day_start)
+    month_end = datetime(day_end.year, day_end.month, 1)
+    if month_start >= month_end:
+        ranges.append(('day', _day_key(day_start), _day_key(day_end)))
+        return ranges
+
+    if day_start < month_start:
+        ranges.append(('day', _day_key(day_start), _day_key(month_start)))
+    if month_end < day_end:
+        ranges.append(('day', _day_key(month_end), _day_key(day_end)))
+    ranges.append(('month', _month_key(month_start), _month_key(month_end)))
+    return ranges
+
+
+class LoginStatsService:
+    """Maintains and serves login_rollup counters"""
+
+    def _get_conn(self):
+        return get_db_connection()
+
+    def _session_table(self, conn):
+        """The table new sessions are physically inserted into"""
+        row = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN (?, 'login_session') "
+            "ORDER BY name = ? DESC LIMIT 1",
+            (HOT_TABLE, HOT_TABLE)
+        ).fetchone()
+        return row[0] if row else None
+
+    def ensure_schema(self):
+        """Create login_rollup and the insert trigger (idempotent)"""
+        get_db().write_sync(self._create_schema)
+
+    def _create_schema(self, conn):
+        conn.execute(ROLLUP_DDL)
+        table = self._session_table(conn)
+        if table:
+            conn.execute(TRIGGER_DDL.format(
+                table=table,
+                **{level: expr.format(col='NEW.login_time') for level, expr in BUCKET_SQL.items()}
+            ))
+
+    # ---------------------------------------------------
+    # QUERIES
+    # ---------------------------------------------------
+    def get_stats(self, start, end, login_method=None):
+        """
+        Attempts and success/failure rates for [start, end)
+
+        Args:
+            start, end: datetimes (hour resolution)
+            login_method: optional filter, e.g. 'biometric'
+
+        Returns:
+            dict with totals, rates and a per-login_method breakdown
+        """
+        by_method = {}
+        conn = self._get_conn()
+        try:
+            for granularity, first, last in decompose_range(start, end):
+                query = """
+                SELECT login_method, SUM(attempts), SUM(successes)
+                FROM login_rollup
+                WHERE granularity = ? AND bucket >= ? AND bucket < ?
+                """
+                params = [granularity, first, last]
+                if login_method is not None:
+                    query += " AND login_method = ?"
+                    params.append(login_method)
+                query += " GROUP BY login_method"
+
+                for method, attempts, successes in conn.execute(query, params):
+                    totals = by_method.setdefault(method, [0, 0])
+                    totals[0] += attempts
+                    totals[1] += successes
+        finally:
+            conn.close()
+
+        attempts = sum(t[0] for t in by_method.values())
+        successes = sum(t[1] for t in by_method.values())
+        return {
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            **self._rates(attempts, successes),
+            'by_method': {method: self._rates(*t) for method, t in sorted(by_method.items())}
+        }
+
+    @staticmethod
+    def _rates(attempts, successes):
+        return {
+            'attempts': attempts,
+            'successes': successes,
+            'failures': attempts - successes,
+            'success_rate': successes / attempts if attempts else 0.0,
+            'failure_rate': (attempts - successes) / attempts if attempts else 0.0
+        }
+
+    # ---------------------------------------------------
+    # REBUILD / REPORTS
+    # ---------------------------------------------------
+    def rebuild(self):
+        """
+        Recompute rollups from the raw sessions still in the database
+
+        Buckets older than the oldest raw session (archived partitions)
+        are left untouched so their counts survive the rebuild.
+
+        Returns:
+            number of raw sessions aggregated
+        """
+        def recompute(conn):
+            self._create_schema(conn)
+            oldest, total = conn.execute("SELECT MIN(login_time), COUNT(*) FROM login_session").fetchone()
+            if oldest is not None:
+                for granularity, expr in BUCKET_SQL.items():
+                    first_bucket = conn.execute(f"SELECT {expr.format(col='?')}", (oldest,)).fetchone()[0]
+                    conn.execute(
+                        "DELETE FROM login_rollup WHERE granularity = ? AND bucket >= ?",
+                        (granularity, first_bucket)
+                    )
+                    bucket = expr.format(col='login_time')
+                    conn.execute(f"""
+                        INSERT INTO login_rollup (granularity, bucket, login_method, attempts, successes)
+                        SELECT ?, {bucket}, COALESCE(login_method, ''), COUNT(*), SUM(status = 'success')
+                        FROM login_session
+                        GROUP BY {bucket}, COALESCE(login_method, '')
+                    """, (granularity,))
+            return total
+
+        total = get_db().write_sync(recompute)
+        print(f"📊 Rebuilt login rollups from {total} sessions")
+        return total
+
+    def create_report(self, admin_id, start, end, dashboard_id=None, remarks=None):
+        """Insert a row into the report table from the rollups"""
+        stats = self.get_stats(start, end)
+        return get_db().write_sync(lambda conn: conn.execute(
+            """
+            INSERT INTO report (admin_id, dashboard_id, success_rate, failure_rate, remarks, generated_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                admin_id,
+                dashboard_id,
+                f"{stats['success_rate']:.4f}",
+                f"{stats['failure_rate']:.4f}",
+                remarks or f"{stats['attempts']} attempts, {stats['start']} to {stats['end']}",
+                datetime.now().isoformat()
+            )
+        ).lastrowid)
@@ -0,0 +1,50 @@
+"""
+Background maintenance runner
+
+Runs registered housekeeping tasks (partition rotation, archiving, ...)
+periodically on a single daemon thread so they never run on a request path.
+"""
+import os
+import threading
+import time
+
+MAINTENANCE_INTERVAL = float(os.getenv('TYPEID_MAINTENANCE_INTERVAL', '3600'))  # seconds, 0 = disabled
+
+
+class MaintenanceRunner:
+    """Periodic runner for named maintenance tasks"""
+
+    def __init__(self, interval=MAINTENANCE_INTERVAL):
+        self.interval = interval
+        self.tasks = []
+        self._thread = None
+        self._stop = threading.Event()
+
+    def register(self, name, func):
+        """Add a task; func takes no arguments"""
+        self.tasks.append((name, func))
+
+    def run_once(self):
+        """Run every task once, logging failures without stopping the others"""
+        for name, func in self.tasks:
+            start = time.perf_counter()
+            try:
+                func()
+                print(f"🧹 Maintenance '{name}' finished in {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                print(f"⚠️ Maintenance '{name}' failed: {e}")
+
+    def start(self):
+        """Start the background thread (no-op if disabled or already running)"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name='maintenance', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
@@ -1,4 +1,3 @@
-import joblib
 import numpy as np
 import os
 from collections import Counter
@@ -7,11 +6,38 @@ from collections import Counter
 # Load artifacts
 # -----------------------------
 ARTIFACT_DIR = os.path.join(os.path.dirname(__file__), "artifacts")
-
-model = joblib.load(os.path.join(ARTIFACT_DIR, "xgb_model_raw.pkl"))
-scaler = joblib.load(os.path.join(ARTIFACT_DIR, "scaler_raw.pkl"))
-encoder = joblib.load(os.path.join(ARTIFACT_DIR, "encoder_raw.pkl"))
-feature_cols = joblib.load(os.path.join(ARTIFACT_DIR, "feature_cols_raw.pkl"))
+BUNDLE_PATH = os.getenv("TYPEID_MODEL_BUNDLE", os.path.join(ARTIFACT_DIR, "model.bundle"))
+
+# predict_user() takes FEATURE_SCHEMA arrays as well as feature dicts
+ACCEPTS_ARRAYS = True
+
+# Preferred: one memory-mapped, checksummed bundle (scripts/build_model_bundle.py).
+# A corrupt or mismatched bundle raises here and the model is not served.
+bundle = None
+if os.path.exists(BUNDLE_PATH):
+    from utils.model_bundle import ModelBundle
+    bundle = ModelBundle(BUNDLE_PATH)
+    feature_cols = list(bundle.feature_order)
+    MODEL_VERSION = bundle.version
+else:
+    # Legacy: four joblib pickles, fully unpickled on every process start
+    import joblib
+    model = joblib.load(os.path.join(ARTIFACT_DIR, "xgb_model_raw.pkl"))
+    scaler = joblib.load(os.path.join(ARTIFACT_DIR, "scaler_raw.pkl"))
+    encoder = joblib.load(os.path.join(ARTIFACT_DIR, "encoder_raw.pkl"))
+    feature_cols = joblib.load(os.path.join(ARTIFACT_DIR, "feature_cols_raw.pkl"))
+    MODEL_VERSION = "legacy"
+
+# Schema arrays arrive in FEATURE_SCHEMA order; reorder only if the model
+# was trained with a different column order
+try:
+    from utils.feature_schema import FEATURE_SCHEMA
+    if tuple(feature_cols) == FEATURE_SCHEMA.names:
+        _schema_columns = None
+    else:
+        _schema_columns = [FEATURE_SCHEMA.index[f] for f in feature_cols]
+except ImportError:
+    _schema_columns = None
 
 
 def predict_user(feature_list):
@@ -19,7 +45,8 @@ def predict_user(feature_list):
     Predict user from keystroke feature samples
 
     Args:
-        feature_list (list[dict]): list of keystroke feature dicts
+        feature_list (list[dict] | np.ndarray): list of keystroke feature
+            dicts, or an (n, 11) array already in FEATURE_SCHEMA order
 
     Returns:
         dict: {
@@ -29,7 +56,7 @@ def predict_user(feature_list):
         }
     """
 
-    if not feature_list:
+    if len(feature_list) == 0:
         return {
             "predicted_user": "unknown",
             "confidence": 0.0,
@@ -39,19 +66,26 @@ def predict_user(feature_list):
     # -----------------------------
     # Build feature matrix
     # -----------------------------
-    X = np.array([
-        [float(sample.get(f, 0)) for f in feature_cols]
-        for sample in feature_list
-    ])
-
-    # Scale
-    X_scaled = scaler.transform(X)
-
-    # Predict encoded labels
-    encoded_preds = model.predict(X_scaled)
-
-    # Decode labels → usernames
-    decoded_preds = encoder.inverse_transform(encoded_preds)
+    if isinstance(feature_list, np.ndarray):
+        X = feature_list[:, _schema_columns] if _schema_columns is not None else feature_list
+    else:
+        X = np.array([
+            [float(sample.get(f, 0)) for f in feature_cols]
+            for sample in feature_list
+        ])
+
+    if bundle is not None:
+        # Scale, predict and decode straight from the mapped arrays
+        decoded_preds = bundle.predict_labels(X)
+    else:
+        # Scale
+        X_scaled = scaler.transform(X)
+
+        # Predict encoded labels
+        encoded_preds = model.predict(X_scaled)
+
+        # Decode labels → usernames
+        decoded_preds = encoder.inverse_transform(encoded_preds)
 
     # -----------------------------
     # Majority voting
@@ -0,0 +1,101 @@
+"""
+Short-lived memo of authentication decisions
+
+Clients retry /api/login and /api/login-hybrid on timeouts with exactly the
+same keystroke_features_list. A retry would re-run the sample fetch and
+both scoring layers to reach the same decision, so AuthService remembers
+each decision for a few seconds under
+
+    (user_id, username, digest of the parsed feature array,
+     template version, model version, verification engine)
+
+Any change to what the decision depends on changes the key: a new
+enrollment bumps the template version (and refresh_enrollment drops the
+user's entries outright), a model swap changes predict.MODEL_VERSION. The
+TTL bounds staleness for anything the key cannot see, e.g. an enrollment
+handled by another worker without a shared template snapshot.
+"""
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.metrics_util import metrics
+
+SCORE_MEMO_ENABLED = os.getenv('TYPEID_SCORE_MEMO', 'on') == 'on'
+SCORE_MEMO_TTL = float(os.getenv('TYPEID_SCORE_MEMO_TTL', '30'))
+SCORE_MEMO_SIZE = int(os.getenv('TYPEID_SCORE_MEMO_SIZE', '10000'))
+
+
+def feature_digest(matrix):
+    """Stable digest of a parsed FEATURE_SCHEMA array (shape + float64 bytes)"""
+    X = np.ascontiguousarray(matrix, dtype=np.float64) + 0.0   # -0.0 -> 0.0
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.asarray(X.shape, dtype=np.int64).tobytes())
+    h.update(X.tobytes())
+    return h.hexdigest()
+
+
+class ScoreMemo:
+    """TTL + LRU bounded map from decision keys to authentication results"""
+
+    def __init__(self, ttl=SCORE_MEMO_TTL, max_entries=SCORE_MEMO_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()    # key -> (expires_at, result)
+        self._by_user = {}               # user_id -> set of keys
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(user_id, username, matrix, template_version, model_version, engine):
+        return (user_id, username.lower(), feature_digest(matrix), template_version, model_version, engine)
+
+    def get(self, key, now=None):
+        """Copy of the memoized result, or None if absent or expired"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._remove(key)
+                metrics.incr('score_memo.miss')
+                return None
+            self._entries.move_to_end(key)
+        metrics.incr('score_memo.hit')
+        return copy.deepcopy(entry[1])
+
+    def put(self, key, result, now=None):
+        now = time.monotonic() if now is None else now
+        result = copy.deepcopy(result)
+        with self._lock:
+            self._entries[key] = (now + self.ttl, result)
+            self._entries.move_to_end(key)
+            self._by_user.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        """Drop every memoized decision for a user (after re-enrollment)"""
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,313 @@
+"""
+Time-partitioned login_session storage
+
+Layout (all in the main SQLite database):
+
+    login_session_hot          current month - every new login lands here
+    login_session_YYYY_MM      one table per closed month
+    login_session (VIEW)       UNION ALL of hot + monthly partitions
+
+INSTEAD OF triggers on the view route INSERT/UPDATE to the hot table, so
+existing code that writes to login_session keeps working unchanged.
+
+Maintenance (run periodically from app.py, or via scripts/partition_sessions.py):
+    rotate()   moves rows from closed months out of the hot table
+    archive()  writes partitions older than the retention window to
+               gzip-compressed JSONL under instance/archive/ and drops them
+
+Every schema change and row move runs as a job on the single writer
+(get_db().write_sync), so it never competes with login writes for the lock.
+"""
+import gzip
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+from services.user_service import get_db_connection
+from utils.db_util import get_db
+
+SESSION_RETENTION_MONTHS = int(os.getenv('TYPEID_SESSION_RETENTION_MONTHS', '6'))
+SESSION_ARCHIVE_DIR = os.getenv(
+    'TYPEID_SESSION_ARCHIVE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'archive')
+)
+
+HOT_TABLE = 'login_session_hot'
+VIEW_NAME = 'login_session'
+PARTITION_RE = re.compile(r'^login_session_(\d{4})_(\d{2})$')
+
+COLUMNS = ('session_id', 'user_id', 'reg_id', 'login_time', 'logout_time',
+           'status', 'login_method', 'IP_address')
+
+TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS {name} (
+    session_id INTEGER PRIMARY KEY{autoincrement},
+    user_id INTEGER NOT NULL,
+    reg_id INTEGER NOT NULL,
+    login_time TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    logout_time TEXT,
+    status TEXT,
+    login_method TEXT,
+    IP_address TEXT,
+    FOREIGN KEY (user_id) REFERENCES user(user_id),
+    FOREIGN KEY (reg_id) REFERENCES user_registration(registration_id)
+)
+"""
+
+# Per-user keyset index (admin paging, per-user history) on every partition
+USER_INDEX_DDL = "CREATE INDEX IF NOT EXISTS idx_{name}_user_session ON {name} (user_id, session_id)"
+
+# Dropping and recreating the view drops these, so _rebuild_view re-adds them
+VIEW_TRIGGER_NAMES = ('login_session_insert', 'login_session_update')
+VIEW_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS login_session_insert
+    INSTEAD OF INSERT ON login_session
+    BEGIN
+        INSERT INTO login_session_hot (session_id, user_id, reg_id, login_time, logout_time,
+                                       status, login_method, IP_address)
+        VALUES (NEW.session_id, NEW.user_id, NEW.reg_id,
+                COALESCE(NEW.login_time, CURRENT_TIMESTAMP), NEW.logout_time,
+                NEW.status, NEW.login_method, NEW.IP_address);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS login_session_update
+    INSTEAD OF UPDATE ON login_session
+    BEGIN
+        UPDATE login_session_hot
+        SET logout_time = NEW.logout_time, status = NEW.status, IP_address = NEW.IP_address
+        WHERE session_id = OLD.session_id;
+    END
+    """
+)
+
+
+def partition_name(year, month):
+    return f'login_session_{year:04d}_{month:02d}'
+
+
+def _month_index(year, month):
+    return year * 12 + (month - 1)
+
+
+class SessionPartitionService:
+    """Maintains the partitioned login_session layout"""
+
+    def __init__(self, archive_dir=SESSION_ARCHIVE_DIR, retention_months=SESSION_RETENTION_MONTHS):
+        self.archive_dir = archive_dir
+        self.retention_months = retention_months
+        self._schema_ready = False
+
+    def _get_conn(self):
+        return get_db_connection()
+
+    # ---------------------------------------------------
+    # SCHEMA
+    # ---------------------------------------------------
+    def _object_type(self, conn, name):
+        row = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def list_partitions(self, conn):
+        """Monthly partition table names, oldest first"""
+        rows = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'login_session_%'"
+        ).fetchall()
+        return sorted(r[0] for r in rows if PARTITION_RE.match(r[0]))
+
+    def ensure_schema(self):
+        """
+        Migrate a plain login_session table to the partitioned layout.
+        Safe to call repeatedly.
+        """
+        get_db().write_sync(self._migrate)
+        self._schema_ready = True
+
+    def _migrate(self, conn):
+        kind = self._object_type(conn, VIEW_NAME)
+        if kind == 'table':
+            conn.execute(f"ALTER TABLE {VIEW_NAME} RENAME TO {HOT_TABLE}")
+            print(f"🗂️  Migrated {VIEW_NAME} table to partitioned layout")
+        conn.execute(TABLE_DDL.format(name=HOT_TABLE, autoincrement=' AUTOINCREMENT'))
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{HOT_TABLE}_login_time ON {HOT_TABLE} (login_time)")
+        for name in [HOT_TABLE] + self.list_partitions(conn):
+            conn.execute(USER_INDEX_DDL.format(name=name))
+        # Recreating the view invalidates every prepared statement on
+        # login_session, so leave it alone when it is already current
+        if not self._view_is_current(conn):
+            self._rebuild_view(conn)
+
+    def _view_sql(self, conn):
+        parts = [HOT_TABLE] + self.list_partitions(conn)
+        cols = ', '.join(COLUMNS)
+        union = '\n    UNION ALL '.join(f'SELECT {cols} FROM {p}' for p in parts)
+        return f"CREATE VIEW {VIEW_NAME} AS {union}"
+
+    def _view_is_current(self, conn):
+        """True if the view covers exactly the current partitions and has its triggers"""
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'view' AND name = ?", (VIEW_NAME,)
+        ).fetchone()
+        if row is None or row[0] != self._view_sql(conn):
+            return False
+        triggers = conn.execute(
+            f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN "
+            f"({', '.join('?' * len(VIEW_TRIGGER_NAMES))})", VIEW_TRIGGER_NAMES
+        ).fetchone()[0]
+        return triggers == len(VIEW_TRIGGER_NAMES)
+
+    def _rebuild_view(self, conn):
+        """Recreate the view over the current partition set (after rotate/archive change it)"""
+        conn.execute(f"DROP VIEW IF EXISTS {VIEW_NAME}")
+        conn.execute(self._view_sql(conn))
+        for trigger in VIEW_TRIGGERS:
+            conn.execute(trigger)
+
+    # ---------------------------------------------------
+    # ROTATION - keep the hot partition to the current month
+    # ---------------------------------------------------
+    def rotate(self, now=None):
+        """
+        Move rows from closed months out of the hot table
+
+        Returns:
+            dict of partition name -> rows moved
+        """
+        now = now or datetime.now()
+        current = f'{now.year:04d}-{now.month:02d}'
+
+        conn = self._get_conn()
+        try:
+            has_closed = conn.execute(
+                f"SELECT 1 FROM {HOT_TABLE} WHERE login_time < ? LIMIT 1", (current,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if not has_closed:
+            return {}
+
+        def move(conn):
+            moved = {}
+            months = [r[0] for r in conn.execute(
+                f"SELECT DISTINCT substr(login_time, 1, 7) FROM {HOT_TABLE} WHERE login_time < ?",
+                (current,)
+            ).fetchall()]
+            for month in months:
+                year, mon = int(month[:4]), int(month[5:7])
+                name = partition_name(year, mon)
+                conn.execute(TABLE_DDL.format(name=name, autoincrement=''))
+                conn.execute(USER_INDEX_DDL.format(name=name))
+                cols = ', '.join(COLUMNS)
+                cursor = conn.execute(
+                    f"INSERT INTO {name} ({cols}) SELECT {cols} FROM {HOT_TABLE} "
+                    f"WHERE substr(login_time, 1, 7) = ?", (month,)
+                )
+                conn.execute(f"DELETE FROM {HOT_TABLE} WHERE substr(login_time, 1, 7) = ?", (month,))
+                moved[name] = cursor.rowcount
+            if not self._view_is_current(conn):
+                self._rebuild_view(conn)
+            return moved
+
+        moved = get_db().write_sync(move)
+        for name, count in moved.items():
+            print(f"🗂️  Rotated {count} login sessions into {name}")
+        return moved
+
+    # ---------------------------------------------------
+    # ARCHIVING - cold partitions leave the database
+    # ---------------------------------------------------
+    def archive(self, now=None):
+        """
+        Archive partitions older than the retention window to gzip JSONL
+        and drop them from the database
+
+        Returns:
+            dict of archive file path -> rows archived
+        """
+        now = now or datetime.now()
+        cutoff = _month_index(now.year, now.month) - self.retention_months
+        archived = {}
+
+        conn = self._get_conn()
+        try:
+            for name in self.list_partitions(conn):
+                year, mon = map(int, PARTITION_RE.match(name).groups())
+                if _month_index(year, mon) >= cutoff:
+                    continue
+
+                path = self._write_archive(conn, name)
+                count = conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+
+                dropped = get_db().write_sync(lambda wconn: self._drop_partition(wconn, name, count))
+                if not dropped:
+                    print(f"⚠️ {name} changed while it was archived; left for the next run")
+                    continue
+                archived[path] = count
+                print(f"📦 Archived {count} login sessions from {name} to {path}")
+        finally:
+            conn.close()
+        return archived
+
+    def _drop_partition(self, conn, name, archived_count):
+        """Drop an archived partition, unless rows arrived after the archive was written"""
+        if conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0] != archived_count:
+            return False
+        conn.execute(f"DROP TABLE {name}")
+        self._rebuild_view(conn)
+        return True
+
+    def _write_archive(self, conn, name):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f'{name}.jsonl.gz')
+        tmp_path = path + '.tmp'
+        cursor = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM {name} ORDER BY session_id")
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=9) as f:
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                for row in rows:
+                    f.write(json.dumps(dict(zip(COLUMNS, row))) + '\n')
+        # A partial file never replaces a good one
+        os.replace(tmp_path, path)
+        return path
+
+    @staticmethod
+    def read_archive(path):
+        """Iterate the session dicts stored in an archive file"""
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    # ---------------------------------------------------
+    # MAINTENANCE
+    # ---------------------------------------------------
+    def run_maintenance(self, now=None):
+        """
+        rotate + archive (ensure_schema on the first run only); errors are
+        logged, not raised. The view is only rebuilt when a partition is
+        created or dropped.
+        """
+        try:
+            if not self._schema_ready:
+                self.ensure_schema()
+            self.rotate(now)
+            self.archive(now)
+        except sqlite3.Error as e:
+            print(f"⚠️ Session partition maintenance failed: {e}")
+
+    def status(self):
+        conn = self._get_conn()
+        try:
+            hot = conn.execute(f"SELECT COUNT(*) FROM {HOT_TABLE}").fetchone()[0]
+            partitions = {
+                name: conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+                for name in self.list_partitions(conn)
+            }
+        finally:
+            conn.close()
+        archives = sorted(os.listdir(self.archive_dir)) if os.path.isdir(self.archive_dir) else []
+        return {'hot_rows': hot, 'partitions': partitions, 'archives': archives}
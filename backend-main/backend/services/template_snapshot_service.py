@@ -0,0 +1,376 @@
+"""
+Shared-memory template snapshots for multi-worker deployments
+
+With several worker processes each one would otherwise load and refresh
+its own copy of every template. Instead one builder publishes the store
+as a flat, memory-mapped file and every worker maps it read-only:
+
+    instance/templates/
+        templates-000042.bin   header + offset/scale + codes + user_ids + versions + row_of
+        CURRENT                "42" - the generation workers should use
+
+The builder writes a new generation to a temp file, fsyncs and renames it,
+then atomically replaces CURRENT. Workers check CURRENT at most every
+TYPEID_TEMPLATE_SNAPSHOT_POLL seconds and swap to the new file with one
+reference assignment; requests in flight keep the mapping they started
+with. The arrays are np.frombuffer views into the mapping (zero-copy), so
+the pages live once in the OS page cache however many workers run.
+
+Enrollments handled by a worker go into a small per-process overlay until
+a snapshot built after them is published.
+
+    TYPEID_TEMPLATE_SNAPSHOT=builder   build + publish (or run scripts.template_builder)
+    TYPEID_TEMPLATE_SNAPSHOT=worker    map the published snapshot
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from utils.db_util import get_db
+from services.template_store_service import QuantizedTemplateStore, TemplateService
+
+TEMPLATE_SNAPSHOT = os.getenv('TYPEID_TEMPLATE_SNAPSHOT', 'off')   # off | builder | worker
+TEMPLATE_SNAPSHOT_DIR = os.getenv(
+    'TYPEID_TEMPLATE_SNAPSHOT_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'templates')
+)
+TEMPLATE_SNAPSHOT_INTERVAL = float(os.getenv('TYPEID_TEMPLATE_SNAPSHOT_INTERVAL', '2'))   # builder, seconds
+TEMPLATE_SNAPSHOT_POLL = float(os.getenv('TYPEID_TEMPLATE_SNAPSHOT_POLL', '1'))           # workers, seconds
+
+# Generations kept on disk (workers may still be mapping the previous ones)
+SNAPSHOT_KEEP = 3
+
+SNAPSHOT_MAGIC = b'TIDTMPL1'
+# magic, generation, built_at, dtype, n_features, rows, row_of length, calibrated
+_HEADER = struct.Struct('<8sQdBIQQB')
+HEADER_SIZE = 64
+# Every array starts on a cache-line boundary
+ALIGNMENT = 64
+
+DTYPE_CODES = {'int8': 0, 'float16': 1}
+CODE_DTYPES = {code: name for name, code in DTYPE_CODES.items()}
+
+
+def _align(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _layout(dtype, n_features, rows, row_of_len):
+    """[(name, numpy dtype, shape, byte offset)], total file size"""
+    code_dtype = np.uint8 if dtype == 'int8' else np.float16
+    sections = [
+        ('offset', np.float64, (n_features,)),
+        ('scale', np.float64, (n_features,)),
+        ('codes', code_dtype, (rows, n_features)),
+        ('user_ids', np.int64, (rows,)),
+        ('versions', np.uint32, (rows,)),
+        ('row_of', np.int32, (row_of_len,)),
+    ]
+    layout, position = [], HEADER_SIZE
+    for name, np_dtype, shape in sections:
+        layout.append((name, np_dtype, shape, position))
+        position = _align(position + int(np.prod(shape)) * np.dtype(np_dtype).itemsize)
+    return layout, position
+
+
+def snapshot_path(directory, generation):
+    return os.path.join(directory, f"templates-{generation:06d}.bin")
+
+
+def read_current_generation(directory):
+    """Generation named by CURRENT, or 0 if nothing was published yet"""
+    try:
+        with open(os.path.join(directory, 'CURRENT')) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _replace_atomically(path, write):
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def write_snapshot(store, directory, generation, built_at):
+    """
+    Publish the live rows of a QuantizedTemplateStore as `generation`
+
+    Returns:
+        path of the snapshot file
+    """
+    os.makedirs(directory, exist_ok=True)
+    with store._lock:
+        rows = store.live_rows()
+        user_ids = store.user_ids[rows].copy()
+        codes = store.codes[rows].copy()
+        versions = store.versions[rows].copy()
+        offset, scale = store.offset.copy(), store.scale.copy()
+        calibrated = store.calibrated
+
+    row_of = np.full(int(user_ids.max()) + 1 if len(user_ids) else 0, -1, dtype=np.int32)
+    row_of[user_ids] = np.arange(len(user_ids), dtype=np.int32)
+    arrays = {
+        'offset': offset, 'scale': scale, 'codes': codes,
+        'user_ids': user_ids, 'versions': versions, 'row_of': row_of,
+    }
+    layout, total = _layout(store.dtype, store.n_features, len(rows), len(row_of))
+
+    def write(f):
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, generation, built_at, DTYPE_CODES[store.dtype],
+                             store.n_features, len(rows), len(row_of), int(calibrated)))
+        for name, np_dtype, _, position in layout:
+            f.write(b'\0' * (position - f.tell()))
+            f.write(np.ascontiguousarray(arrays[name], dtype=np_dtype).tobytes())
+        f.write(b'\0' * (total - f.tell()))
+
+    path = snapshot_path(directory, generation)
+    _replace_atomically(path, write)
+    _replace_atomically(os.path.join(directory, 'CURRENT'), lambda f: f.write(f"{generation}\n".encode()))
+    return path
+
+
+class TemplateSnapshot:
+    """One mapped generation: a read-only QuantizedTemplateStore over the file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.generation, self.built_at, dtype_code, n_features,
+         rows, row_of_len, calibrated) = _HEADER.unpack_from(self._mmap, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a template snapshot")
+
+        dtype = CODE_DTYPES[dtype_code]
+        layout, total = _layout(dtype, n_features, rows, row_of_len)
+        if len(self._mmap) < total:
+            raise ValueError(f"{path} is truncated ({len(self._mmap)} < {total} bytes)")
+
+        views = {
+            name: np.frombuffer(self._mmap, dtype=np_dtype, count=int(np.prod(shape)),
+                                offset=position).reshape(shape)
+            for name, np_dtype, shape, position in layout
+        }
+        self.path = path
+        self.nbytes = total
+        self.store = QuantizedTemplateStore.from_arrays(dtype, calibrated=bool(calibrated), **views)
+
+    def touch(self):
+        """Fault every page in by reading one byte of each (warm-up); returns pages touched"""
+        pages = np.frombuffer(self._mmap, dtype=np.uint8)[::mmap.PAGESIZE]
+        pages.sum()
+        return len(pages)
+
+
+class TemplateSnapshotReader:
+    """Follows CURRENT and keeps the newest generation mapped"""
+
+    def __init__(self, directory=TEMPLATE_SNAPSHOT_DIR, poll_interval=TEMPLATE_SNAPSHOT_POLL):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.snapshot = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Mapped snapshot (None until the builder publishes one)"""
+        now = time.monotonic()
+        if now - self._checked >= self.poll_interval:
+            self.refresh(now)
+        return self.snapshot
+
+    def refresh(self, now=None):
+        """Map the generation named by CURRENT if it is newer than ours"""
+        with self._lock:
+            self._checked = time.monotonic() if now is None else now
+            generation = read_current_generation(self.directory)
+            if not generation or (self.snapshot and self.snapshot.generation >= generation):
+                return False
+            try:
+                snapshot = TemplateSnapshot(snapshot_path(self.directory, generation))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Could not map template snapshot {generation}: {e}")
+                return False
+            # Atomic swap; the old mapping is released with its last reference
+            self.snapshot = snapshot
+            print(f"🧬 Mapped template snapshot generation {generation} ({snapshot.store.live} users)")
+            return True
+
+
+class SharedTemplateService(TemplateService):
+    """
+    Worker-side TemplateService: reads the mapped snapshot, with a small
+    local overlay for enrollments this process saw after it was built
+    """
+
+    def __init__(self, directory=TEMPLATE_SNAPSHOT_DIR, poll_interval=TEMPLATE_SNAPSHOT_POLL, **kwargs):
+        super().__init__(**kwargs)
+        self.reader = TemplateSnapshotReader(directory, poll_interval)
+        self._overlay_since = {}     # user_id -> time the overlay entry was written
+        self._pruned_generation = 0
+
+    def _snapshot(self):
+        snapshot = self.reader.current()
+        if snapshot is not None and snapshot.generation != self._pruned_generation:
+            self._pruned_generation = snapshot.generation
+            # Entries older than the snapshot's build mark are in it now
+            for user_id, since in list(self._overlay_since.items()):
+                if since < snapshot.built_at:
+                    self.store.delete(user_id)
+                    self._overlay_since.pop(user_id, None)
+        return snapshot
+
+    def update_user(self, user_id, samples):
+        version = super().update_user(user_id, samples)
+        self._overlay_since[user_id] = time.time()
+        snapshot = self._snapshot()
+        if not version:
+            return 0
+        generation = snapshot.generation if snapshot else 0
+        base = snapshot.store.get(user_id)[1] if snapshot else 0
+        return (generation, base, version)
+
+    def get_template(self, user_id):
+        """
+        Returns:
+            (vector, (generation, snapshot version, overlay version)) - the
+            generation keeps versions from different snapshots apart (row
+            versions restart when the builder restarts), the overlay version
+            is 0 when the vector comes from the snapshot. (None, 0) if unknown.
+        """
+        snapshot = self._snapshot()
+        base_vector, base_version = snapshot.store.get(user_id) if snapshot else (None, 0)
+        generation = snapshot.generation if snapshot else 0
+        vector, version = self.store.get(user_id)
+        if vector is not None:
+            return vector, (generation, base_version, version)
+        if base_vector is None:
+            return None, 0
+        return base_vector, (generation, base_version, 0)
+
+    def load_all(self, batch_users=5000):
+        """Workers never build: map the published snapshot instead"""
+        self.reader.refresh()
+        snapshot = self._snapshot()
+        return snapshot.store.live if snapshot else 0
+
+    def snapshot_stats(self):
+        snapshot = self.reader.snapshot
+        return {
+            'generation': snapshot.generation if snapshot else 0,
+            'mapped_bytes': snapshot.nbytes if snapshot else 0,
+            'users': snapshot.store.live if snapshot else 0,
+            'overlay_users': self.store.live,
+        }
+
+
+class TemplateSnapshotBuilder:
+    """Builds the templates and republishes a generation whenever enrollments change"""
+
+    def __init__(self, template_service, directory=TEMPLATE_SNAPSHOT_DIR,
+                 interval=TEMPLATE_SNAPSHOT_INTERVAL, keep=SNAPSHOT_KEEP):
+        self.template_service = template_service
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        # Continue numbering across restarts so workers always move forward
+        self.generation = read_current_generation(directory)
+        self.high_water = None       # largest biometric_id already included
+        self.calibrations = None     # store.calibrations in the last published generation
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _mark(self):
+        built_at = time.time()
+        row = get_db().fetch_one("SELECT COALESCE(MAX(biometric_id), 0) FROM biometric_profile")
+        return row[0], built_at
+
+    def build(self):
+        """Load every template and publish it; returns the generation"""
+        mark, built_at = self._mark()
+        self.template_service.load_all()
+        self.high_water = mark
+        return self.publish(built_at)
+
+    def refresh(self):
+        """
+        Rebuild users with enrollments newer than the last build and publish
+
+        Also republishes after the store was recalibrated.
+
+        Returns:
+            number of users rebuilt (0 if nothing was published, or only a recalibration)
+        """
+        if self.high_water is None:
+            self.build()
+            return self.template_service.store.live
+        mark, built_at = self._mark()
+        recalibrated = self.template_service.store.calibrations != self.calibrations
+        if mark <= self.high_water and not recalibrated:
+            return 0
+        rebuilt = 0
+        if mark > self.high_water:
+            rows = get_db().fetch_all(
+                "SELECT DISTINCT user_id FROM biometric_profile WHERE biometric_id > ?", (self.high_water,)
+            )
+            rebuilt = self.template_service.rebuild_users([row[0] for row in rows])
+            self.high_water = mark
+        self.publish(built_at)
+        return rebuilt
+
+    def publish(self, built_at):
+        self.generation += 1
+        self.calibrations = self.template_service.store.calibrations
+        path = write_snapshot(self.template_service.store, self.directory, self.generation, built_at)
+        print(f"🧬 Published template snapshot generation {self.generation} ({os.path.getsize(path)} bytes)")
+        self.prune()
+        return self.generation
+
+    def prune(self):
+        """Delete generations older than the newest `keep` (open mappings stay valid)"""
+        for name in os.listdir(self.directory):
+            if not (name.startswith('templates-') and name.endswith('.bin')):
+                continue
+            try:
+                generation = int(name[len('templates-'):-len('.bin')])
+            except ValueError:
+                continue
+            if generation <= self.generation - self.keep:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def start(self):
+        """Build and keep publishing on a daemon thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name='template-builder', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️ Template snapshot refresh failed: {e}")
+            self._stop.wait(self.interval)
+
+
+def create_template_service():
+    """TemplateService for this process's TYPEID_TEMPLATE_SNAPSHOT role"""
+    if TEMPLATE_SNAPSHOT == 'worker':
+        return SharedTemplateService()
+    if TEMPLATE_SNAPSHOT not in ('off', 'builder'):
+        raise ValueError(f"Unknown TYPEID_TEMPLATE_SNAPSHOT role '{TEMPLATE_SNAPSHOT}'")
+    return TemplateService()
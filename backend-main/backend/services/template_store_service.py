@@ -0,0 +1,506 @@
+"""
+Quantized in-memory enrollment templates
+
+Statistical matching only needs each user's mean enrollment vector (the
+template). Holding those as Python lists of feature dicts costs kilobytes
+per sample; here every template is one row of a contiguous matrix:
+
+    codes     (capacity, 11)  uint8 or float16   quantized log1p(features)
+    offset    (11,) float64   per-feature offset  } shared by all rows
+    scale     (11,) float64   per-feature step    }
+    row_of    (max_user_id+1,) int32              user_id -> row, -1 = absent
+    user_ids  (capacity,) int64                   row -> user_id, -1 = tombstone
+    versions  (capacity,) uint32                  bumped on every put()
+
+Features are quantized in log1p space so the error is relative (a 2 ms
+step on a 100 ms dwell mean, not on a 2000 ms one). Rows are dequantized
+in vectorized batches on score. With uint8 a user costs 11 + 4 + 8 + 4 = 27
+bytes of arrays. Use scripts/template_store_report.py to measure memory
+per user and the similarity error against float64 on real or synthetic data.
+
+The range is calibrated once on real templates and refit when too many
+new values fall outside it. A put never refits: it only flags the store,
+and TemplateService recalibrates on a background thread from the float64
+templates rebuilt from the database, never from the lossy codes, so the
+error does not compound over recalibrations. Recalibration bumps every
+version, so score memo entries made against the old codes expire.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+from utils.db_util import get_db
+from utils.feature_schema import FEATURE_SCHEMA
+from services.enrollment_retention_service import (
+    ENROLLMENT_WINDOW, ENROLLMENT_RETENTION, MIN_ENROLLMENT_SAMPLES, window_order
+)
+
+TEMPLATE_STORE_ENABLED = os.getenv('TYPEID_TEMPLATE_STORE', 'on') == 'on'
+TEMPLATE_DTYPE = os.getenv('TYPEID_TEMPLATE_DTYPE', 'int8')   # int8 | float16
+
+# Quantization range headroom beyond the calibrated min/max, as a fraction
+# of the span: room for new users before values clip and force a refit
+RANGE_MARGIN = 0.25
+# Calibrate the quantizer on real data once this many templates were seen
+CALIBRATE_AFTER_USERS = 64
+# Recalibrate once this fraction of values had to be clipped, counted over
+# at least max(live users, CALIBRATE_AFTER_USERS) templates so one clipped
+# put right after a calibration does not trigger another
+RECALIBRATE_CLIP_RATIO = 0.01
+# Rewrite the matrix once this fraction of rows are tombstones
+COMPACT_TOMBSTONE_RATIO = 0.25
+
+# Range used until the store has been calibrated on real templates:
+# log1p(0) .. log1p(4000 ms), covers every feature the extractor emits
+DEFAULT_LOG_HIGH = float(np.log1p(4000.0))
+
+_INITIAL_CAPACITY = 1024
+
+
+def zscore_rows(X):
+    """Row-wise z-scores across features (constant rows become zeros)"""
+    X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+    std = X.std(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        Z = (X - X.mean(axis=1, keepdims=True)) / std
+    return np.nan_to_num(Z)
+
+
+def batch_similarity(login_vector, templates):
+    """
+    AuthService._calculate_similarity against many templates at once
+
+    z-score each vector across its features, Euclidean distance, then
+    exp(-distance / n_features).
+
+    Args:
+        login_vector: (11,) float64
+        templates: (m, 11) float64
+
+    Returns:
+        (m,) similarities in [0, 1]
+    """
+    distance = np.linalg.norm(zscore_rows(templates) - zscore_rows(login_vector), axis=1)
+    return np.exp(-distance / templates.shape[1])
+
+
+class QuantizedTemplateStore:
+    """Contiguous quantized template matrix with an id -> row index"""
+
+    def __init__(self, dtype=TEMPLATE_DTYPE, n_features=len(FEATURE_SCHEMA),
+                 capacity=_INITIAL_CAPACITY):
+        if dtype not in ('int8', 'float16'):
+            raise ValueError(f"Unsupported template dtype '{dtype}'")
+        self.dtype = dtype
+        self.n_features = n_features
+        self._code_dtype = np.uint8 if dtype == 'int8' else np.float16
+        self._levels = 255.0 if dtype == 'int8' else 1.0
+
+        self.codes = np.zeros((capacity, n_features), dtype=self._code_dtype)
+        self.user_ids = np.full(capacity, -1, dtype=np.int64)
+        self.versions = np.zeros(capacity, dtype=np.uint32)
+        self.row_of = np.full(capacity, -1, dtype=np.int32)
+        self.size = 0          # rows used, including tombstones
+        self.live = 0
+        self.puts = 0
+        self.clipped = 0
+
+        self.offset = np.zeros(n_features)
+        self.scale = np.full(n_features, DEFAULT_LOG_HIGH / self._levels)
+        self.calibrated = False
+        self.calibrations = 0
+        self.needs_recalibration = False
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_arrays(cls, dtype, offset, scale, codes, user_ids, versions, row_of, calibrated=True):
+        """
+        Wrap existing arrays without copying - e.g. read-only views into a
+        memory-mapped snapshot. The store can be read but not modified.
+        """
+        store = cls(dtype, n_features=codes.shape[1], capacity=0)
+        store.offset, store.scale = offset, scale
+        store.codes, store.user_ids, store.versions, store.row_of = codes, user_ids, versions, row_of
+        store.size = len(codes)
+        store.live = int(np.count_nonzero(user_ids >= 0))
+        store.calibrated = calibrated
+        return store
+
+    # ---------------------------------------------------
+    # QUANTIZATION
+    # ---------------------------------------------------
+    def quantize(self, vectors):
+        """float64 feature rows -> codes (values outside the range are clipped)"""
+        unit = (np.log1p(np.maximum(vectors, 0.0)) - self.offset) / self.scale
+        clipped = int(np.count_nonzero((unit < 0) | (unit > self._levels)))
+        unit = np.clip(unit, 0.0, self._levels)
+        if self.dtype == 'int8':
+            unit = np.rint(unit)
+        return unit.astype(self._code_dtype), clipped
+
+    def dequantize(self, codes):
+        """codes -> float64 feature rows (vectorized over any number of rows)"""
+        return np.expm1(codes.astype(np.float64) * self.scale + self.offset)
+
+    def _fit(self, vectors):
+        """Set offset/scale from float64 templates and reset the clip counters"""
+        logs = np.log1p(np.maximum(np.atleast_2d(vectors), 0.0))
+        low = logs.min(axis=0)
+        high = logs.max(axis=0)
+        span = np.maximum(high - low, 1e-6)
+        low = np.maximum(low - span * RANGE_MARGIN, 0.0)
+        high = high + span * RANGE_MARGIN
+
+        self.offset = low
+        self.scale = (high - low) / self._levels
+        self.calibrated = True
+        self.calibrations += 1
+        self.needs_recalibration = False
+        self.clipped = 0
+        self.puts = 0
+
+    def calibrate(self, vectors):
+        """
+        Fit offset/scale to the given float64 templates (before a bulk load).
+        Rows already stored are requantized from their dequantized values
+        and get a new version.
+        """
+        with self._lock:
+            existing = self.dequantize(self.codes[:self.size]) if self.size else None
+            self._fit(vectors)
+            if existing is not None:
+                self.codes[:self.size], _ = self.quantize(existing)
+                self.versions[:self.size] += 1
+
+    def recalibrate(self, user_ids, vectors, versions):
+        """
+        Refit the range and requantize from float64 source templates
+
+        Args:
+            user_ids, vectors: source templates (e.g. rebuilt from the database)
+            versions: each user's version when its source was read
+
+        Rows whose version is unchanged are requantized from their source;
+        rows written since (or without a source) from their current codes.
+        Every row gets a new version.
+
+        Returns:
+            number of rows requantized from a source
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float64).reshape(len(user_ids), self.n_features)
+        versions = np.asarray(versions, dtype=np.uint32)
+        with self._lock:
+            rows = np.full(len(user_ids), -1, dtype=np.int64)
+            known = (user_ids >= 0) & (user_ids < len(self.row_of))
+            rows[known] = self.row_of[user_ids[known]]
+            fresh = rows >= 0
+            fresh[fresh] = self.versions[rows[fresh]] == versions[fresh]
+            stale = np.setdiff1d(self.live_rows(), rows[fresh])
+            stale_vectors = self.dequantize(self.codes[stale])
+            if not np.any(fresh) and not len(stale):
+                return 0
+
+            self._fit(np.vstack([vectors[fresh], stale_vectors]))
+            self.codes[rows[fresh]], _ = self.quantize(vectors[fresh])
+            self.codes[stale], _ = self.quantize(stale_vectors)
+            self.versions[:self.size] += 1
+            return int(np.count_nonzero(fresh))
+
+    # ---------------------------------------------------
+    # MUTATION
+    # ---------------------------------------------------
+    def _grow(self, rows=None, user_id=None):
+        if rows is not None and rows > len(self.codes):
+            capacity = max(rows, len(self.codes) * 2)
+            self.codes = np.resize(self.codes, (capacity, self.n_features))
+            self.user_ids = np.concatenate([self.user_ids, np.full(capacity - len(self.user_ids), -1, np.int64)])
+            self.versions = np.concatenate([self.versions, np.zeros(capacity - len(self.versions), np.uint32)])
+        if user_id is not None and user_id >= len(self.row_of):
+            size = max(user_id + 1, len(self.row_of) * 2)
+            self.row_of = np.concatenate([self.row_of, np.full(size - len(self.row_of), -1, np.int32)])
+
+    def put(self, user_id, vector):
+        """Insert or replace one user's template; returns its new version"""
+        return self.put_many([user_id], np.atleast_2d(vector))[0]
+
+    def put_many(self, user_ids, vectors):
+        """
+        Append or overwrite templates for many users at once
+
+        Returns:
+            array of new template versions
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float64)
+        with self._lock:
+            codes, clipped = self.quantize(vectors)
+
+            self._grow(user_id=int(user_ids.max()))
+            rows = self.row_of[user_ids].astype(np.int64)
+            new = rows < 0
+            n_new = int(np.count_nonzero(new))
+            if n_new:
+                self._grow(rows=self.size + n_new)
+                rows[new] = np.arange(self.size, self.size + n_new)
+                self.size += n_new
+                self.live += n_new
+                self.row_of[user_ids[new]] = rows[new]
+                self.user_ids[rows[new]] = user_ids[new]
+                self.versions[rows[new]] = 0
+
+            self.codes[rows] = codes
+            self.versions[rows] += 1
+            self.puts += len(user_ids)
+            self.clipped += clipped
+
+            # Flag only: the owner recalibrates from float64 sources off this path
+            seen = max(self.puts, self.live, CALIBRATE_AFTER_USERS)
+            if not self.needs_recalibration and (
+                    (not self.calibrated and self.live >= CALIBRATE_AFTER_USERS)
+                    or self.clipped > RECALIBRATE_CLIP_RATIO * seen * self.n_features):
+                if self.calibrated:
+                    print(f"⚠️ Template values out of range ({self.clipped} clipped); recalibration needed")
+                self.needs_recalibration = True
+            return self.versions[rows].copy()
+
+    def delete(self, user_id):
+        """Tombstone a user's row; returns True if it existed"""
+        with self._lock:
+            row = self._row(user_id)
+            if row < 0:
+                return False
+            self.row_of[user_id] = -1
+            self.user_ids[row] = -1
+            self.live -= 1
+            if self.size and (self.size - self.live) > COMPACT_TOMBSTONE_RATIO * self.size:
+                self.compact()
+            return True
+
+    def compact(self):
+        """Drop tombstoned rows and rebuild the index"""
+        with self._lock:
+            keep = self.live_rows()
+            self.codes[:len(keep)] = self.codes[keep]
+            self.user_ids[:len(keep)] = self.user_ids[keep]
+            self.versions[:len(keep)] = self.versions[keep]
+            self.user_ids[len(keep):self.size] = -1
+            self.size = len(keep)
+            self.row_of[:] = -1
+            self.row_of[self.user_ids[:self.size]] = np.arange(self.size, dtype=np.int32)
+
+    # ---------------------------------------------------
+    # LOOKUP
+    # ---------------------------------------------------
+    def _row(self, user_id):
+        if user_id is None or user_id < 0 or user_id >= len(self.row_of):
+            return -1
+        return int(self.row_of[user_id])
+
+    def live_rows(self):
+        return np.flatnonzero(self.user_ids[:self.size] >= 0)
+
+    def __contains__(self, user_id):
+        return self._row(user_id) >= 0
+
+    def __len__(self):
+        return self.live
+
+    def get(self, user_id):
+        """(template float64 vector, version), or (None, 0) if absent"""
+        with self._lock:
+            row = self._row(user_id)
+            if row < 0:
+                return None, 0
+            return self.dequantize(self.codes[row]), int(self.versions[row])
+
+    def get_many(self, user_ids):
+        """(m, 11) float64 templates for the given users (NaN rows if absent)"""
+        with self._lock:
+            user_ids = np.asarray(user_ids, dtype=np.int64)
+            rows = np.full(len(user_ids), -1, dtype=np.int64)
+            known = (user_ids >= 0) & (user_ids < len(self.row_of))
+            rows[known] = self.row_of[user_ids[known]]
+            out = np.full((len(user_ids), self.n_features), np.nan)
+            present = rows >= 0
+            out[present] = self.dequantize(self.codes[rows[present]])
+            return out
+
+    def score(self, login_vector, user_ids):
+        """Vectorized statistical similarity of one login vector against many users"""
+        return batch_similarity(np.asarray(login_vector, dtype=np.float64), self.get_many(user_ids))
+
+    def memory_stats(self):
+        """Array bytes in use and per live user"""
+        used = (self.codes[:self.size].nbytes + self.user_ids[:self.size].nbytes
+                + self.versions[:self.size].nbytes + self.row_of.nbytes)
+        allocated = self.codes.nbytes + self.user_ids.nbytes + self.versions.nbytes + self.row_of.nbytes
+        return {
+            'dtype': self.dtype,
+            'users': self.live,
+            'rows': self.size,
+            'bytes_used': used,
+            'bytes_allocated': allocated,
+            'bytes_per_user': used / self.live if self.live else 0.0,
+            'calibrated': self.calibrated,
+            'calibrations': self.calibrations
+        }
+
+
+class TemplateService:
+    """Keeps the template store in sync with biometric_profile"""
+
+    def __init__(self, dtype=TEMPLATE_DTYPE, window=ENROLLMENT_WINDOW, retention=ENROLLMENT_RETENTION):
+        self.store = QuantizedTemplateStore(dtype)
+        self.window = window
+        self._window_order = window_order(retention)
+        self._recalibrating = threading.Lock()
+
+    @staticmethod
+    def template_from_samples(samples):
+        """Mean enrollment vector, or None below the minimum sample count"""
+        if samples is None or len(samples) < MIN_ENROLLMENT_SAMPLES:
+            return None
+        return FEATURE_SCHEMA.to_array(samples).mean(axis=0)
+
+    def update_user(self, user_id, samples):
+        """Recompute a user's template after enrollment; returns its version"""
+        template = self.template_from_samples(samples)
+        if template is None:
+            self.store.delete(user_id)
+            return 0
+        version = int(self.store.put(user_id, template))
+        self._recalibrate_if_needed()
+        return version
+
+    def get_template(self, user_id):
+        """(template, version) or (None, 0)"""
+        return self.store.get(user_id)
+
+    def load_all(self, batch_users=5000):
+        """
+        Build templates for every enrolled user from their retained window,
+        calibrating the quantizer on the full set first
+
+        Returns:
+            number of users loaded
+        """
+        ids, matrix = self._build_templates('', (), batch_users)
+        if ids:
+            self.store.calibrate(matrix)
+            self.store.put_many(ids, matrix)
+        stats = self.store.memory_stats()
+        print(f"🧬 Loaded {len(ids)} templates ({stats['dtype']}, {stats['bytes_per_user']:.1f} bytes/user)")
+        return len(ids)
+
+    def rebuild_users(self, user_ids, batch_users=5000):
+        """
+        Recompute the templates of the given users from the database
+
+        Returns:
+            number of templates written
+        """
+        user_ids = list(user_ids)
+        written = 0
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(user_ids), 500):
+            chunk = user_ids[i:i + 500]
+            ids, matrix = self._build_templates(
+                f"WHERE user_id IN ({', '.join('?' * len(chunk))})", chunk, batch_users
+            )
+            if ids:
+                self.store.put_many(ids, matrix)
+                written += len(ids)
+        self._recalibrate_if_needed()
+        return written
+
+    # ---------------------------------------------------
+    # RECALIBRATION
+    # ---------------------------------------------------
+    def _recalibrate_if_needed(self):
+        """Start a background recalibration when the store asks for one (at most one at a time)"""
+        if not self.store.needs_recalibration or not self._recalibrating.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self._recalibrate()
+            except Exception as e:
+                print(f"⚠️ Template recalibration failed: {e}")
+            finally:
+                self._recalibrating.release()
+
+        threading.Thread(target=run, name='template-recalibrate', daemon=True).start()
+
+    def recalibrate(self, batch_users=5000):
+        """
+        Refit the quantizer from float64 templates rebuilt from the database
+        for every user in the store (the DB read runs without the store lock)
+
+        Returns:
+            number of templates requantized from the database
+        """
+        with self._recalibrating:
+            return self._recalibrate(batch_users)
+
+    def _recalibrate(self, batch_users=5000):
+        with self.store._lock:
+            rows = self.store.live_rows()
+            version_of = dict(zip(self.store.user_ids[rows].tolist(), self.store.versions[rows].tolist()))
+        user_ids = list(version_of)
+        ids, vectors = [], []
+        for i in range(0, len(user_ids), 500):
+            chunk = user_ids[i:i + 500]
+            chunk_ids, matrix = self._build_templates(
+                f"WHERE user_id IN ({', '.join('?' * len(chunk))})", chunk, batch_users
+            )
+            if chunk_ids:
+                ids.extend(chunk_ids)
+                vectors.append(matrix)
+        refreshed = self.store.recalibrate(
+            ids, np.vstack(vectors) if vectors else np.empty((0, self.store.n_features)),
+            [version_of[user_id] for user_id in ids]
+        )
+        print(f"🧬 Recalibrated template store ({refreshed} of {len(user_ids)} from the database)")
+        return refreshed
+
+    def _build_templates(self, where, params, batch_users):
+        """Stream biometric_profile once, user by user -> (user ids, (n, 11) templates)"""
+        ids, vectors = [], []
+        current, samples = None, []
+
+        def flush():
+            template = self.template_from_samples(samples)
+            if template is not None:
+                ids.append(current)
+                vectors.append(template)
+
+        conn = get_db().connect(readonly=True)
+        try:
+            cursor = conn.execute(
+                f"SELECT user_id, typing_pattern FROM biometric_profile {where} "
+                f"ORDER BY user_id, {self._window_order}",
+                params
+            )
+            while True:
+                rows = cursor.fetchmany(batch_users)
+                if not rows:
+                    break
+                for user_id, pattern in rows:
+                    if user_id != current:
+                        if current is not None:
+                            flush()
+                        current, samples = user_id, []
+                    if self.window <= 0 or len(samples) < self.window:
+                        try:
+                            samples.append(json.loads(pattern) if isinstance(pattern, str) else pattern)
+                        except ValueError:
+                            pass
+            if current is not None:
+                flush()
+        finally:
+            conn.close()
+
+        return ids, (np.vstack(vectors) if vectors else None)
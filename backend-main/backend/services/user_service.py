@@ -1,38 +1,81 @@
 """
 User service for managing user data
 """
-import sqlite3
 import json
 from datetime import datetime
 
+from utils.password_util import (
+    hash_password, hash_password_async, verify_password, needs_rehash, is_password_hash,
+    validate_password,
+)
+from utils.metrics_util import metrics
+from utils.db_util import get_db
+from utils.tracing_util import tracer
+from services.username_filter_service import get_username_filter
+from services.enrollment_retention_service import (
+    ENROLLMENT_WINDOW, ENROLLMENT_RETENTION, MIN_ENROLLMENT_SAMPLES, window_order
+)
+
 def get_db_connection():
-    """Get database connection with timeout to prevent locking"""
-    import os
-    BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    DB_PATH = os.path.join(BASE_DIR, 'instance', 'biometric_app.db')
-    conn = sqlite3.connect(DB_PATH, timeout=30.0, isolation_level=None)  # Increased timeout, autocommit mode
-    conn.row_factory = sqlite3.Row
-    # Enable WAL mode for better concurrent access
-    conn.execute("PRAGMA journal_mode=WAL")
-    return conn
+    """
+    Borrow a pooled connection from the shared data-access layer
+    (SQLite WAL by default, or whatever DATABASE_URL points to).
+    close() returns it to the pool.
+    """
+    return get_db().connect()
+
+
+def get_read_connection():
+    """Borrow a read-only connection (runs alongside the single writer under WAL)"""
+    return get_db().connect(readonly=True)
+
+# Stored until the user sets a password (never matches is_password_hash)
+PASSWORD_PLACEHOLDER = 'hashed_password_placeholder'
+
+# Rows per multi-row INSERT (stays under SQLite's 999 bound-parameter limit)
+INSERT_CHUNK_ROWS = 150
+
+# find_user_by_name (and the username filter's misses) seek on name
+INDEX_DDL = (
+    'CREATE INDEX IF NOT EXISTS idx_user_name ON "user" (name)',
+)
 
 
 class UserService:
     """Service for user operations"""
     
-    def __init__(self):
+    def __init__(self, enrollment_window=ENROLLMENT_WINDOW, retention=ENROLLMENT_RETENTION):
         # Don't store connection - create fresh one for each operation
-        pass
+        self.enrollment_window = enrollment_window
+        self._window_order = window_order(retention)
     
     def _get_conn(self):
-        """Get a fresh database connection for each operation"""
-        return get_db_connection()
+        """Borrow a pooled read connection for each operation"""
+        return get_read_connection()
     
+    def _write(self, fn):
+        """
+        Run fn(conn) on the database's single writer and wait for the commit.
+        Writes are serialized and batched there, so no lock retries are needed.
+        """
+        return get_db().write_sync(fn)
+    
+    def ensure_indexes(self):
+        """Create the user-table indexes (idempotent; app.py calls it at startup)"""
+        def create(conn):
+            for ddl in INDEX_DDL:
+                conn.execute(ddl)
+        self._write(create)
+    
+    @tracer.traced(record=('username',))
     def find_user_by_name(self, username):
-        """Find user by username"""
+        """Find user by username (unknown names are usually answered by the username filter)"""
+        username_filter = get_username_filter()
+        if username_filter is not None and not username_filter.might_exist(username):
+            return None
         conn = self._get_conn()
         try:
-            query = "SELECT * FROM user WHERE name = ?"
+            query = 'SELECT * FROM "user" WHERE name = ?'
             cursor = conn.execute(query, (username,))
             row = cursor.fetchone()
             
@@ -45,11 +88,12 @@ class UserService:
         finally:
             conn.close()
     
+    @tracer.traced(record=('user_id',))
     def find_user_by_id(self, user_id):
         """Find user by user_id"""
         conn = self._get_conn()
         try:
-            query = "SELECT * FROM user WHERE user_id = ?"
+            query = 'SELECT * FROM "user" WHERE user_id = ?'
             cursor = conn.execute(query, (user_id,))
             row = cursor.fetchone()
             
@@ -62,132 +106,299 @@ class UserService:
         finally:
             conn.close()
     
+    @tracer.traced(record=('name',))
     def create_user(self, name, email):
-        """Create a new user"""
-        conn = self._get_conn()
+        """
+        Create a user and its user_registration row in one transaction
+        (one writer job, both INSERTs with RETURNING, no re-read)
+        """
         try:
-            # First create user in user table
-            query = """
-            INSERT INTO user (name, email, created_at)
-            VALUES (?, ?, ?)
-            """
-            cursor = conn.execute(query, (name, email, datetime.now().isoformat()))
-            
-            user_id = cursor.lastrowid
-            user = self.find_user_by_id(user_id)
-            
-            # Also create entry in user_registration table
-            if user:
-                self.create_user_registration(user_id)
-            
-            return user
+            user = self._write(lambda conn: self.insert_user(conn, name, email))
         except Exception as e:
             print(f"❌ Error creating user: {e}")
             return None
-        finally:
-            conn.close()
+        self._add_to_username_filter([name])
+        print(f"✅ Created user_id {user['user_id']} with user_registration record")
+        return user
+    
+    @tracer.traced()
+    def create_users(self, users):
+        """
+        Bulk onboarding: create many users in one transaction, one
+        multi-row INSERT per table (per chunk of INSERT_CHUNK_ROWS)
+        
+        Args:
+            users: list of {"name", "email", "password" (optional)} dicts
+        
+        Returns:
+            list of user dicts in input order, or None on error (nothing is written)
+        
+        Raises:
+            ValueError: a password longer than MAX_PASSWORD_BYTES (nothing is written)
+        """
+        tracer.set_attributes(users=len(users))
+        # Hash every password on the bcrypt pool before taking the writer
+        futures = [hash_password_async(u['password']) if u.get('password') else None for u in users]
+        rows = [(u['name'], u['email'], future.result() if future else None) for u, future in zip(users, futures)]
+        try:
+            created = self._write(lambda conn: self.insert_users(conn, rows))
+        except Exception as e:
+            print(f"❌ Error creating {len(users)} users: {e}")
+            return None
+        self._add_to_username_filter([user['name'] for user in created])
+        print(f"✅ Created {len(created)} users")
+        return created
     
+    def insert_user(self, conn, name, email, password_hash=None):
+        """
+        Insert the user and user_registration rows on conn, inside the
+        caller's transaction (reg_id = user_id)
+
+        Returns:
+            the new user dict (no re-read)
+        """
+        created_at = datetime.now().isoformat()
+        user_id = conn.execute(
+            'INSERT INTO "user" (name, email, created_at) VALUES (?, ?, ?) RETURNING user_id',
+            (name, email, created_at)
+        ).fetchone()[0]
+        reg_id = conn.execute(
+            """
+            INSERT INTO user_registration (reg_id, user_id, password, biometriclogin, registration_date)
+            VALUES (?, ?, ?, ?, ?)
+            RETURNING reg_id
+            """,
+            (user_id, user_id, password_hash or PASSWORD_PLACEHOLDER, 'enabled', created_at)
+        ).fetchone()[0]
+        return {'user_id': user_id, 'name': name, 'email': email, 'created_at': created_at, 'reg_id': reg_id}
+
+    def insert_users(self, conn, rows):
+        """
+        Multi-row insert of users and their registrations on conn, inside
+        the caller's transaction
+
+        Args:
+            rows: list of (name, email, password_hash or None)
+
+        Returns:
+            user dicts in input order
+        """
+        created_at = datetime.now().isoformat()
+        users = []
+        for start in range(0, len(rows), INSERT_CHUNK_ROWS):
+            chunk = rows[start:start + INSERT_CHUNK_ROWS]
+            # RETURNING order is not guaranteed for multi-row inserts: map back by (unique) email
+            returned = conn.execute(
+                'INSERT INTO "user" (name, email, created_at) VALUES '
+                + ', '.join(['(?, ?, ?)'] * len(chunk)) + ' RETURNING user_id, email',
+                [value for name, email, _ in chunk for value in (name, email, created_at)]
+            ).fetchall()
+            user_ids = {row[1]: row[0] for row in returned}
+            conn.execute(
+                'INSERT INTO user_registration (reg_id, user_id, password, biometriclogin, registration_date) VALUES '
+                + ', '.join(['(?, ?, ?, ?, ?)'] * len(chunk)),
+                [value for _, email, password_hash in chunk
+                 for value in (user_ids[email], user_ids[email], password_hash or PASSWORD_PLACEHOLDER,
+                               'enabled', created_at)]
+            )
+            users.extend(
+                {'user_id': user_ids[email], 'name': name, 'email': email,
+                 'created_at': created_at, 'reg_id': user_ids[email]}
+                for name, email, _ in chunk
+            )
+        return users
+
+    def _add_to_username_filter(self, names):
+        username_filter = get_username_filter()
+        if username_filter is not None:
+            for name in names:
+                username_filter.add(name)
+
+    def insert_keystroke_profiles(self, conn, user_id, reg_id, samples):
+        """
+        Insert enrollment samples on conn, inside the caller's transaction
+
+        Args:
+            samples: list of (sample_text, typing_pattern dict)
+        """
+        now = datetime.now().isoformat()
+        conn.executemany(
+            """
+            INSERT INTO biometric_profile (user_id, reg_id, sample_text, typing_pattern, created_date)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [(user_id, reg_id, sample_text, json.dumps(typing_pattern), now) for sample_text, typing_pattern in samples]
+        )
+        return len(samples)
+
+    @tracer.traced(record=('user_id',))
     def create_user_registration(self, user_id):
         """Create user registration record"""
-        conn = self._get_conn()
         try:
             query = """
             INSERT INTO user_registration (reg_id, user_id, password, biometriclogin, registration_date)
             VALUES (?, ?, ?, ?, ?)
             """
             # Use user_id as reg_id for simplicity
-            conn.execute(query, (
+            self._write(lambda conn: conn.execute(query, (
                 user_id,  # reg_id
                 user_id,  # user_id
-                'hashed_password_placeholder',  # password (can be updated later)
+                PASSWORD_PLACEHOLDER,  # password (can be updated later)
                 'enabled',  # biometriclogin
                 datetime.now().isoformat()
-            ))
+            )))
             print(f"✅ Created user_registration record for user_id {user_id}")
             return True
         except Exception as e:
             print(f"❌ Error creating user_registration: {e}")
             return False
+    
+    @tracer.traced(record=('user_id',))
+    def save_password(self, user_id, password):
+        """Hash a password (on the bcrypt pool) and store it in user_registration"""
+        password_hash = hash_password(password)
+        try:
+            self._write(lambda conn: conn.execute(
+                "UPDATE user_registration SET password = ? WHERE user_id = ?",
+                (password_hash, user_id)
+            ))
+            return True
+        except Exception as e:
+            print(f"❌ Error saving password: {e}")
+            return False
+    
+    @tracer.traced(record=('user_id',))
+    def get_password_hash(self, user_id):
+        """Get the stored password hash, or None if the user never set a password"""
+        conn = self._get_conn()
+        try:
+            row = conn.execute(
+                "SELECT password FROM user_registration WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if row and is_password_hash(row[0]):
+                return row[0]
+            return None
+        except Exception as e:
+            print(f"❌ Error reading password hash: {e}")
+            return None
         finally:
             conn.close()
     
+    @tracer.traced(record=('user_id',))
+    def verify_password(self, user_id, password):
+        """
+        Verify a password for a user.
+        Transparently rehashes the password when the stored hash uses an
+        outdated bcrypt cost factor.
+        """
+        password_hash = self.get_password_hash(user_id)
+        if not password_hash:
+            return False
+        
+        if not verify_password(password, password_hash):
+            return False
+        
+        # A hash from bcrypt<5 may cover a longer (truncated) password that
+        # can no longer be hashed; keep it rather than fail the login
+        if needs_rehash(password_hash) and validate_password(password):
+            print(f"🔁 Rehashing password for user_id {user_id} with current cost factor")
+            if self.save_password(user_id, password):
+                metrics.incr('password.rehash')
+        
+        return True
+    
+    @tracer.traced(record=('user_id', 'login_method', 'status'))
     def create_login_session(self, user_id, reg_id, login_method='biometric', status='success'):
         """Create login session record"""
-        conn = self._get_conn()
         try:
             query = """
             INSERT INTO login_session (user_id, reg_id, login_time, status, login_method)
             VALUES (?, ?, ?, ?, ?)
             """
-            conn.execute(query, (
-                user_id,
-                reg_id,
-                datetime.now().isoformat(),
-                status,
-                login_method
-            ))
+            params = (user_id, reg_id, datetime.now().isoformat(), status, login_method)
+            with metrics.timer('stage.session_write'):
+                self._write(lambda conn: conn.execute(query, params))
             print(f"✅ Created login_session record for user_id {user_id} ({login_method}, {status})")
             return True
         except Exception as e:
             print(f"❌ Error creating login_session: {e}")
             return False
-        finally:
-            conn.close()
     
+    @tracer.traced(record=('user_id',))
     def save_keystroke_profile(self, user_id, reg_id, sample_text, typing_pattern):
         """Save keystroke profile to biometric_profile table"""
-        conn = None
-        max_retries = 3
-        retry_count = 0
+        try:
+            query = """
+            INSERT INTO biometric_profile (user_id, reg_id, sample_text, typing_pattern, created_date)
+            VALUES (?, ?, ?, ?, ?)
+            """
+            
+            # Convert typing_pattern dict to JSON string
+            params = (user_id, reg_id, sample_text, json.dumps(typing_pattern), datetime.now().isoformat())
+            self._write(lambda conn: conn.execute(query, params))
+            
+            print(f"✅ Successfully saved keystroke profile to database for user_id {user_id}")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error saving keystroke profile: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+    
+    @tracer.traced(record=('user_id',))
+    def save_keystroke_profiles(self, user_id, reg_id, samples):
+        """
+        Bulk-save several enrollment samples in one transaction
         
-        while retry_count < max_retries:
-            try:
-                conn = self._get_conn()
-                
-                query = """
-                INSERT INTO biometric_profile (user_id, reg_id, sample_text, typing_pattern, created_date)
-                VALUES (?, ?, ?, ?, ?)
-                """
-                
-                # Convert typing_pattern dict to JSON string
-                typing_pattern_json = json.dumps(typing_pattern)
-                
-                conn.execute(query, (
-                    user_id,
-                    reg_id,
-                    sample_text,
-                    typing_pattern_json,
-                    datetime.now().isoformat()
-                ))
-                
-                print(f"✅ Successfully saved keystroke profile to database for user_id {user_id}")
-                return True
-                
-            except sqlite3.OperationalError as e:
-                if "locked" in str(e) and retry_count < max_retries - 1:
-                    retry_count += 1
-                    print(f"⚠️ Database locked, retrying ({retry_count}/{max_retries})...")
-                    import time
-                    time.sleep(0.5)  # Wait 500ms before retry
-                    continue
-                else:
-                    print(f"❌ Error saving keystroke profile: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    return False
-                    
-            except Exception as e:
-                print(f"❌ Error saving keystroke profile: {e}")
-                import traceback
-                traceback.print_exc()
-                return False
-                
-            finally:
-                if conn:
-                    conn.close()
+        Args:
+            user_id: User ID
+            reg_id: Registration ID
+            samples: list of (sample_text, typing_pattern dict)
         
-        return False
+        Returns:
+            number of rows written (0 on error - nothing is written)
+        """
+        try:
+            written = self._write(lambda conn: self.insert_keystroke_profiles(conn, user_id, reg_id, samples))
+            print(f"✅ Saved {written} keystroke profiles for user_id {user_id}")
+            return written
+        except Exception as e:
+            print(f"❌ Error bulk-saving keystroke profiles: {e}")
+            return 0
+    
+    @tracer.traced(record=('user_id', 'at_most'))
+    def count_keystroke_samples(self, user_id, at_most=None):
+        """
+        Count a user's enrollment samples on the (user_id, biometric_id) index
+        
+        Args:
+            user_id: User ID
+            at_most: stop counting here (cheap EXISTS-style sufficiency checks)
+        """
+        conn = self._get_conn()
+        try:
+            if at_most is None:
+                row = conn.execute(
+                    "SELECT COUNT(*) FROM biometric_profile WHERE user_id = ?", (user_id,)
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    "SELECT COUNT(*) FROM (SELECT 1 FROM biometric_profile WHERE user_id = ? LIMIT ?) AS s",
+                    (user_id, at_most)
+                ).fetchone()
+            return row[0]
+        except Exception as e:
+            print(f"❌ Error counting keystroke samples: {e}")
+            return 0
+        finally:
+            conn.close()
+    
+    def has_enough_samples(self, user_id, minimum=MIN_ENROLLMENT_SAMPLES):
+        """True if the user has at least `minimum` enrollment samples"""
+        return self.count_keystroke_samples(user_id, at_most=minimum) >= minimum
     
+    @tracer.traced(record=('username',))
     def get_user_keystroke_samples(self, username):
         """
         Retrieve the registered keystroke samples for a user from biometric_profile table
@@ -195,32 +406,43 @@ class UserService:
         [ks_count, ks_rate, dwell_mean, dwell_std, flight_mean, flight_std,
          digraph_mean, digraph_std, backspace_rate, wps, wpm]
         """
+        # Get user_id from username
+        user = self.find_user_by_name(username)
+        if not user:
+            print(f"❌ User '{username}' not found")
+            return []
+        
+        return self.get_keystroke_samples_by_user_id(user.get('user_id') or user.get('id'))
+    
+    @tracer.traced(record=('user_id',))
+    def get_keystroke_samples_by_user_id(self, user_id):
+        """
+        Retrieve the user's retained enrollment window (at most
+        TYPEID_ENROLLMENT_WINDOW samples, chosen by the retention policy)
+        """
         conn = self._get_conn()
         try:
-            # Get user_id from username
-            user = self.find_user_by_name(username)
-            if not user:
-                print(f"❌ User '{username}' not found")
-                return []
-            
-            user_id = user.get('user_id') or user.get('id')
-            
             # Query biometric_profile table for this user's samples
-            query = """
+            query = f"""
             SELECT typing_pattern 
             FROM biometric_profile 
             WHERE user_id = ? 
-            ORDER BY created_date DESC
+            ORDER BY {self._window_order}
             """
+            params = (user_id,)
+            if self.enrollment_window > 0:
+                query += " LIMIT ?"
+                params = (user_id, self.enrollment_window)
             
-            cursor = conn.execute(query, (user_id,))
+            cursor = conn.execute(query, params)
             rows = cursor.fetchall()
             
             if not rows:
                 print(f"⚠️ No keystroke samples found for user_id {user_id}")
                 return []
             
-            print(f"📊 Retrieved {len(rows)} samples from database for user '{username}'")
+            tracer.set_attributes(samples=len(rows))
+            print(f"📊 Retrieved {len(rows)} samples from database for user_id {user_id}")
             
             # Parse typing_pattern (stored as JSON string)
             samples = []
@@ -248,4 +470,4 @@ class UserService:
             traceback.print_exc()
             return []
         finally:
-            conn.close()
\ No newline at end of file
+            conn.close()
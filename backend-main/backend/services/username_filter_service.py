@@ -0,0 +1,199 @@
+"""
+Negative-lookup filter for usernames
+
+Login, hybrid-login and registration look users up with
+SELECT * FROM "user" WHERE name = ? (an idx_user_name seek). Unknown
+usernames (typos, enumeration) still paid that query every time. A Bloom
+filter of every username lets find_user_by_name answer "definitely not
+present" from memory; only names that might exist reach the database.
+
+- Loaded at startup by the warm-up; until then every lookup goes to the DB
+- create_user adds the new name immediately in this process
+- Users created by other workers are picked up by a catch-up read of
+  user_id > last seen (a rowid range seek) before a negative answer is
+  given, so a user committed anywhere is never reported absent. The read
+  usually returns no rows. Concurrent negatives share catch-ups: a caller
+  joins one that starts after it arrived rather than queueing its own, so
+  a burst of unknown names costs at most two reads at a time.
+  TYPEID_USERNAME_FILTER_SYNC > 0 rate-limits it to once per that many
+  seconds, trading that guarantee for fewer queries
+- Maintenance rebuilds the filter at twice the size once it outgrows its
+  capacity, keeping the false-positive rate near the target
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, wait
+
+from utils.bloom_filter import BloomFilter
+from utils.db_util import get_db
+from utils.metrics_util import metrics
+
+USERNAME_FILTER_ENABLED = os.getenv('TYPEID_USERNAME_FILTER', 'on') == 'on'
+USERNAME_FILTER_CAPACITY = int(os.getenv('TYPEID_USERNAME_FILTER_CAPACITY', '100000'))
+USERNAME_FILTER_FPR = float(os.getenv('TYPEID_USERNAME_FILTER_FPR', '0.01'))
+USERNAME_FILTER_SYNC = float(os.getenv('TYPEID_USERNAME_FILTER_SYNC', '0'))
+
+LOAD_BATCH_ROWS = 50000
+# Ids below the high-water mark re-read on every catch-up where ids can
+# commit out of order (PostgreSQL); SQLite commits them in order
+CATCH_UP_OVERLAP_IDS = 64
+
+
+class UsernameFilter:
+    """Bloom filter of all usernames with cross-worker catch-up"""
+
+    def __init__(self, capacity=USERNAME_FILTER_CAPACITY, fpr=USERNAME_FILTER_FPR,
+                 sync_interval=USERNAME_FILTER_SYNC):
+        self.capacity = capacity
+        self.fpr = fpr
+        self.sync_interval = sync_interval
+        self.bloom = None                 # None until loaded: everything "might exist"
+        self.high_water = 0               # largest user_id in the filter
+        self.loaded_at = None
+        self._last_sync = 0.0
+        self._sync_lock = threading.Lock()
+        self._running = None              # Future of the catch-up reading now
+        self._next = None                 # Future of the one that starts after it
+        self._load_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.bloom is not None
+
+    def load(self):
+        """
+        Build the filter from the user table and swap it in
+
+        Returns:
+            number of usernames loaded
+        """
+        with self._load_lock:
+            db = get_db()
+            count = db.fetch_one('SELECT COUNT(*) FROM "user"')[0]
+            bloom = BloomFilter(max(self.capacity, 2 * count), self.fpr)
+            high_water = 0
+            while True:
+                rows = db.fetch_all(
+                    'SELECT user_id, name FROM "user" WHERE user_id > ? ORDER BY user_id LIMIT ?',
+                    (high_water, LOAD_BATCH_ROWS)
+                )
+                if not rows:
+                    break
+                bloom.add_many([row[1] for row in rows])
+                high_water = rows[-1][0]
+            self.bloom, self.high_water = bloom, high_water
+            self.capacity = bloom.capacity
+            self.loaded_at = time.time()
+            # Users created while the bulk read ran
+            self.catch_up()
+            print(f"🌸 Username filter: {bloom.count} names, {bloom.memory_bytes / 1024:.0f} KiB, "
+                  f"expected FPR {bloom.expected_fpr():.4%}")
+            return bloom.count
+
+    def catch_up(self):
+        """
+        Add users created since the last load/catch-up (e.g. by other workers)
+
+        Single flight: the read runs without holding the lock. A caller that
+        arrives while one is running waits for it to finish and then shares
+        the next one - a read already in progress may predate the user the
+        caller is looking for, so it is not enough on its own.
+
+        Returns:
+            number of names added by the catch-up this call waited for
+        """
+        future = None
+        while True:
+            with self._sync_lock:
+                if future is not None and (future is self._running or future.done()):
+                    leader = False
+                    break
+                if self._running is None:
+                    future = self._running = future or self._next or Future()
+                    self._next = None
+                    leader = True
+                    break
+                if self._next is None:
+                    self._next = Future()
+                future, running = self._next, self._running
+            wait([running])
+
+        if not leader:
+            return future.result()
+        try:
+            added = self._read_new_users()
+            future.set_result(added)
+            return added
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._sync_lock:
+                self._running = None
+
+    def _read_new_users(self):
+        self._last_sync = time.monotonic()
+        db = get_db()
+        overlap = 0 if db.dialect == 'sqlite' else CATCH_UP_OVERLAP_IDS
+        rows = db.fetch_all(
+            'SELECT user_id, name FROM "user" WHERE user_id > ? ORDER BY user_id',
+            (self.high_water - overlap,)
+        )
+        new = [row[1] for row in rows if row[1] not in self.bloom]
+        if new:
+            self.bloom.add_many(new)
+        if rows:
+            self.high_water = max(self.high_water, rows[-1][0])
+        return len(new)
+
+    def add(self, name):
+        """Record a user created in this process (catch-up skips names already present)"""
+        if self.bloom is not None and name not in self.bloom:
+            self.bloom.add(name)
+
+    def might_exist(self, name):
+        """
+        False only if the user definitely does not exist
+
+        A negative is re-checked after a catch-up (when the last one is at
+        least sync_interval old - always, by default), so users created by
+        other workers are seen.
+        """
+        bloom = self.bloom
+        if bloom is None or name in bloom:
+            return True
+        if time.monotonic() - self._last_sync >= self.sync_interval:
+            self.catch_up()
+            if name in self.bloom:
+                return True
+        metrics.incr('username_filter.negative')
+        return False
+
+    def rebuild_if_full(self):
+        """Maintenance: reload at twice the size once the key count exceeds capacity"""
+        if self.bloom is not None and self.bloom.count > self.bloom.capacity:
+            self.capacity = 2 * self.bloom.count
+            self.load()
+
+    def stats(self):
+        if self.bloom is None:
+            return {'loaded': False}
+        return dict(self.bloom.stats(), loaded=True, high_water=self.high_water,
+                    sync_interval=self.sync_interval)
+
+
+_username_filter = None
+_username_filter_lock = threading.Lock()
+
+
+def get_username_filter():
+    """Process-wide UsernameFilter, or None if disabled"""
+    global _username_filter
+    if not USERNAME_FILTER_ENABLED:
+        return None
+    if _username_filter is None:
+        with _username_filter_lock:
+            if _username_filter is None:
+                _username_filter = UsernameFilter()
+    return _username_filter
@@ -0,0 +1,172 @@
+"""
+Per-user verifier models
+
+Alternative to the global multi-class XGBoost model in predict.py.
+Each user gets a tiny one-class model (scaled Manhattan detector) trained
+from their own enrollment samples at registration time:
+
+    model = (per-feature mean, per-feature scale)   -> 22 float32 = 88 bytes
+
+Models are stored as BLOBs in the user_verifier table. A login reads the
+user's row (one primary-key lookup of 88 bytes) and runs one 11-feature
+evaluation no matter how many users are enrolled; enrolling a new user
+never forces a global retrain. There is deliberately no in-process cache:
+checking a cached model for staleness would cost the same lookup, and
+reading the row means a re-enrollment on any worker applies immediately.
+"""
+from datetime import datetime
+
+import numpy as np
+
+from services.user_service import get_read_connection
+from utils.db_util import get_db
+from utils.feature_schema import FEATURE_SCHEMA
+
+MIN_TRAINING_SAMPLES = 3
+
+# Scale floor as a fraction of the feature mean, so a user who typed very
+# consistently during enrollment is not rejected for ordinary variation
+SCALE_FLOOR_RATIO = 0.10
+SCALE_EPSILON = 1e-6
+
+# Mean scaled distance that maps to ~37% confidence (exp(-1))
+DISTANCE_SCALE = 2.0
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS user_verifier (
+    user_id INTEGER PRIMARY KEY,
+    model BLOB NOT NULL,
+    sample_count INTEGER NOT NULL,
+    trained_at TEXT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES user(user_id)
+)
+"""
+
+
+class UserVerifierModel:
+    """One-class scaled Manhattan detector for a single user"""
+
+    __slots__ = ('mean', 'scale')
+
+    def __init__(self, mean, scale):
+        self.mean = mean
+        self.scale = scale
+
+    @classmethod
+    def fit(cls, vectors):
+        """Fit from an (n_samples, n_features) matrix of enrollment vectors"""
+        X = np.asarray(vectors, dtype=np.float64)
+        mean = X.mean(axis=0)
+        spread = np.abs(X - mean).mean(axis=0)
+        scale = np.maximum(spread, np.abs(mean) * SCALE_FLOOR_RATIO)
+        scale = np.maximum(scale, SCALE_EPSILON)
+        return cls(mean.astype(np.float32), scale.astype(np.float32))
+
+    @classmethod
+    def from_bytes(cls, blob):
+        packed = np.frombuffer(blob, dtype=np.float32)
+        n = len(FEATURE_SCHEMA)
+        return cls(packed[:n], packed[n:2 * n])
+
+    def to_bytes(self):
+        return np.concatenate([self.mean, self.scale]).astype(np.float32).tobytes()
+
+    def score(self, vectors):
+        """
+        Score login vectors against this model
+
+        Returns:
+            confidence on 0-100 scale (higher = closer to enrollment)
+        """
+        X = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        distance = float((np.abs(X - self.mean) / self.scale).mean())
+        return float(np.exp(-distance / DISTANCE_SCALE) * 100.0)
+
+
+class VerifierService:
+    """Trains, stores and serves per-user verifier models"""
+
+    def __init__(self):
+        self._table_ready = False
+
+    def ensure_schema(self):
+        """Create the user_verifier table (idempotent; app.py calls it at startup)"""
+        get_db().write_sync(lambda conn: conn.execute(CREATE_TABLE_SQL))
+        self._table_ready = True
+
+    def _get_conn(self):
+        """Pooled read connection (WAL lets it run alongside the writer)"""
+        if not self._table_ready:
+            self.ensure_schema()
+        return get_read_connection()
+
+    # ---------------------------------------------------
+    # TRAINING (enrollment time)
+    # ---------------------------------------------------
+    def train_user(self, user_id, samples):
+        """
+        Train and persist the verifier for one user
+
+        Args:
+            user_id: User ID
+            samples: list of enrollment feature dicts
+
+        Returns:
+            True if a model was trained, False if there were too few samples
+        """
+        if not samples or len(samples) < MIN_TRAINING_SAMPLES:
+            return False
+
+        model = UserVerifierModel.fit(FEATURE_SCHEMA.to_array(samples))
+
+        if not self._table_ready:
+            self.ensure_schema()
+        try:
+            get_db().write_sync(lambda conn: self.store_model(conn, user_id, model, len(samples)))
+        except Exception as e:
+            print(f"❌ Error saving verifier model for user_id {user_id}: {e}")
+            return False
+
+        print(f"✅ Trained per-user verifier for user_id {user_id} ({len(samples)} samples)")
+        return True
+
+    def store_model(self, conn, user_id, model, sample_count):
+        """Upsert a user's model on conn, inside the caller's transaction"""
+        conn.execute(
+            """
+            INSERT INTO user_verifier (user_id, model, sample_count, trained_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                model = excluded.model,
+                sample_count = excluded.sample_count,
+                trained_at = excluded.trained_at
+            """,
+            (user_id, model.to_bytes(), sample_count, datetime.now().isoformat())
+        )
+
+    # ---------------------------------------------------
+    # LOOKUP (login time)
+    # ---------------------------------------------------
+    def get_model(self, user_id):
+        """Read the user's current model, or None if none was trained"""
+        conn = self._get_conn()
+        try:
+            row = conn.execute(
+                "SELECT model FROM user_verifier WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return UserVerifierModel.from_bytes(row[0]) if row else None
+
+    def verify(self, user_id, keystroke_features_list):
+        """
+        Score login samples (feature dicts or a schema array) against the
+        user's own verifier
+
+        Returns:
+            confidence (0-100), or None if the user has no trained model
+        """
+        model = self.get_model(user_id)
+        if model is None:
+            return None
+        return model.score(FEATURE_SCHEMA.to_array(keystroke_features_list))
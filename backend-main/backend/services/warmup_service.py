@@ -0,0 +1,215 @@
+"""
+Startup warm-up and readiness
+
+/api/health answers as soon as Flask is up, but the first logins after a
+deploy would still pay for opening pool connections, the first model
+call, bcrypt cost calibration, an empty template store and cold OS page
+caches. WarmupService runs those costs once on a background thread at
+startup; /api/ready reports 503 until every step has finished, then 200
+with the time each step took. A step that finds the worker unable to serve
+logins at all (the global engine without a layer 2 predictor) keeps it at
+503 for good, so the load balancer never routes logins to it.
+"""
+import os
+import threading
+import time
+
+from utils.db_util import get_db
+from utils.metrics_util import metrics
+from utils.password_util import get_bcrypt_rounds
+from utils.feature_schema import FEATURE_SCHEMA
+from services.auth_service import predict_module
+from services.session_partition_service import HOT_TABLE
+from services.template_snapshot_service import SharedTemplateService
+from services.username_filter_service import get_username_filter
+
+WARMUP_ENABLED = os.getenv('TYPEID_WARMUP', 'on') == 'on'
+WARMUP_TEMPLATES = os.getenv('TYPEID_WARMUP_TEMPLATES', 'hot')   # hot | all | off
+WARMUP_HOT_USERS = int(os.getenv('TYPEID_WARMUP_HOT_USERS', '10000'))
+WARMUP_DB_BYTES = int(os.getenv('TYPEID_WARMUP_DB_BYTES', str(256 << 20)))
+
+# A typical login sample for the dummy inferences
+DUMMY_SAMPLE = {
+    'ks_count': 40, 'ks_rate': 4.0, 'dwell_mean': 110, 'dwell_std': 25,
+    'flight_mean': 150, 'flight_std': 40, 'digraph_mean': 130, 'digraph_std': 30,
+    'backspace_rate': 0.02, 'wps': 0.8, 'wpm': 48,
+}
+
+_READ_CHUNK = 1 << 20
+
+
+class WarmupBlocked(RuntimeError):
+    """A step failure that must keep the worker unready (not just recorded)"""
+
+
+class WarmupService:
+    """Runs the warm-up steps once and tracks readiness"""
+
+    def __init__(self, auth_service, enabled=WARMUP_ENABLED, templates=WARMUP_TEMPLATES):
+        self.auth_service = auth_service
+        self.enabled = enabled
+        self.templates = templates
+        self.steps = [
+            ('db_pool', self.warm_db_pool),
+            ('password_hash', self.warm_password_hash),
+            ('username_filter', self.warm_username_filter),
+            ('ml_model', self.warm_ml_model),
+            ('statistical', self.warm_statistical),
+            ('templates', self.warm_templates),
+            ('db_pages', self.warm_db_pages),
+        ]
+        self.results = []
+        self.blocked = []                 # steps that failed with WarmupBlocked
+        self.started_at = None
+        self.total_ms = None
+        self._done = threading.Event()
+        self._thread = None
+        if not enabled:
+            self._done.set()
+
+    @property
+    def ready(self):
+        return self._done.is_set() and not self.blocked
+
+    def start(self):
+        """Run the warm-up on a daemon thread (no-op if disabled or started)"""
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.run, name='warmup', daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def run(self):
+        """
+        Run every step once. A failing step is recorded and the rest still
+        run, so a broken optional component never keeps the worker unready;
+        only WarmupBlocked does.
+        """
+        self.started_at = time.time()
+        start = time.perf_counter()
+        for name, step in self.steps:
+            step_start = time.perf_counter()
+            try:
+                detail = step()
+                status = 'ok' if detail is not None else 'skipped'
+            except WarmupBlocked as e:
+                detail, status = str(e), 'failed'
+                self.blocked.append(name)
+                print(f"❌ Warm-up step '{name}' failed, worker stays unready: {e}")
+            except Exception as e:
+                detail, status = str(e), 'failed'
+                print(f"⚠️ Warm-up step '{name}' failed: {e}")
+            ms = (time.perf_counter() - step_start) * 1000.0
+            metrics.observe(f'warmup.{name}', ms)
+            self.results.append({'step': name, 'status': status, 'ms': round(ms, 2), 'detail': detail})
+        self.total_ms = round((time.perf_counter() - start) * 1000.0, 2)
+        self._done.set()
+        print(f"🔥 Warm-up finished in {self.total_ms:.0f} ms")
+
+    def status(self):
+        return {
+            'ready': self.ready,
+            'enabled': self.enabled,
+            'total_ms': self.total_ms,
+            'blocked_by': list(self.blocked),
+            'steps': list(self.results),
+            'pending': [name for name, _ in self.steps[len(self.results):]] if self.enabled else [],
+        }
+
+    # ---------------------------------------------------
+    # STEPS
+    # ---------------------------------------------------
+    def warm_db_pool(self):
+        """Fill the read pool and start the writer thread"""
+        db = get_db()
+        conns = [db.connect(readonly=True) for _ in range(db.pool_size)]
+        try:
+            for conn in conns:
+                conn.execute("SELECT 1").fetchone()
+        finally:
+            for conn in conns:
+                conn.close()
+        db.write_sync(lambda conn: conn.execute("SELECT 1").fetchone())
+        return {'connections': len(conns)}
+
+    def warm_password_hash(self):
+        """Calibrate the bcrypt cost factor and start the hash pool"""
+        return {'rounds': get_bcrypt_rounds()}
+
+    def warm_username_filter(self):
+        """Load every username into the negative-lookup filter"""
+        username_filter = get_username_filter()
+        if username_filter is None:
+            return None
+        username_filter.load()
+        return username_filter.stats()
+
+    def warm_ml_model(self):
+        """
+        One dummy inference through layer 2, faulting in the model bundle pages
+
+        Raises:
+            WarmupBlocked: global engine with no predictor (or one that
+                cannot predict) - every login would fail layer 2
+        """
+        matrix = FEATURE_SCHEMA.to_array([DUMMY_SAMPLE] * 3)
+        detail = {}
+        if self.auth_service.verification_engine == 'per_user':
+            self.auth_service.verifier_service.verify(-1, matrix)
+            detail['engine'] = 'per_user'
+        else:
+            if predict_module is None:
+                raise WarmupBlocked('No layer 2 predictor loaded for the global engine')
+            predicted, _ = self.auth_service.predict_user_from_keystroke(matrix)
+            if predicted == 'unknown':
+                raise WarmupBlocked('Layer 2 predictor returned no prediction')
+            detail['engine'] = 'global'
+        bundle = getattr(predict_module, 'bundle', None)
+        if bundle is not None:
+            detail['bundle_pages'] = bundle.touch()
+        return detail
+
+    def warm_statistical(self):
+        """Statistical layer on a dummy login (numpy/scipy code paths)"""
+        matrix = FEATURE_SCHEMA.to_array([DUMMY_SAMPLE] * 3)
+        score = self.auth_service.statistical_matching(matrix, reference=matrix.mean(axis=0) * 1.05)
+        return {'score': round(float(score), 4)}
+
+    def warm_templates(self):
+        """Preload templates: recently active users, everyone, or the mapped snapshot"""
+        template_service = self.auth_service.template_service
+        if template_service is None or self.templates == 'off':
+            return None
+        if isinstance(template_service, SharedTemplateService):
+            users = template_service.load_all()
+            snapshot = template_service.reader.snapshot
+            return {'users': users, 'snapshot_pages': snapshot.touch() if snapshot else 0}
+        if self.templates == 'all':
+            return {'users': template_service.load_all()}
+        db = get_db()
+        # Partitioned hot table on SQLite, the plain login_session elsewhere
+        sessions = HOT_TABLE if db.dialect == 'sqlite' else 'login_session'
+        rows = db.fetch_all(
+            f"SELECT user_id FROM {sessions} GROUP BY user_id ORDER BY MAX(session_id) DESC LIMIT ?",
+            (WARMUP_HOT_USERS,)
+        )
+        return {'users': template_service.rebuild_users([row[0] for row in rows])}
+
+    def warm_db_pages(self):
+        """Read the SQLite database (and WAL) once so its pages are in the OS cache"""
+        db = get_db()
+        if db.dialect != 'sqlite':
+            return None
+        remaining = WARMUP_DB_BYTES
+        for path in (db.path, db.path + '-wal'):
+            if remaining <= 0 or not os.path.exists(path):
+                continue
+            with open(path, 'rb', buffering=0) as f:
+                while remaining > 0:
+                    chunk = f.read(min(_READ_CHUNK, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+        return {'bytes': WARMUP_DB_BYTES - remaining}
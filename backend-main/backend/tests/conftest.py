@@ -0,0 +1,32 @@
+"""
+Make the backend/ modules importable as in `python -m` runs from backend/,
+and provide a throwaway database
+"""
+import os
+import sqlite3
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SCHEMA_PATH = os.path.join(BACKEND_DIR, 'instance', 'typing_biometric.sql')
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """A fresh schema in a temp SQLite file, installed as the process-wide get_db()"""
+    from services import username_filter_service
+    from utils.db_util import configure_db
+
+    path = str(tmp_path / 'test.db')
+    conn = sqlite3.connect(path)
+    with open(SCHEMA_PATH) as f:
+        conn.executescript(f.read())
+    conn.close()
+    # The filter is process-wide and would outlive this database
+    monkeypatch.setattr(username_filter_service, 'USERNAME_FILTER_ENABLED', False)
+    db = configure_db(f'sqlite:///{path}')
+    yield path
+    db.close_all()
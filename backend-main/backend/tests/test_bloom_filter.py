@@ -0,0 +1,32 @@
+from utils.bloom_filter import BloomFilter, optimal_size
+
+
+def test_add_many_sets_the_same_bits_as_add():
+    keys = [f'user{i}' for i in range(2000)] + ['', 'émile', 'x' * 300]
+    one_by_one, bulk = BloomFilter(5000), BloomFilter(5000)
+    for key in keys:
+        one_by_one.add(key)
+    bulk.add_many(keys)
+
+    assert bulk.bits == one_by_one.bits
+    assert bulk.count == one_by_one.count == len(keys)
+    assert all(key in bulk for key in keys)
+
+
+def test_add_many_matches_add_on_large_filters():
+    # Wide enough that (h1 + i * h2) would overflow uint64 without reducing mod m first
+    keys = [f'user{i}' for i in range(500)]
+    one_by_one, bulk = BloomFilter(5_000_000, fpr=0.001), BloomFilter(5_000_000, fpr=0.001)
+    for key in keys:
+        one_by_one.add(key)
+        assert all(0 <= p < one_by_one.n_bits for p in one_by_one._positions(key))
+    bulk.add_many(keys)
+    assert bulk.bits == one_by_one.bits
+
+
+def test_false_positive_rate_is_near_target():
+    bloom = BloomFilter(10000, fpr=0.01)
+    bloom.add_many(f'user{i}' for i in range(10000))
+    false_positives = sum(f'ghost{i}' in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.02
+    assert optimal_size(10000, 0.01) == (bloom.n_bits, bloom.n_hashes)
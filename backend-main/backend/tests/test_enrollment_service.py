@@ -0,0 +1,72 @@
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from services.enrollment_service import EnrollmentError, EnrollmentService
+from services.user_service import UserService
+from services.verifier_service import VerifierService
+from utils.feature_schema import FEATURE_SCHEMA
+
+
+def make_service():
+    verifier_service = VerifierService()
+    verifier_service.ensure_schema()
+    auth_service = SimpleNamespace(user_service=UserService(), verifier_service=verifier_service,
+                                   template_service=None)
+    return EnrollmentService(auth_service)
+
+
+def enroll(service, name, email):
+    token = service.start(name, email)
+    for i in range(service.required_samples):
+        service.add_sample(token, {feature: 10.0 + i for feature in FEATURE_SCHEMA.names})
+    return token
+
+
+def row_counts(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                for table in ('"user"', 'user_registration', 'biometric_profile', 'user_verifier')}
+    finally:
+        conn.close()
+
+
+def test_complete_writes_everything(database):
+    service = make_service()
+    user = service.complete(enroll(service, 'alice', 'alice@example.com'))
+
+    assert user['name'] == 'alice'
+    assert row_counts(database) == {'"user"': 1, 'user_registration': 1,
+                                    'biometric_profile': service.required_samples, 'user_verifier': 1}
+
+
+def test_failed_commit_step_rolls_back_every_row(database):
+    service = make_service()
+    token = enroll(service, 'alice', 'alice@example.com')
+
+    def fail(conn, user_id, model, sample_count):
+        raise sqlite3.OperationalError('disk I/O error')
+
+    # The last step of the transaction, after user, registration and samples
+    verifier_service = service.auth_service.verifier_service
+    verifier_service.store_model = fail
+    with pytest.raises(sqlite3.OperationalError):
+        service.complete(token)
+
+    assert set(row_counts(database).values()) == {0}
+    # The session survives, so the same enrollment can be retried
+    del verifier_service.store_model
+    assert service.complete(token)['name'] == 'alice'
+
+
+def test_name_taken_meanwhile_writes_nothing(database):
+    service = make_service()
+    first = enroll(service, 'alice', 'alice@example.com')
+    second = enroll(service, 'alice', 'other@example.com')
+    service.complete(first)
+
+    with pytest.raises(EnrollmentError):
+        service.complete(second)
+    assert row_counts(database)['"user"'] == 1
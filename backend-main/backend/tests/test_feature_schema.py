@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from utils.feature_schema import FEATURE_SCHEMA, FeatureValidationError
+
+SAMPLE = dict(zip(FEATURE_SCHEMA.names, [40, 4.0, 110, 25, 150, 40, 130, 30, 0.02, 0.8, 48]))
+
+
+def test_parse_orders_columns_by_schema():
+    shuffled = dict(reversed(list(SAMPLE.items())))
+    X = FEATURE_SCHEMA.parse([SAMPLE, shuffled])
+
+    assert X.shape == (2, len(FEATURE_SCHEMA)) and X.dtype == np.float64
+    np.testing.assert_array_equal(X[0], [SAMPLE[name] for name in FEATURE_SCHEMA.names])
+    np.testing.assert_array_equal(X[0], X[1])
+
+
+def test_parse_accepts_one_dict_and_turns_none_into_zero():
+    X = FEATURE_SCHEMA.parse(dict(SAMPLE, dwell_std=None))
+    assert X.shape == (1, len(FEATURE_SCHEMA))
+    assert X[0, FEATURE_SCHEMA.index['dwell_std']] == 0.0
+
+
+@pytest.mark.parametrize('samples, message', [
+    ([], 'required'),
+    ([{k: v for k, v in SAMPLE.items() if k != 'wpm'}], 'Missing required fields: wpm'),
+    (['not a dict'], 'must be an object'),
+    ([dict(SAMPLE, wps='fast')], 'numeric'),
+    ([dict(SAMPLE, wps=float('inf'))], 'Out-of-range values for: wps'),
+    ([dict(SAMPLE, ks_rate=-1, wpm=1e8)], 'Out-of-range values for: ks_rate, wpm'),
+])
+def test_parse_rejects_bad_payloads(samples, message):
+    with pytest.raises(FeatureValidationError, match=message):
+        FEATURE_SCHEMA.parse(samples)
+
+
+def test_to_dict_round_trips():
+    X = FEATURE_SCHEMA.parse(SAMPLE)
+    assert FEATURE_SCHEMA.to_dict(X[0]) == {k: float(v) for k, v in SAMPLE.items()}
@@ -0,0 +1,74 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.login_stats_service import decompose_range
+
+HOUR = timedelta(hours=1)
+
+
+def next_month(dt):
+    return datetime(dt.year + (dt.month == 12), dt.month % 12 + 1, 1)
+
+
+def covered_hours(ranges):
+    """Every hour the rollup ranges cover (duplicates kept, to catch overlaps)"""
+    hours = []
+    for granularity, first, last in ranges:
+        fmt, step = {
+            'hour': ('%Y-%m-%d %H', lambda dt: dt + HOUR),
+            'day': ('%Y-%m-%d', lambda dt: dt + timedelta(days=1)),
+            'month': ('%Y-%m', next_month),
+        }[granularity]
+        bucket, end = datetime.strptime(first, fmt), datetime.strptime(last, fmt)
+        assert bucket < end, (granularity, first, last)
+        while bucket < end:
+            nxt = step(bucket)
+            hour = bucket
+            while hour < nxt:
+                hours.append(hour)
+                hour += HOUR
+            bucket = nxt
+    return sorted(hours)
+
+
+def hours_between(start, end):
+    hours, hour = [], start
+    while hour < end:
+        hours.append(hour)
+        hour += HOUR
+    return hours
+
+
+@pytest.mark.parametrize('start, end, expected', [
+    (datetime(2024, 3, 5, 10), datetime(2024, 3, 5, 14), [('hour', '2024-03-05 10', '2024-03-05 14')]),
+    (datetime(2024, 3, 5), datetime(2024, 3, 8), [('day', '2024-03-05', '2024-03-08')]),
+    (datetime(2024, 1, 1), datetime(2024, 4, 1), [('month', '2024-01', '2024-04')]),
+    (datetime(2024, 3, 5, 10, 30), datetime(2024, 3, 5, 10, 45), []),
+    (datetime(2024, 3, 6), datetime(2024, 3, 5), []),
+])
+def test_aligned_ranges_use_one_granularity(start, end, expected):
+    assert decompose_range(start, end) == expected
+
+
+def test_mixed_range_is_bounded_by_the_calendar():
+    ranges = decompose_range(datetime(2023, 11, 28, 22), datetime(2024, 2, 3, 5))
+    assert sorted(ranges) == sorted([
+        ('hour', '2023-11-28 22', '2023-11-29 00'),
+        ('hour', '2024-02-03 00', '2024-02-03 05'),
+        ('day', '2023-11-29', '2023-12-01'),
+        ('day', '2024-02-01', '2024-02-03'),
+        ('month', '2023-12', '2024-02'),
+    ])
+
+
+def test_random_ranges_cover_every_hour_exactly_once():
+    rng = random.Random(7)
+    origin = datetime(2023, 1, 1)
+    for _ in range(300):
+        start = origin + timedelta(hours=rng.randrange(24 * 500))
+        end = start + timedelta(hours=rng.randrange(1, 24 * 120))
+        ranges = decompose_range(start, end)
+        assert covered_hours(ranges) == hours_between(start, end)
+        assert len(ranges) <= 5
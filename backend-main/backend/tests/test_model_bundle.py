@@ -0,0 +1,124 @@
+import os
+
+import numpy as np
+import pytest
+
+from utils.feature_schema import FEATURE_SCHEMA
+from utils.model_bundle import (
+    ModelBundle, ModelBundleError, affine_scaler, flatten_xgboost, write_bundle
+)
+
+N_FEATURES = len(FEATURE_SCHEMA.names)
+DWELL_MEAN = FEATURE_SCHEMA.names.index('dwell_mean')
+
+
+def stump_bundle(path, base_margin):
+    """Two classes, one stump each: alice if dwell_mean < 150, else bob"""
+    arrays = {
+        'tree_roots': np.array([0, 3], np.int32),
+        'tree_group': np.array([0, 1], np.int32),
+        'left': np.array([1, -1, -1, 4, -1, -1], np.int32),
+        'right': np.array([2, -1, -1, 5, -1, -1], np.int32),
+        'feature': np.array([DWELL_MEAN, 0, 0, DWELL_MEAN, 0, 0], np.int32),
+        'threshold': np.array([150, 5, -5, 150, -5, 5], np.float32),
+        'default_left': np.array([1, 0, 0, 0, 0, 0], np.uint8),
+    }
+    info = {'type': 'xgboost-gbtree', 'objective': 'multi:softprob', 'num_class': 2,
+            'num_feature': N_FEATURES, 'base_margin': base_margin, 'n_trees': 2, 'max_depth': 1}
+    write_bundle(path, 'test-1', FEATURE_SCHEMA.names, ['alice', 'bob'],
+                 np.ones(N_FEATURES), np.zeros(N_FEATURES), arrays, info)
+    return ModelBundle(path)
+
+
+def test_margins_walk_trees_and_add_per_class_intercepts(tmp_path):
+    bundle = stump_bundle(str(tmp_path / 'model.bundle'), [0.5, -20.0])
+    X = np.zeros((3, N_FEATURES))
+    X[:, DWELL_MEAN] = [100, 200, np.nan]
+
+    np.testing.assert_allclose(bundle.margins(bundle.transform(X)), [
+        [5.5, -25.0],
+        [-4.5, -15.0],
+        [5.5, -15.0],   # missing value: tree 0 defaults left, tree 1 right
+    ])
+    # The class 1 intercept outweighs its tree, so everything is alice
+    assert list(bundle.predict_labels(X)) == ['alice'] * 3
+
+
+def test_scalar_intercept_still_loads(tmp_path):
+    bundle = stump_bundle(str(tmp_path / 'model.bundle'), 0.5)
+    X = np.zeros((2, N_FEATURES))
+    X[:, DWELL_MEAN] = [100, 200]
+    assert list(bundle.predict_labels(X)) == ['alice', 'bob']
+
+
+def test_wrong_number_of_intercepts_is_refused(tmp_path):
+    with pytest.raises(ModelBundleError):
+        stump_bundle(str(tmp_path / 'model.bundle'), [0.5, 0.5, 0.5])
+
+
+# ---------------------------------------------------
+# AGAINST XGBOOST (needs the training dependencies)
+# ---------------------------------------------------
+def trained_pipeline(n_classes=3, seed=0):
+    xgboost = pytest.importorskip('xgboost')
+    preprocessing = pytest.importorskip('sklearn.preprocessing')
+
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, n_classes, size=600)
+    X = rng.normal(size=(600, N_FEATURES)) * 20 + 100
+    X[:, DWELL_MEAN] += labels * 15
+    scaler = preprocessing.StandardScaler().fit(X)
+    encoder = preprocessing.LabelEncoder().fit([f"user{i}" for i in range(n_classes)])
+
+    # Early stopping leaves trees after best_iteration in the booster
+    model = xgboost.XGBClassifier(n_estimators=200, max_depth=3, learning_rate=0.3,
+                                  early_stopping_rounds=5, eval_metric='mlogloss')
+    Xs = scaler.transform(X)
+    model.fit(Xs[:450], labels[:450], eval_set=[(Xs[450:], labels[450:])], verbose=False)
+    assert model.best_iteration + 1 < model.get_booster().num_boosted_rounds()
+    return model, scaler, encoder, X
+
+
+def test_bundle_matches_xgboost_after_early_stopping(tmp_path):
+    xgboost = pytest.importorskip('xgboost')
+    model, scaler, encoder, X = trained_pipeline()
+
+    tree_arrays, model_info = flatten_xgboost(model)
+    assert model_info['n_trees'] == (model.best_iteration + 1) * 3
+    scale_mul, scale_add = affine_scaler(scaler, N_FEATURES)
+    path = str(tmp_path / 'model.bundle')
+    write_bundle(path, 'test-1', FEATURE_SCHEMA.names, list(encoder.classes_),
+                 scale_mul, scale_add, tree_arrays, model_info)
+    bundle = ModelBundle(path)
+
+    expected = model.get_booster().predict(
+        xgboost.DMatrix(scaler.transform(X)), output_margin=True,
+        iteration_range=(0, model.best_iteration + 1)
+    )
+    np.testing.assert_allclose(bundle.margins(bundle.transform(X)), expected, atol=1e-4)
+    assert list(bundle.predict_labels(X)) == list(encoder.inverse_transform(model.predict(scaler.transform(X))))
+
+
+def test_build_refuses_a_bundle_that_disagrees_with_the_model(tmp_path, monkeypatch):
+    joblib = pytest.importorskip('joblib')
+    model, scaler, encoder, X = trained_pipeline()
+    from scripts import build_model_bundle
+
+    for name, obj in (('model', model), ('scaler', scaler), ('encoder', encoder),
+                      ('feature_cols', FEATURE_SCHEMA.names)):
+        joblib.dump(obj, tmp_path / build_model_bundle.PICKLES[name])
+    out = str(tmp_path / 'model.bundle')
+    build_model_bundle.build(str(tmp_path), out)
+    assert os.path.exists(out)
+
+    def skew_intercepts(model):
+        tree_arrays, model_info = flatten_xgboost(model)
+        model_info['base_margin'] = [0.0, 0.0, 25.0]
+        return tree_arrays, model_info
+
+    monkeypatch.setattr(build_model_bundle, 'flatten_xgboost', skew_intercepts)
+    broken = str(tmp_path / 'broken.bundle')
+    with pytest.raises(ModelBundleError):
+        build_model_bundle.build(str(tmp_path), broken)
+    assert not os.path.exists(broken)
+    assert not os.path.exists(broken + '.unverified')
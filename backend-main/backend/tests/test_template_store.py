@@ -0,0 +1,102 @@
+import numpy as np
+
+from services.template_store_service import (
+    QuantizedTemplateStore, CALIBRATE_AFTER_USERS, batch_similarity
+)
+from utils.feature_schema import FEATURE_SCHEMA
+
+# Typical template (same order as FEATURE_SCHEMA)
+BASE = np.array([40, 4.0, 110, 25, 150, 40, 130, 30, 0.02, 0.8, 48], dtype=np.float64)
+
+
+def make_templates(rng, n, drift=1.0):
+    """n templates around BASE, spread (and shifted) further as drift grows"""
+    return BASE * drift * np.exp(rng.normal(0.0, 0.25 * drift, size=(n, len(FEATURE_SCHEMA))))
+
+
+def recalibrate_from(store, sources):
+    """What TemplateService.recalibrate does, with the float64 sources in memory"""
+    ids = sorted(sources)
+    versions = [store.get(user_id)[1] for user_id in ids]
+    return store.recalibrate(ids, np.vstack([sources[user_id] for user_id in ids]), versions)
+
+
+def max_similarity_error(store, sources, probes):
+    ids = sorted(sources)
+    exact = np.vstack([sources[user_id] for user_id in ids])
+    return max(
+        float(np.max(np.abs(store.score(probe, ids) - batch_similarity(probe, exact))))
+        for probe in probes
+    )
+
+
+def test_put_flags_instead_of_recalibrating():
+    rng = np.random.default_rng(1)
+    store = QuantizedTemplateStore('int8')
+    templates = make_templates(rng, CALIBRATE_AFTER_USERS)
+    store.calibrate(templates)
+    store.put_many(np.arange(len(templates)), templates)
+    offset = store.offset.copy()
+
+    outlier = BASE.copy()
+    outlier[2] *= 50.0                   # one value far outside the calibrated range
+    store.put(10_000, outlier)
+
+    assert store.clipped == 1
+    assert np.array_equal(store.offset, offset)
+    assert not store.needs_recalibration  # one clipped value among many users is not enough
+
+    store.put_many(np.arange(10_001, 10_011), np.tile(BASE * 50.0, (10, 1)))
+    assert store.needs_recalibration
+    assert np.array_equal(store.offset, offset)  # still only flagged
+
+
+def test_incremental_inserts_keep_accuracy():
+    rng = np.random.default_rng(7)
+    store = QuantizedTemplateStore('int8')
+    sources = {}
+    next_id = 0
+    for step in range(40):
+        # The population drifts, so new values keep leaving the calibrated range
+        for vector in make_templates(rng, 50, drift=1.0 + step * 0.05):
+            store.put(next_id, vector)
+            sources[next_id] = vector
+            next_id += 1
+            if store.needs_recalibration:
+                recalibrate_from(store, sources)
+
+    assert store.calibrations >= 3
+    recalibrate_from(store, sources)
+    probes = make_templates(rng, 20, drift=2.0)
+    incremental = max_similarity_error(store, sources, probes)
+
+    bulk = QuantizedTemplateStore('int8')
+    ids = sorted(sources)
+    exact = np.vstack([sources[user_id] for user_id in ids])
+    bulk.calibrate(exact)
+    bulk.put_many(ids, exact)
+
+    # Requantizing from the sources does not compound error across recalibrations:
+    # after the last one the store is as accurate as a single bulk calibration
+    assert incremental <= max_similarity_error(bulk, sources, probes) + 1e-9
+
+
+def test_recalibrate_bumps_versions_and_keeps_newer_rows():
+    rng = np.random.default_rng(3)
+    store = QuantizedTemplateStore('int8')
+    templates = make_templates(rng, CALIBRATE_AFTER_USERS)
+    store.put_many(np.arange(len(templates)), templates)
+    assert store.needs_recalibration     # initial calibration is left to the owner
+
+    ids = list(range(len(templates)))
+    versions = [store.get(user_id)[1] for user_id in ids]
+    newer = BASE * 1.1
+    store.put(0, newer)                  # written after the sources were read
+
+    assert store.recalibrate(ids, templates, versions) == len(ids) - 1
+    assert not store.needs_recalibration
+    assert store.get(0)[1] == 3 and store.get(1)[1] == 2
+    # Row 0 kept its newer value instead of the stale source (quantized in log1p space)
+    step = float(store.scale.max())
+    assert np.allclose(np.log1p(store.get(0)[0]), np.log1p(newer), atol=0.05)
+    assert np.allclose(np.log1p(store.get(1)[0]), np.log1p(templates[1]), atol=step)
@@ -1,7 +1,7 @@
 """
 Utility functions for the application.
 """
-from utils.password_util import hash_password, verify_password
+from utils.password_util import hash_password, verify_password, needs_rehash
 from utils.validation_util import validate_email, validate_role, validate_name
 
-__all__ = ['hash_password', 'verify_password', 'validate_email', 'validate_role', 'validate_name']
+__all__ = ['hash_password', 'verify_password', 'needs_rehash', 'validate_email', 'validate_role', 'validate_name']
@@ -0,0 +1,462 @@
+"""
+Data-access layer shared by the services and repositories.
+
+One Database object per process owns a pool of DB-API connections and
+hands out PooledConnection wrappers. Closing a wrapper returns the
+connection to the pool instead of reconnecting on the next query.
+
+    db = get_db()
+    row = db.fetch_one('SELECT * FROM "user" WHERE name = ?', (name,))
+
+    with db.transaction() as conn:          # BEGIN ... COMMIT / ROLLBACK
+        conn.execute(...)
+        conn.execute(...)
+
+    db.execute_many(sql, rows)              # bulk insert, one transaction
+
+    future = db.write(lambda conn: conn.execute(...).rowcount)
+    future.result()                         # single-writer thread (SQLite)
+
+With SQLite every write submitted through db.write() runs on one writer
+thread per database, which drains its queue in short batched
+transactions (one SAVEPOINT per job, so a failing job does not undo its
+neighbours). Writers therefore never contend for the lock within a
+process, and reads use separate read-only connections
+(connect(readonly=True)) that WAL lets run alongside the writer.
+
+SQL is written once with '?' placeholders and sqlite3.Row-style rows
+(index and name access, dict(row)). Set DATABASE_URL to a postgresql://
+URL to run UserService and the repositories against PostgreSQL (requires
+psycopg); placeholders are translated and rows keep the same shape. Write
+"user" quoted - it is a reserved word in PostgreSQL.
+
+Not everything is portable: login_session partitioning and the login
+rollups (sqlite_master, INSTEAD OF triggers, AUTOINCREMENT) and the
+admission store are SQLite-only. app.py skips them when db.dialect is not
+'sqlite', and /api/stats/logins then answers 501.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from utils.metrics_util import metrics
+
+try:
+    import psycopg
+except ImportError:
+    psycopg = None
+
+DEFAULT_SQLITE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'biometric_app.db'
+)
+DATABASE_URL = os.getenv('DATABASE_URL', f'sqlite:///{DEFAULT_SQLITE_PATH}')
+DB_POOL_SIZE = int(os.getenv('TYPEID_DB_POOL_SIZE', '8'))
+# Seconds a connection waits on another process's lock before 'database is locked'
+SQLITE_BUSY_TIMEOUT = float(os.getenv('TYPEID_SQLITE_BUSY_TIMEOUT', '30'))
+
+# Single-writer queue: jobs committed per transaction, and how long callers wait
+DB_WRITE_BATCH = int(os.getenv('TYPEID_DB_WRITE_BATCH', '64'))
+DB_WRITE_TIMEOUT = float(os.getenv('TYPEID_DB_WRITE_TIMEOUT', '30'))
+
+
+def _translate_placeholders(sql):
+    """Rewrite '?' placeholders to '%s' (and escape '%') outside string literals."""
+    out = []
+    quote = None
+    for ch in sql:
+        if quote:
+            if ch == quote:
+                quote = None
+            out.append('%%' if ch == '%' else ch)
+        elif ch in ("'", '"'):
+            quote = ch
+            out.append(ch)
+        elif ch == '?':
+            out.append('%s')
+        elif ch == '%':
+            out.append('%%')
+        else:
+            out.append(ch)
+    return ''.join(out)
+
+
+class Row(tuple):
+    """Tuple row with sqlite3.Row-style access by column name."""
+
+    __slots__ = ()
+    _names = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._names.index(key))
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return list(self._names)
+
+
+def _row_factory(cursor):
+    names = tuple(c.name for c in cursor.description or ())
+    row_cls = type('Row', (Row,), {'__slots__': (), '_names': names})
+    return row_cls
+
+
+class PooledConnection:
+    """
+    Connection borrowed from a Database pool.
+
+    Behaves like an autocommit sqlite3 connection; close() returns it to
+    the pool (rolling back anything left open).
+    """
+
+    def __init__(self, database, raw, readonly=False):
+        self._database = database
+        self._raw = raw
+        self.readonly = readonly
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def execute(self, sql, params=()):
+        return self._raw.execute(self._database.prepare(sql), params)
+
+    def executemany(self, sql, seq_of_params):
+        if self._database.dialect == 'sqlite':
+            return self._raw.executemany(sql, seq_of_params)
+        cursor = self._raw.cursor()
+        cursor.executemany(self._database.prepare(sql), seq_of_params)
+        return cursor
+
+    @property
+    def in_transaction(self):
+        return self._database.in_transaction(self._raw)
+
+    def begin(self, immediate=False):
+        """Start an explicit transaction (IMMEDIATE takes the SQLite write lock up front)."""
+        if immediate and self._database.dialect == 'sqlite':
+            self._raw.execute("BEGIN IMMEDIATE")
+        else:
+            self._raw.execute("BEGIN")
+
+    def commit(self):
+        self._raw.execute("COMMIT")
+
+    def rollback(self):
+        if self.in_transaction:
+            self._raw.execute("ROLLBACK")
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """BEGIN on entry; COMMIT on success, ROLLBACK on error."""
+        self.begin(immediate)
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def close(self):
+        if self._raw is not None:
+            self._database.release(self._raw, self.readonly)
+            self._raw = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class SQLiteWriter:
+    """
+    The one thread that writes to a SQLite database.
+
+    Jobs are callables taking the writer's connection. Each drain of the
+    queue (up to DB_WRITE_BATCH jobs) runs in one BEGIN IMMEDIATE ...
+    COMMIT, and each job's Future is resolved only after that commit.
+    """
+
+    _STOP = object()
+
+    def __init__(self, database, batch_size=DB_WRITE_BATCH):
+        self.database = database
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        # Opened here so a bad path fails the caller instead of the thread
+        self._conn = database._open()
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, fn):
+        future = Future()
+        if threading.current_thread() is self._thread:
+            # A job writing from inside another job: already in the transaction
+            future.set_result(fn(self._conn))
+            return future
+        self._queue.put((fn, future, time.perf_counter()))
+        return future
+
+    def stop(self):
+        self._queue.put(self._STOP)
+        self._thread.join(timeout=DB_WRITE_TIMEOUT)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is self._STOP:
+                break
+            batch = [job]
+            while len(batch) < self.batch_size:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is self._STOP:
+                    self._queue.put(job)
+                    break
+                batch.append(job)
+            self._commit_batch(batch)
+        self._conn.close()
+
+    def _commit_batch(self, batch):
+        conn = self._conn
+        started = time.perf_counter()
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Time spent waiting for other processes' write locks
+            metrics.observe('db.write.lock_wait', (time.perf_counter() - started) * 1000.0)
+            for fn, future, queued in batch:
+                metrics.observe('db.write.queue_wait', (started - queued) * 1000.0)
+                conn.execute("SAVEPOINT job")
+                try:
+                    outcomes.append((future, fn(conn), None))
+                    conn.execute("RELEASE job")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    outcomes.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            # Nothing in this batch was committed
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"❌ Write batch of {len(batch)} failed: {e}")
+            metrics.incr('db.write.failed_batches')
+            outcomes = [(future, None, e) for _, future, _ in batch]
+
+        metrics.observe('db.write.batch', (time.perf_counter() - started) * 1000.0)
+        metrics.incr('db.write.batches')
+        metrics.incr('db.write.jobs', len(batch))
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+class Database:
+    """Pooled connections to SQLite or PostgreSQL."""
+
+    def __init__(self, url=DATABASE_URL, pool_size=DB_POOL_SIZE):
+        self.url = url
+        self.pool_size = pool_size
+        if url.startswith('sqlite:///'):
+            self.dialect = 'sqlite'
+            self.path = url[len('sqlite:///'):]
+        elif url.startswith(('postgresql://', 'postgres://')):
+            if psycopg is None:
+                raise RuntimeError('DATABASE_URL points to PostgreSQL but psycopg is not installed')
+            self.dialect = 'postgresql'
+            self.path = None
+        else:
+            raise ValueError(f'Unsupported DATABASE_URL: {url}')
+
+        self._idle = deque()
+        self._idle_readonly = deque()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._writer = None
+        self.created = 0
+
+    # ---------------------------------------------------
+    # POOL
+    # ---------------------------------------------------
+    def _open(self, readonly=False):
+        if self.dialect == 'sqlite' and readonly:
+            uri = f'file:{os.path.abspath(self.path)}?mode=ro'
+            raw = sqlite3.connect(uri, uri=True, timeout=SQLITE_BUSY_TIMEOUT,
+                                  isolation_level=None, check_same_thread=False)
+            raw.row_factory = sqlite3.Row
+        elif self.dialect == 'sqlite':
+            raw = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT,
+                                  isolation_level=None, check_same_thread=False)
+            raw.row_factory = sqlite3.Row
+            raw.execute("PRAGMA journal_mode=WAL")
+            raw.execute("PRAGMA synchronous=NORMAL")
+        else:
+            raw = psycopg.connect(self.url, autocommit=True, row_factory=_row_factory)
+        self.created += 1
+        return raw
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            # Forked worker: never share the parent's sockets/file handles,
+            # and the parent's writer thread does not exist here
+            self._idle.clear()
+            self._idle_readonly.clear()
+            self._writer = None
+            self._pid = os.getpid()
+
+    def connect(self, readonly=False):
+        """
+        Borrow a connection; close() it to give it back.
+
+        readonly=True gives a SQLite read-only connection for the read path
+        (on PostgreSQL it is an ordinary pooled connection).
+        """
+        readonly = readonly and self.dialect == 'sqlite'
+        with self._lock:
+            self._check_pid()
+            idle = self._idle_readonly if readonly else self._idle
+            raw = idle.pop() if idle else None
+        if raw is None:
+            raw = self._open(readonly)
+        return PooledConnection(self, raw, readonly)
+
+    def in_transaction(self, raw):
+        if self.dialect == 'sqlite':
+            return raw.in_transaction
+        return raw.info.transaction_status != psycopg.pq.TransactionStatus.IDLE
+
+    def release(self, raw, readonly=False):
+        try:
+            if self.in_transaction(raw):
+                raw.execute("ROLLBACK")
+        except Exception:
+            raw.close()
+            return
+
+        with self._lock:
+            idle = self._idle_readonly if readonly else self._idle
+            if self._pid == os.getpid() and len(idle) < self.pool_size:
+                idle.append(raw)
+                return
+        # Pool full: overflow connections are closed rather than kept
+        raw.close()
+
+    def close_all(self):
+        with self._lock:
+            writer, self._writer = self._writer, None
+            idle = list(self._idle) + list(self._idle_readonly)
+            self._idle, self._idle_readonly = deque(), deque()
+        if writer is not None:
+            writer.stop()
+        for raw in idle:
+            raw.close()
+
+    def stats(self):
+        return {'dialect': self.dialect, 'pool_size': self.pool_size,
+                'idle': len(self._idle), 'idle_readonly': len(self._idle_readonly),
+                'created': self.created, 'writer_queue': self._writer._queue.qsize() if self._writer else 0}
+
+    # ---------------------------------------------------
+    # WRITES
+    # ---------------------------------------------------
+    def write(self, fn):
+        """
+        Run fn(conn) as a write and return a Future with its result.
+
+        SQLite: queued to the single writer thread and committed in a
+        batch. PostgreSQL: run now in its own transaction (the server
+        handles concurrent writers).
+        """
+        if self.dialect != 'sqlite':
+            future = Future()
+            try:
+                with self.transaction() as conn:
+                    future.set_result(fn(conn))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        with self._lock:
+            self._check_pid()
+            if self._writer is None:
+                self._writer = SQLiteWriter(self)
+            writer = self._writer
+        return writer.submit(fn)
+
+    def write_sync(self, fn, timeout=DB_WRITE_TIMEOUT):
+        """write() and wait for the commit; re-raises the job's exception."""
+        return self.write(fn).result(timeout)
+
+    # ---------------------------------------------------
+    # QUERIES
+    # ---------------------------------------------------
+    def prepare(self, sql):
+        return sql if self.dialect == 'sqlite' else _translate_placeholders(sql)
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Borrow a connection for one explicit transaction."""
+        conn = self.connect()
+        try:
+            with conn.transaction(immediate):
+                yield conn
+        finally:
+            conn.close()
+
+    def execute(self, sql, params=()):
+        """Run one write statement through the writer; returns the affected row count."""
+        return self.write_sync(lambda conn: conn.execute(sql, params).rowcount)
+
+    def fetch_one(self, sql, params=()):
+        with self.connect(readonly=True) as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def fetch_all(self, sql, params=()):
+        with self.connect(readonly=True) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def execute_many(self, sql, seq_of_params):
+        """Bulk statement over many parameter rows, committed together by the writer."""
+        seq_of_params = list(seq_of_params)
+        if not seq_of_params:
+            return 0
+        self.write_sync(lambda conn: conn.executemany(sql, seq_of_params))
+        return len(seq_of_params)
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_db():
+    """Process-wide Database built from DATABASE_URL."""
+    global _database
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                _database = Database()
+    return _database
+
+
+def configure_db(url=DATABASE_URL, pool_size=DB_POOL_SIZE):
+    """Replace the process-wide Database (scripts, tests, alternate URLs)."""
+    global _database
+    with _database_lock:
+        old, _database = _database, Database(url, pool_size)
+    if old is not None:
+        old.close_all()
+    return _database
@@ -0,0 +1,161 @@
+"""
+Server-side keystroke feature extraction from raw key events.
+
+Python/NumPy port of calculateFeatures() in the React typing components
+(Signup/TypingProfile.jsx, Signin/TypingLogin.jsx), which produce the 11
+features stored at enrollment and sent at login. Every step is a vectorized
+array operation, so a session with thousands of events costs O(n) with no
+per-event Python loop.
+
+Input is columnar, as the browser's keystrokeEvents buffer split by type:
+
+    {
+        "down_times": [t0, t1, ...],     # keydown timestamps (ms), in order
+        "up_times":   [t0, t1, ...],     # keyup timestamps (ms), in order
+        "down_keys":  ["T", "h", ...],   # optional, for backspace counting
+        "up_keys":    ["T", "h", ...],   # optional, for backspace counting
+        "text": "The quick brown fox"
+    }
+"""
+import numpy as np
+
+MIN_KEY_DOWNS = 10
+
+# Outlier cut-offs (ms) - same as the frontend
+MAX_DWELL_MS = 2000
+MAX_FLIGHT_MS = 3000
+MAX_DIGRAPH_MS = 4000
+
+# Fallbacks the frontend substitutes for empty/zero values
+DEFAULT_DWELL_MEAN = 120
+DEFAULT_FLIGHT_MEAN = 150
+DEFAULT_DIGRAPH_MEAN = 135
+DEFAULT_STD = 25
+DEFAULT_BACKSPACE_RATE = 0.02
+DEFAULT_WPS = 15
+DEFAULT_WPM = 90
+
+# Percentiles reported by extract_extended_features
+EXTENDED_PERCENTILES = (10, 50, 90)
+
+
+def _mean(values):
+    """calcMean: 0 for an empty array."""
+    return float(values.mean()) if values.size else 0.0
+
+
+def _std(values):
+    """calcStd: population std, 25 when fewer than 2 values."""
+    return float(values.std()) if values.size >= 2 else float(DEFAULT_STD)
+
+
+def _window(values, low, high):
+    """Keep values strictly inside (low, high)."""
+    return values[(values > low) & (values < high)]
+
+
+def compute_intervals(down_times, up_times):
+    """
+    Compute filtered dwell, flight and digraph intervals.
+
+    Args:
+        down_times: keydown timestamps (ms)
+        up_times: keyup timestamps (ms)
+
+    Returns:
+        (dwells, flights, digraphs) as float64 arrays
+    """
+    down = np.asarray(down_times, dtype=np.float64)
+    up = np.asarray(up_times, dtype=np.float64)
+
+    # dwell[i] = up[i] - down[i]
+    n_dwell = min(down.size, up.size)
+    dwells = _window(up[:n_dwell] - down[:n_dwell], 0, MAX_DWELL_MS)
+
+    # flight[i] = down[i+1] - up[i]  (missing up[i] is dropped, like NaN in JS)
+    n_flight = min(down.size - 1, up.size)
+    flights = _window(down[1:n_flight + 1] - up[:n_flight], 0, MAX_FLIGHT_MS) if n_flight > 0 else down[:0]
+
+    # digraph[i] = down[i+1] - down[i]
+    digraphs = _window(np.diff(down), 0, MAX_DIGRAPH_MS)
+
+    return dwells, flights, digraphs
+
+
+def count_backspaces(down_keys=None, up_keys=None):
+    """Count Backspace events across keydown and keyup arrays."""
+    count = 0
+    for keys in (down_keys, up_keys):
+        if keys is not None and len(keys):
+            count += int(np.count_nonzero(np.asarray(keys) == 'Backspace'))
+    return count
+
+
+def extract_features(down_times, up_times, text='', down_keys=None, up_keys=None):
+    """
+    Compute the 11 model features from raw key events.
+
+    Args:
+        down_times: keydown timestamps (ms), in event order
+        up_times: keyup timestamps (ms), in event order
+        text: typed text
+        down_keys: optional key names for the keydown events
+        up_keys: optional key names for the keyup events
+
+    Returns:
+        dict with ks_count, ks_rate, dwell_mean, dwell_std, flight_mean,
+        flight_std, digraph_mean, digraph_std, backspace_rate, wps, wpm;
+        None if there are fewer than 10 keydowns (the frontend rejects those too)
+    """
+    down = np.asarray(down_times, dtype=np.float64)
+    up = np.asarray(up_times, dtype=np.float64)
+
+    if down.size < MIN_KEY_DOWNS:
+        return None
+
+    dwells, flights, digraphs = compute_intervals(down, up)
+
+    total_time_sec = float(down[-1] - down[0]) / 1000
+    total_time_min = total_time_sec / 60
+
+    ks_count = int(down.size)
+    total_events = down.size + up.size
+    backspace_rate = count_backspaces(down_keys, up_keys) / max(total_events, 1)
+
+    text = text or ''
+    wps = len(text.split(' ')) / max(total_time_sec, 1)
+    wpm = (len(text) / 5) / max(total_time_min, 1)
+
+    return {
+        'ks_count': ks_count,
+        'ks_rate': ks_count / max(total_time_sec, 1),
+        'dwell_mean': _mean(dwells) or DEFAULT_DWELL_MEAN,
+        'dwell_std': _std(dwells),
+        'flight_mean': _mean(flights) or DEFAULT_FLIGHT_MEAN,
+        'flight_std': _std(flights),
+        'digraph_mean': _mean(digraphs) or DEFAULT_DIGRAPH_MEAN,
+        'digraph_std': _std(digraphs),
+        'backspace_rate': backspace_rate or DEFAULT_BACKSPACE_RATE,
+        'wps': wps or DEFAULT_WPS,
+        'wpm': wpm or DEFAULT_WPM
+    }
+
+
+def extract_extended_features(down_times, up_times):
+    """
+    Richer interval statistics the 11-feature vector cannot carry.
+
+    Returns:
+        dict of count/min/max/percentiles for dwell, flight and digraph
+    """
+    dwells, flights, digraphs = compute_intervals(down_times, up_times)
+    extended = {}
+    for name, values in (('dwell', dwells), ('flight', flights), ('digraph', digraphs)):
+        stats = {'count': int(values.size)}
+        if values.size:
+            stats['min'] = float(values.min())
+            stats['max'] = float(values.max())
+            for p, v in zip(EXTENDED_PERCENTILES, np.percentile(values, EXTENDED_PERCENTILES)):
+                stats[f'p{p}'] = float(v)
+        extended[name] = stats
+    return extended
@@ -0,0 +1,124 @@
+"""
+Keystroke feature schema.
+
+Single definition of the 11-feature order used by request validation, the
+statistical layer and the ML layer. A login payload is parsed once into a
+contiguous (n_samples, 11) float64 array; None/NaN handling and range
+checks run on the whole array at once, and that same array feeds both
+authentication layers.
+"""
+from operator import itemgetter
+
+import numpy as np
+
+# EXACT order used during model training (train_model.py / feature_cols)
+FEATURE_NAMES = (
+    "ks_count", "ks_rate",
+    "dwell_mean", "dwell_std",
+    "flight_mean", "flight_std",
+    "digraph_mean", "digraph_std",
+    "backspace_rate", "wps", "wpm"
+)
+
+
+class FeatureValidationError(ValueError):
+    """Raised when a keystroke feature payload fails schema validation."""
+
+
+class FeatureSchema:
+    """
+    Compiled feature schema.
+
+    Args:
+        names: feature names in model order
+        min_value: inclusive lower bound applied to every feature
+        max_value: inclusive upper bound applied to every feature
+    """
+
+    def __init__(self, names=FEATURE_NAMES, min_value=0.0, max_value=1e7):
+        self.names = tuple(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.min_value = min_value
+        self.max_value = max_value
+        self._getter = itemgetter(*self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def missing_fields(self, sample):
+        """Names absent from a sample dict, in schema order."""
+        return [name for name in self.names if name not in sample]
+
+    def to_array(self, samples, default=0.0):
+        """
+        Convert feature dicts to an (n, 11) float64 array, filling absent
+        or None/NaN values with default. No validation.
+
+        Args:
+            samples: a feature dict, a list of dicts, or an existing array
+        """
+        if isinstance(samples, np.ndarray):
+            return np.atleast_2d(samples).astype(np.float64, copy=False)
+        if isinstance(samples, dict):
+            samples = [samples]
+
+        names = self.names
+        X = np.array(
+            [[sample.get(name) for name in names] for sample in samples],
+            dtype=np.float64
+        ).reshape(len(samples), len(names))
+        X[np.isnan(X)] = default
+        return X
+
+    def parse(self, samples):
+        """
+        Validate a login payload and convert it once.
+
+        Args:
+            samples: a feature dict or a list of feature dicts
+
+        Returns:
+            (n, 11) float64 array in schema order; None values become 0.0
+
+        Raises:
+            FeatureValidationError: missing fields, non-numeric, non-finite
+            or out-of-range values
+        """
+        if isinstance(samples, dict):
+            samples = [samples]
+        if not samples:
+            raise FeatureValidationError('Keystroke data is required')
+
+        try:
+            rows = [self._getter(sample) for sample in samples]
+        except KeyError:
+            for sample in samples:
+                missing = self.missing_fields(sample)
+                if missing:
+                    raise FeatureValidationError(f'Missing required fields: {", ".join(missing)}')
+            raise
+        except (TypeError, AttributeError):
+            raise FeatureValidationError('Each keystroke sample must be an object')
+
+        try:
+            X = np.array(rows, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise FeatureValidationError('Keystroke features must be numeric')
+
+        # None arrives as NaN - treat as 0.0 like the old per-key loop did
+        X[np.isnan(X)] = 0.0
+
+        bad = ~np.isfinite(X) | (X < self.min_value) | (X > self.max_value)
+        if bad.any():
+            names = sorted({self.names[j] for j in np.nonzero(bad)[1]}, key=self.index.get)
+            raise FeatureValidationError(f'Out-of-range values for: {", ".join(names)}')
+
+        return X
+
+    def to_dict(self, vector):
+        """Map a single feature vector back to a dict."""
+        return dict(zip(self.names, (float(v) for v in vector)))
+
+
+# Shared instance used across the backend
+FEATURE_SCHEMA = FeatureSchema()
@@ -0,0 +1,95 @@
+"""
+In-process metrics registry (counters and latency summaries).
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency histogram bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LatencyStat:
+    """Running count/sum/max plus a fixed-bucket histogram."""
+
+    __slots__ = ('count', 'total_ms', 'max_ms', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def observe(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'buckets': {
+                **{f'le_{bound}': n for bound, n in zip(LATENCY_BUCKETS_MS, self.buckets)},
+                'le_inf': self.buckets[-1]
+            }
+        }
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry of named counters and latency stats.
+
+    Names are dotted, e.g. 'password.hash' or 'password.rehash'.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._latencies = {}
+
+    def incr(self, name, amount=1):
+        """Increment a counter."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name, ms):
+        """Record one latency observation in milliseconds."""
+        with self._lock:
+            stat = self._latencies.get(name)
+            if stat is None:
+                stat = self._latencies[name] = LatencyStat()
+            stat.observe(ms)
+
+    @contextmanager
+    def timer(self, name):
+        """Context manager that records the elapsed time of its block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000.0)
+
+    def snapshot(self):
+        """Return a JSON-serializable copy of all metrics."""
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'latency': {name: stat.to_dict() for name, stat in self._latencies.items()}
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._latencies.clear()
+
+
+# Process-wide registry
+metrics = MetricsRegistry()
@@ -0,0 +1,351 @@
+"""
+Memory-mappable model artifact bundle.
+
+One file replaces the four joblib pickles (model, scaler, encoder, feature
+columns):
+
+    b'TIDMODEL' | format u32 | manifest length u32 | manifest JSON | arrays
+
+The manifest records the bundle version, feature order, class labels
+(encoder classes in encoded order) and, for every array, its dtype, shape,
+offset and sha256. The arrays are the affine form of the scaler and the
+XGBoost trees flattened into node arrays, so loading is an mmap plus
+np.frombuffer views (no unpickling, pages shared by every process) and
+prediction is a vectorized walk over all trees at once.
+
+`pair_digest` binds the scaler, encoder labels, feature order and trees
+together: a bundle whose parts were built from different training runs,
+or edited afterwards, is refused at load time.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+BUNDLE_MAGIC = b'TIDMODEL'
+BUNDLE_FORMAT = 1
+_PREAMBLE = struct.Struct('<8sII')
+ALIGNMENT = 64
+
+SCALER_ARRAYS = ('scale_mul', 'scale_add')
+TREE_ARRAYS = ('tree_roots', 'tree_group', 'left', 'right', 'feature', 'threshold', 'default_left')
+
+
+class ModelBundleError(ValueError):
+    """Raised when a bundle is corrupt, inconsistent or its parts do not belong together."""
+
+
+def _align(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _sha256(buffer):
+    return hashlib.sha256(buffer).hexdigest()
+
+
+def pair_digest(feature_order, labels, checksums):
+    """Digest over everything that must come from the same training run"""
+    h = hashlib.sha256()
+    h.update(json.dumps([list(feature_order), [str(label) for label in labels]]).encode())
+    for name in SCALER_ARRAYS + TREE_ARRAYS:
+        h.update(name.encode())
+        h.update(checksums[name].encode())
+    return h.hexdigest()
+
+
+# ---------------------------------------------------
+# CONVERSION (offline: needs joblib / xgboost / sklearn)
+# ---------------------------------------------------
+def affine_scaler(scaler, n_features):
+    """
+    sklearn scaler -> (mul, add) with transform(X) == X * mul + add
+
+    Supports StandardScaler, MinMaxScaler, MaxAbsScaler and RobustScaler.
+    """
+    name = type(scaler).__name__
+    if name == 'StandardScaler':
+        mean = scaler.mean_ if getattr(scaler, 'with_mean', True) and scaler.mean_ is not None else np.zeros(n_features)
+        scale = scaler.scale_ if getattr(scaler, 'with_std', True) and scaler.scale_ is not None else np.ones(n_features)
+        mul = 1.0 / np.asarray(scale, dtype=np.float64)
+        add = -np.asarray(mean, dtype=np.float64) * mul
+    elif name == 'MinMaxScaler':
+        mul, add = np.asarray(scaler.scale_, np.float64), np.asarray(scaler.min_, np.float64)
+    elif name == 'MaxAbsScaler':
+        mul, add = 1.0 / np.asarray(scaler.scale_, np.float64), np.zeros(n_features)
+    elif name == 'RobustScaler':
+        center = scaler.center_ if scaler.center_ is not None else np.zeros(n_features)
+        scale = scaler.scale_ if scaler.scale_ is not None else np.ones(n_features)
+        mul = 1.0 / np.asarray(scale, dtype=np.float64)
+        add = -np.asarray(center, dtype=np.float64) * mul
+    else:
+        raise ModelBundleError(f"Unsupported scaler type {name}")
+    if len(mul) != n_features:
+        raise ModelBundleError(f"Scaler was fitted on {len(mul)} features, feature order has {n_features}")
+    return mul, add
+
+
+# Objectives whose base_score is a probability (XGBoost turns it into a logit margin)
+LOGISTIC_OBJECTIVES = ('binary:logistic', 'reg:logistic')
+
+
+def flatten_xgboost(model):
+    """
+    XGBoost gbtree model -> flat node arrays (global node indices, -1 = leaf)
+
+    For leaves, `threshold` holds the leaf value (as in XGBoost's own
+    node layout). Like XGBoost's predict, only the trees up to
+    best_iteration are kept when the model was trained with early
+    stopping, and base_score may hold one intercept per class.
+    """
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.json')
+        booster.save_model(path)
+        with open(path) as f:
+            learner = json.load(f)['learner']
+
+    gbm = learner['gradient_booster']
+    if gbm.get('name') != 'gbtree':
+        raise ModelBundleError(f"Unsupported booster '{gbm.get('name')}' (only gbtree)")
+    params = learner['learner_model_param']
+    objective = learner.get('objective', {}).get('name', '')
+    num_class = int(params.get('num_class', 0))
+    n_groups = max(num_class, 1)
+
+    base_score = np.asarray(
+        [float(v) for v in str(params.get('base_score', 0.5)).strip('[]').split(',') if v.strip()],
+        dtype=np.float64
+    )
+    if len(base_score) not in (1, n_groups):
+        raise ModelBundleError(f"base_score has {len(base_score)} values for {n_groups} output groups")
+    if objective in LOGISTIC_OBJECTIVES:
+        base_score = np.log(base_score / (1 - base_score))
+    base_margin = np.broadcast_to(base_score, (n_groups,)).tolist()
+
+    trees = gbm['model']['trees']
+    groups = gbm['model']['tree_info']
+    best_iteration = learner.get('attributes', {}).get('best_iteration')
+    if best_iteration is not None:
+        tree_param = gbm['model'].get('gbtree_model_param', {})
+        per_iteration = n_groups * int(tree_param.get('num_parallel_tree', 1))
+        keep = (int(best_iteration) + 1) * per_iteration
+        trees, groups = trees[:keep], groups[:keep]
+    roots, left, right, feature, threshold, default_left = [], [], [], [], [], []
+    max_depth, offset = 0, 0
+    for tree in trees:
+        if tree.get('categories'):
+            raise ModelBundleError('Categorical splits are not supported')
+        l = np.asarray(tree['left_children'], dtype=np.int64)
+        r = np.asarray(tree['right_children'], dtype=np.int64)
+        roots.append(offset)
+        left.append(np.where(l >= 0, l + offset, -1))
+        right.append(np.where(r >= 0, r + offset, -1))
+        feature.append(np.asarray(tree['split_indices'], dtype=np.int64))
+        threshold.append(np.asarray(tree['split_conditions'], dtype=np.float32))
+        default_left.append(np.asarray(tree['default_left'], dtype=np.uint8))
+
+        stack = [(0, 0)]
+        while stack:
+            node, depth = stack.pop()
+            max_depth = max(max_depth, depth)
+            if l[node] >= 0:
+                stack.extend(((l[node], depth + 1), (r[node], depth + 1)))
+        offset += len(l)
+
+    arrays = {
+        'tree_roots': np.asarray(roots, dtype=np.int32),
+        'tree_group': np.asarray(groups, dtype=np.int32),
+        'left': np.concatenate(left).astype(np.int32),
+        'right': np.concatenate(right).astype(np.int32),
+        'feature': np.concatenate(feature).astype(np.int32),
+        'threshold': np.concatenate(threshold),
+        'default_left': np.concatenate(default_left),
+    }
+    model_info = {
+        'type': 'xgboost-gbtree',
+        'objective': objective,
+        'num_class': num_class,
+        'num_feature': int(params.get('num_feature', 0)),
+        'base_margin': base_margin,
+        'best_iteration': None if best_iteration is None else int(best_iteration),
+        'n_trees': len(trees),
+        'max_depth': max_depth,
+    }
+    return arrays, model_info
+
+
+def write_bundle(path, version, feature_order, labels, scale_mul, scale_add, tree_arrays, model_info, sources=None):
+    """
+    Validate and write a bundle (temp file + rename)
+
+    Raises:
+        ModelBundleError: the parts do not fit together
+    """
+    feature_order = [str(f) for f in feature_order]
+    labels = [label.item() if hasattr(label, 'item') else label for label in labels]
+    arrays = dict(tree_arrays, scale_mul=np.asarray(scale_mul, np.float64), scale_add=np.asarray(scale_add, np.float64))
+    _check_consistency(feature_order, labels, arrays, model_info)
+
+    layout, position = {}, 0
+    for name in SCALER_ARRAYS + TREE_ARRAYS:
+        data = np.ascontiguousarray(arrays[name])
+        layout[name] = {
+            'dtype': data.dtype.str,
+            'shape': list(data.shape),
+            'offset': position,
+            'nbytes': data.nbytes,
+            'sha256': _sha256(data.tobytes()),
+        }
+        position = _align(position + data.nbytes)
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'version': str(version),
+        'created_at': datetime.now().isoformat(),
+        'feature_order': feature_order,
+        'labels': labels,
+        'model': model_info,
+        'arrays': layout,
+        'sources': sources or {},
+        'pair_digest': pair_digest(feature_order, labels, {n: a['sha256'] for n, a in layout.items()}),
+    }
+    manifest_bytes = json.dumps(manifest, indent=1).encode()
+    data_start = _align(_PREAMBLE.size + len(manifest_bytes))
+
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        f.write(_PREAMBLE.pack(BUNDLE_MAGIC, BUNDLE_FORMAT, len(manifest_bytes)))
+        f.write(manifest_bytes)
+        for name in SCALER_ARRAYS + TREE_ARRAYS:
+            f.write(b'\0' * (data_start + layout[name]['offset'] - f.tell()))
+            f.write(np.ascontiguousarray(arrays[name]).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return manifest
+
+
+def _check_consistency(feature_order, labels, arrays, model_info):
+    n_features = len(feature_order)
+    n_classes = model_info['num_class'] if model_info['num_class'] > 1 else 2
+    if len(labels) != n_classes:
+        raise ModelBundleError(
+            f"Encoder has {len(labels)} classes but the model predicts {n_classes}: "
+            "scaler/encoder/model are from different training runs"
+        )
+    if len(arrays['scale_mul']) != n_features or len(arrays['scale_add']) != n_features:
+        raise ModelBundleError(f"Scaler covers {len(arrays['scale_mul'])} features, feature order has {n_features}")
+    if model_info.get('num_feature') and model_info['num_feature'] != n_features:
+        raise ModelBundleError(f"Model was trained on {model_info['num_feature']} features, feature order has {n_features}")
+    internal = arrays['left'] >= 0
+    if internal.any() and int(arrays['feature'][internal].max()) >= n_features:
+        raise ModelBundleError('Model splits on a feature index outside the feature order')
+    if len(arrays['tree_group']) != len(arrays['tree_roots']):
+        raise ModelBundleError('tree_group and tree_roots lengths differ')
+    if len(arrays['tree_group']) and int(arrays['tree_group'].max()) >= max(model_info['num_class'], 1):
+        raise ModelBundleError('A tree belongs to a class the model does not have')
+    if np.size(model_info['base_margin']) not in (1, max(model_info['num_class'], 1)):
+        raise ModelBundleError('base_margin must be one value or one per class')
+
+
+# ---------------------------------------------------
+# LOADING / PREDICTION
+# ---------------------------------------------------
+class ModelBundle:
+    """Read-only, memory-mapped model bundle"""
+
+    def __init__(self, path, verify=True):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, fmt, manifest_len = _PREAMBLE.unpack_from(self._mmap, 0)
+        except struct.error:
+            raise ModelBundleError(f"{path} is too short to be a model bundle") from None
+        if magic != BUNDLE_MAGIC:
+            raise ModelBundleError(f"{path} is not a model bundle")
+        if fmt != BUNDLE_FORMAT:
+            raise ModelBundleError(f"Unsupported bundle format {fmt} (expected {BUNDLE_FORMAT})")
+        try:
+            self.manifest = json.loads(self._mmap[_PREAMBLE.size:_PREAMBLE.size + manifest_len])
+        except ValueError as e:
+            raise ModelBundleError(f"Corrupt bundle manifest: {e}") from None
+
+        self.path = path
+        self.version = self.manifest['version']
+        self.feature_order = tuple(self.manifest['feature_order'])
+        self.labels = np.asarray(self.manifest['labels'], dtype=object)
+        self.model_info = self.manifest['model']
+
+        data_start = _align(_PREAMBLE.size + manifest_len)
+        self.arrays = {}
+        for name in SCALER_ARRAYS + TREE_ARRAYS:
+            spec = self.manifest['arrays'].get(name)
+            if spec is None:
+                raise ModelBundleError(f"Bundle is missing array '{name}'")
+            start = data_start + spec['offset']
+            if start + spec['nbytes'] > len(self._mmap):
+                raise ModelBundleError(f"Bundle is truncated (array '{name}')")
+            view = np.frombuffer(self._mmap, dtype=np.dtype(spec['dtype']),
+                                 count=int(np.prod(spec['shape'])), offset=start).reshape(spec['shape'])
+            if verify and _sha256(view) != spec['sha256']:
+                raise ModelBundleError(f"Checksum mismatch for '{name}': bundle is corrupt")
+            self.arrays[name] = view
+
+        digest = pair_digest(self.feature_order, self.manifest['labels'],
+                             {n: s['sha256'] for n, s in self.manifest['arrays'].items()})
+        if digest != self.manifest.get('pair_digest'):
+            raise ModelBundleError('Scaler, encoder and model in this bundle do not belong together (pair digest mismatch)')
+        _check_consistency(self.feature_order, self.manifest['labels'], self.arrays, self.model_info)
+
+        a = self.arrays
+        self._mul, self._add = a['scale_mul'], a['scale_add']
+        self._left, self._right = a['left'], a['right']
+        self._feature, self._threshold = a['feature'], a['threshold']
+        self._default_left = a['default_left'].astype(bool)
+        n_groups = max(self.model_info['num_class'], 1)
+        self._group_matrix = np.zeros((len(a['tree_group']), n_groups))
+        self._group_matrix[np.arange(len(a['tree_group'])), a['tree_group']] = 1.0
+        # A scalar (older bundles) or one intercept per class
+        self._base_margin = np.asarray(self.model_info['base_margin'], dtype=np.float64)
+
+    def transform(self, X):
+        """Scaler transform: X * mul + add"""
+        return np.asarray(X, dtype=np.float64) * self._mul + self._add
+
+    def margins(self, X_scaled):
+        """(n, n_groups) raw model scores for already-scaled rows"""
+        # XGBoost compares float32 features against float32 thresholds
+        X = np.asarray(X_scaled, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.arrays['tree_roots'], (len(X), len(self.arrays['tree_roots']))).copy()
+        for _ in range(self.model_info['max_depth']):
+            left = self._left[node]
+            internal = left >= 0
+            if not internal.any():
+                break
+            x = X[rows, np.where(internal, self._feature[node], 0)]
+            go_left = np.where(np.isnan(x), self._default_left[node], x < self._threshold[node])
+            node = np.where(internal, np.where(go_left, left, self._right[node]), node)
+        return self._threshold[node].astype(np.float64) @ self._group_matrix + self._base_margin
+
+    def predict_classes(self, X):
+        """Encoded class per row (argmax of the margins; sign for binary models)"""
+        margins = self.margins(self.transform(X))
+        if margins.shape[1] == 1:
+            return (margins[:, 0] > 0).astype(np.int64)
+        return margins.argmax(axis=1)
+
+    def predict_labels(self, X):
+        """Decoded labels per row (the encoder's inverse_transform)"""
+        return self.labels[self.predict_classes(X)]
+
+    def touch(self):
+        """Fault every page in (warm-up); returns pages touched"""
+        pages = np.frombuffer(self._mmap, dtype=np.uint8)[::mmap.PAGESIZE]
+        pages.sum()
+        return len(pages)
@@ -1,37 +1,180 @@
 """
 Password utility functions for hashing and verification.
+
+bcrypt is deliberately slow (hundreds of ms of CPU per call) but releases
+the GIL, so hashing and verification run on a small dedicated thread pool.
+The pool bounds how many cores password work can take at once, which keeps
+password logins and registrations from starving biometric logins served by
+the same worker.
+
+The bcrypt cost factor comes from TYPEID_BCRYPT_ROUNDS, or is calibrated
+once at first use so a hash takes about TYPEID_BCRYPT_TARGET_MS.
 """
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
 
+from utils.metrics_util import metrics
+
+PASSWORD_HASH_WORKERS = int(os.getenv('TYPEID_PASSWORD_HASH_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('TYPEID_PASSWORD_HASH_MAX_PENDING', str(PASSWORD_HASH_WORKERS * 8)))
+BCRYPT_TARGET_MS = float(os.getenv('TYPEID_BCRYPT_TARGET_MS', '250'))
+MIN_BCRYPT_ROUNDS = 10
+MAX_BCRYPT_ROUNDS = 16
+
+# bcrypt only reads the first 72 bytes; bcrypt>=5 raises ValueError beyond
+# that and older versions silently truncate, so longer passwords are refused
+# up front whatever bcrypt version is installed
+MAX_PASSWORD_BYTES = 72
+PASSWORD_TOO_LONG = f'Password must be at most {MAX_PASSWORD_BYTES} bytes'
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='bcrypt')
+_pending = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+_rounds_lock = threading.Lock()
+_rounds = int(os.environ['TYPEID_BCRYPT_ROUNDS']) if os.getenv('TYPEID_BCRYPT_ROUNDS') else None
+
+
+def calibrate_rounds(target_ms=BCRYPT_TARGET_MS):
+    """
+    Pick the highest bcrypt cost whose hash time stays within target_ms.
+
+    Each extra round doubles the work, so one timed hash at the minimum
+    cost is enough to extrapolate.
+
+    Args:
+        target_ms: Target hash time in milliseconds
+
+    Returns:
+        bcrypt cost factor (MIN_BCRYPT_ROUNDS..MAX_BCRYPT_ROUNDS)
+    """
+    start = time.perf_counter()
+    bcrypt.hashpw(b'calibration', bcrypt.gensalt(rounds=MIN_BCRYPT_ROUNDS))
+    base_ms = (time.perf_counter() - start) * 1000.0
+
+    rounds = MIN_BCRYPT_ROUNDS
+    while rounds < MAX_BCRYPT_ROUNDS and base_ms * 2 ** (rounds + 1 - MIN_BCRYPT_ROUNDS) <= target_ms:
+        rounds += 1
+    return rounds
+
+
+def get_bcrypt_rounds():
+    """Return the configured cost factor, calibrating on first call if unset."""
+    global _rounds
+    if _rounds is None:
+        with _rounds_lock:
+            if _rounds is None:
+                _rounds = calibrate_rounds()
+                print(f"🔐 bcrypt cost factor calibrated to {_rounds} (target {BCRYPT_TARGET_MS:.0f} ms)")
+    return _rounds
+
+
+def get_hash_rounds(password_hash):
+    """
+    Read the cost factor out of a bcrypt hash ('$2b$12$...').
+
+    Returns:
+        Cost factor, or None if the string is not a bcrypt hash
+    """
+    parts = password_hash.split('$') if password_hash else []
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def is_password_hash(value):
+    """True if value looks like a bcrypt hash."""
+    return get_hash_rounds(value) is not None
+
+
+def needs_rehash(password_hash):
+    """True if the hash was made with a lower cost factor than the current one."""
+    rounds = get_hash_rounds(password_hash)
+    return rounds is not None and rounds < get_bcrypt_rounds()
+
+
+def validate_password(password):
+    """
+    True if password can be hashed: a non-empty string of at most
+    MAX_PASSWORD_BYTES bytes in UTF-8
+    """
+    return isinstance(password, str) and 0 < len(password.encode('utf-8')) <= MAX_PASSWORD_BYTES
+
+
+def _hash_password(password):
+    start = time.perf_counter()
+    salt = bcrypt.gensalt(rounds=get_bcrypt_rounds())
+    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
+    metrics.observe('password.hash', (time.perf_counter() - start) * 1000.0)
+    return hashed.decode('utf-8')
+
+
+def _verify_password(password, password_hash):
+    start = time.perf_counter()
+    try:
+        # Hashes made by bcrypt<5 from longer passwords cover only the first
+        # MAX_PASSWORD_BYTES, so compare that prefix to keep those logins working
+        return bcrypt.checkpw(password.encode('utf-8')[:MAX_PASSWORD_BYTES], password_hash.encode('utf-8'))
+    except ValueError:
+        # Malformed hash (e.g. a placeholder) never matches
+        return False
+    finally:
+        metrics.observe('password.verify', (time.perf_counter() - start) * 1000.0)
+
+
+def _submit(fn, *args):
+    """Submit to the bcrypt pool, blocking the caller while the queue is full."""
+    _pending.acquire()
+    try:
+        future = _executor.submit(fn, *args)
+    except Exception:
+        _pending.release()
+        raise
+    future.add_done_callback(lambda _: _pending.release())
+    return future
+
+
+def hash_password_async(password):
+    """Hash on the bcrypt pool. Returns a Future resolving to the hash string."""
+    if not validate_password(password):
+        # Raised here rather than in the pool so callers see it before any write
+        raise ValueError(PASSWORD_TOO_LONG if isinstance(password, str) and password else 'Password is required')
+    return _submit(_hash_password, password)
+
+
+def verify_password_async(password, password_hash):
+    """Verify on the bcrypt pool. Returns a Future resolving to True/False."""
+    return _submit(_verify_password, password, password_hash)
+
 
 def hash_password(password):
     """
     Hash a plain text password using bcrypt.
-    
+
     Args:
         password: Plain text password string
-    
+
     Returns:
         Hashed password string (UTF-8 encoded)
+
+    Raises:
+        ValueError: empty, or longer than MAX_PASSWORD_BYTES (check with
+            validate_password first)
     """
-    # Generate salt and hash the password
-    salt = bcrypt.gensalt()
-    password_bytes = password.encode('utf-8')
-    hashed = bcrypt.hashpw(password_bytes, salt)
-    return hashed.decode('utf-8')
+    return hash_password_async(password).result()
 
 
 def verify_password(password, password_hash):
     """
     Verify a plain text password against a hash.
-    
+
     Args:
         password: Plain text password string
         password_hash: Hashed password string
-    
+
     Returns:
         True if password matches, False otherwise
     """
-    password_bytes = password.encode('utf-8')
-    hash_bytes = password_hash.encode('utf-8')
-    return bcrypt.checkpw(password_bytes, hash_bytes)
+    return verify_password_async(password, password_hash).result()
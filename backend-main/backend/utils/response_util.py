@@ -0,0 +1,125 @@
+"""
+JSON response building.
+
+All API responses go through json_response(), which serializes NumPy
+scalars and arrays natively (orjson with OPT_SERIALIZE_NUMPY when it is
+installed, stdlib json with a NumPy-aware default otherwise) and records
+serialization time as the 'stage.serialize' metric.
+
+The auth result shapes returned by /api/login and /api/login-hybrid are
+built from the fixed key layouts below, so routes no longer copy the same
+float()/bool() conversion code into every branch.
+"""
+import json
+import time
+
+import numpy as np
+from flask import Response
+
+from utils.metrics_util import metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Key layouts for AuthService.authenticate_user()['details']
+STATISTICAL_MATCH_LAYOUT = ('score', 'passed', 'threshold')
+ML_PREDICTION_LAYOUT = (
+    'predicted_user', 'confidence', 'user_match',
+    'confidence_pass', 'passed', 'threshold'
+)
+
+# Key layouts for the /api/login-hybrid 'details' block, per method
+HYBRID_DETAILS_LAYOUTS = {
+    'ML_MODEL': ('ml_prediction', (('predicted_user', 'predicted_user'),
+                                   ('confidence', 'confidence'),
+                                   ('threshold', 'threshold'))),
+    'DATABASE_COMPARISON': ('statistical_match', (('similarity', 'score'),
+                                                  ('threshold', 'threshold')))
+}
+
+
+def _default(obj):
+    """stdlib json fallback for NumPy types."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+    """Serialize payload to JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(payload):
+    """
+    Build a JSON Response from a dict that may contain NumPy values.
+
+    Use like jsonify(): return json_response({...}), 200
+    """
+    start = time.perf_counter()
+    body = dumps(payload)
+    metrics.observe('stage.serialize', (time.perf_counter() - start) * 1000.0)
+    return Response(body, mimetype='application/json')
+
+
+def json_stream_page(rows, limit):
+    """
+    Stream a keyset page as {"success": true, "items": [...], "count": n, "next_after": key}
+
+    Items are serialized one at a time as the cursor yields them, so the
+    page is never materialized in memory. next_after is null when the page
+    came back short, i.e. there is nothing after it.
+
+    Args:
+        rows: iterable of (key, item dict)
+        limit: requested page size
+    """
+    def generate():
+        yield b'{"success":true,"items":['
+        count = 0
+        last_key = None
+        for last_key, item in rows:
+            if count:
+                yield b','
+            yield dumps(item)
+            count += 1
+        next_after = last_key if count == limit else None
+        yield b'],' + dumps({'count': count, 'next_after': next_after})[1:]
+
+    return Response(generate(), mimetype='application/json')
+
+
+def auth_details(details):
+    """
+    Project AuthService details onto the public response layout.
+
+    Returns:
+        dict with 'statistical_match' and 'ml_prediction', or None
+    """
+    if not details:
+        return None
+    statistical = details['statistical_match']
+    ml = details['ml_prediction']
+    return {
+        'statistical_match': {key: statistical[key] for key in STATISTICAL_MATCH_LAYOUT},
+        'ml_prediction': {key: ml[key] for key in ML_PREDICTION_LAYOUT}
+    }
+
+
+def hybrid_details(method, details):
+    """
+    Project AuthService details onto the /api/login-hybrid 'details' layout.
+
+    Args:
+        method: 'ML_MODEL' or 'DATABASE_COMPARISON'
+        details: AuthService.authenticate_user()['details']
+    """
+    section, layout = HYBRID_DETAILS_LAYOUTS[method]
+    source = details[section]
+    return {out_key: source[in_key] for out_key, in_key in layout}
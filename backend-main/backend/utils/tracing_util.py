@@ -0,0 +1,261 @@
+"""
+Per-request tracing (span timings) exported to a rotating JSONL file.
+
+Metrics (metrics_util) aggregate; a trace explains one request: every
+sampled request gets a trace ID and a tree of timed spans (route handler,
+UserService queries, statistical matching, model prediction, session
+write) with attributes such as the user, sample count and model version.
+
+- Head-based sampling: the keep/drop decision is made once when the trace
+  starts (TYPEID_TRACE_SAMPLE_RATE, or forced by an admin's X-Trace-Id),
+  so unsampled requests only pay a contextvar lookup per span
+- One JSON line per finished trace in TYPEID_TRACE_FILE, rotated at
+  TYPEID_TRACE_MAX_BYTES with TYPEID_TRACE_BACKUPS old files kept. With
+  several workers put {pid} in the path so each process rotates its own file
+- python -m scripts.trace_view renders a trace as a waterfall
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import random
+import secrets
+import threading
+import time
+
+TRACE_SAMPLE_RATE = float(os.getenv('TYPEID_TRACE_SAMPLE_RATE', '0.01'))
+TRACE_FILE = os.getenv(
+    'TYPEID_TRACE_FILE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'traces', 'traces.jsonl')
+)
+TRACE_MAX_BYTES = int(os.getenv('TYPEID_TRACE_MAX_BYTES', str(10 << 20)))
+TRACE_BACKUPS = int(os.getenv('TYPEID_TRACE_BACKUPS', '3'))
+
+# Spans kept per trace; a runaway loop cannot grow one trace without bound
+MAX_SPANS_PER_TRACE = 512
+
+# (trace, current span) of the request running in this context, or None
+_current = contextvars.ContextVar('typeid_trace', default=None)
+
+
+class Span:
+    __slots__ = ('span_id', 'parent_id', 'name', 'start', 'end', 'attributes')
+
+    def __init__(self, name, parent_id, attributes):
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.perf_counter()
+        self.end = None
+        self.attributes = attributes
+
+    def to_dict(self, origin):
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ms': round((self.start - origin) * 1000.0, 3),
+            'duration_ms': round((end - self.start) * 1000.0, 3),
+            'attributes': self.attributes,
+        }
+
+
+class Trace:
+    __slots__ = ('trace_id', 'started_at', 'root', 'spans', 'dropped')
+
+    def __init__(self, trace_id, name, attributes):
+        self.trace_id = trace_id
+        self.started_at = time.time()
+        self.root = Span(name, None, attributes)
+        self.spans = [self.root]
+        self.dropped = 0
+
+    def to_dict(self):
+        origin = self.root.start
+        return {
+            'trace_id': self.trace_id,
+            'name': self.root.name,
+            'started_at': self.started_at,
+            'duration_ms': round(((self.root.end or time.perf_counter()) - origin) * 1000.0, 3),
+            'pid': os.getpid(),
+            'dropped_spans': self.dropped,
+            'spans': [span.to_dict(origin) for span in self.spans],
+        }
+
+
+class _SpanScope:
+    """Context manager for one child span of the current trace"""
+
+    __slots__ = ('name', 'attributes', 'span', 'token')
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.span = None
+        self.token = None
+
+    def __enter__(self):
+        current = _current.get()
+        if current is None:
+            return None
+        trace, parent = current
+        if len(trace.spans) >= MAX_SPANS_PER_TRACE:
+            trace.dropped += 1
+            return None
+        self.span = Span(self.name, parent.span_id, self.attributes)
+        trace.spans.append(self.span)
+        self.token = _current.set((trace, self.span))
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is None:
+            return False
+        self.span.end = time.perf_counter()
+        if exc_type is not None:
+            self.span.attributes['error'] = exc_type.__name__
+        _current.reset(self.token)
+        return False
+
+
+class _NoopScope:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopScope()
+
+
+class Tracer:
+    """Starts/ends traces and spans and exports finished traces"""
+
+    def __init__(self, path=TRACE_FILE, sample_rate=TRACE_SAMPLE_RATE,
+                 max_bytes=TRACE_MAX_BYTES, backups=TRACE_BACKUPS):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._handler = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    # ---------------------------------------------------
+    # TRACES
+    # ---------------------------------------------------
+    def start_trace(self, name, trace_id=None, force=False, **attributes):
+        """
+        Begin a trace in the current context if it is sampled
+
+        Args:
+            trace_id: caller-supplied ID (e.g. the X-Trace-Id header)
+            force: keep this trace regardless of the sample rate
+
+        Returns:
+            handle for end_trace, or None when the trace is not sampled
+        """
+        if not self.enabled or not (force or random.random() < self.sample_rate):
+            return None
+        trace = Trace(trace_id or secrets.token_hex(16), name, attributes)
+        return trace, _current.set((trace, trace.root))
+
+    def end_trace(self, handle, **attributes):
+        """Close the root span, restore the context and export the trace"""
+        if handle is None:
+            return
+        trace, token = handle
+        trace.root.end = time.perf_counter()
+        trace.root.attributes.update(attributes)
+        _current.reset(token)
+        self._export(trace)
+
+    def current_trace_id(self):
+        current = _current.get()
+        return current[0].trace_id if current else None
+
+    # ---------------------------------------------------
+    # SPANS
+    # ---------------------------------------------------
+    def span(self, name, **attributes):
+        """`with tracer.span('name', key=value):` - a no-op outside a sampled trace"""
+        if _current.get() is None:
+            return _NOOP
+        return _SpanScope(name, attributes)
+
+    def start_span(self, name, **attributes):
+        """Open a span that cannot be scoped with `with` (e.g. across Flask hooks)"""
+        scope = self.span(name, **attributes)
+        scope.__enter__()
+        return scope
+
+    def end_span(self, scope):
+        if scope is not None:
+            scope.__exit__(None, None, None)
+
+    def set_attributes(self, **attributes):
+        """Add attributes to the innermost open span"""
+        current = _current.get()
+        if current is not None:
+            current[1].attributes.update(attributes)
+
+    def traced(self, name=None, record=()):
+        """
+        Decorator: run the function inside a span
+
+        Args:
+            name: span name (default: the function's qualified name)
+            record: argument names copied into the span's attributes
+        """
+        def decorator(fn):
+            span_name = name or fn.__qualname__
+            signature = inspect.signature(fn) if record else None
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if _current.get() is None:
+                    return fn(*args, **kwargs)
+                attributes = {}
+                if signature is not None:
+                    bound = signature.bind_partial(*args, **kwargs).arguments
+                    attributes = {key: bound[key] for key in record if key in bound}
+                with _SpanScope(span_name, attributes):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # ---------------------------------------------------
+    # EXPORT
+    # ---------------------------------------------------
+    def _get_handler(self):
+        if self._handler is None:
+            with self._lock:
+                if self._handler is None:
+                    path = self.path.format(pid=os.getpid())
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    handler = logging.handlers.RotatingFileHandler(
+                        path, maxBytes=self.max_bytes, backupCount=self.backups, encoding='utf-8'
+                    )
+                    handler.setFormatter(logging.Formatter('%(message)s'))
+                    self._handler = handler
+        return self._handler
+
+    def _export(self, trace):
+        try:
+            line = json.dumps(trace.to_dict(), default=str)
+            self._get_handler().emit(logging.makeLogRecord({'msg': line, 'levelno': logging.INFO}))
+        except Exception as e:
+            print(f"⚠️ Trace export failed: {e}")
+
+
+# Shared instance used across the backend
+tracer = Tracer()